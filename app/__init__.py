@@ -3,19 +3,36 @@ import json
 import logging
 import os
 import re
+import time
 import uuid
+from collections import OrderedDict
 
 import jwt
-import redis
+import tornado.gen
 import tornado.httpclient
+import tornado.httputil
 import tornado.ioloop
+import tornado.iostream
+import tornado.locks
+import tornado.queues
 import tornado.web
 import tornado.websocket
-from passlib.apps import custom_app_context as pwd_context
 
+from app.cache import LRUCache
 from app.config import GandalfConfiguration, WEBSOCKET
-from app.db import User, UserExistsException
+from app.db import AsyncDBAdapter, User, UserExistsException
 from app.db.postgres_adapter import PostgresAdapter
+from app.metrics import IOLoopLagMonitor, MeteredProxy, Registry, gauges_from_stats
+from app.passwords import PasswordHasher, PasswordHasherSaturatedException
+from app.profiler import BlockingMonitor, ProfilerBusyException, SamplingProfiler
+from app.response_cache import ResponseCache
+from app.revocations import RevocationFilter
+from app.routing import RouteTable
+from app.token_store.redis_store import RedisTokenStore
+from app.upstream import CURL, HealthChecker, NoUpstreamException, UpstreamPool, make_upstream_client, \
+    upstream_client_stats
+from app.user_cache import UserCache
+from app.user_import import CONTENT_TYPES, ImportFormatException, ImportParser, UserImporter
 
 logger = logging.getLogger('gandalf')
 
@@ -24,6 +41,13 @@ def should_allow_host(hostname, regex):
     return re.fullmatch(regex, hostname) is not None
 
 
+def hop_by_hop_headers():
+    return {
+        'Connection',  # Connection reuse towards the upstream is up to the upstream client, not the caller
+        'Keep-Alive'
+    }
+
+
 def blocked_headers():
     return {
         'Content-Length',  # Allow tornado to calculate the Content-Length
@@ -33,13 +57,122 @@ def blocked_headers():
 
 
 def make_app(config: GandalfConfiguration):
-    cache = redis.StrictRedis(host=os.getenv("GANDALF_REDIS_HOST", "localhost"), port=6379)
+    metrics = Registry()
+    request_count = metrics.counter("gandalf_requests_total", "Requests handled", ["handler", "method", "code"])
+    request_latency = metrics.histogram("gandalf_request_duration_seconds", "Time spent handling a request",
+                                        ["handler"])
+    token_store_latency = metrics.histogram("gandalf_token_store_duration_seconds", "Token store call latency",
+                                            ["method"])
+    db_latency = metrics.histogram("gandalf_db_duration_seconds", "Database call latency, including queueing",
+                                   ["method"])
+    password_latency = metrics.histogram("gandalf_password_duration_seconds",
+                                         "Password hashing and verification latency, including queueing", ["method"])
+    jwt_decode_latency = metrics.histogram("gandalf_jwt_decode_duration_seconds", "Time spent decoding tokens")
+    upstream_latency = metrics.histogram("gandalf_upstream_duration_seconds", "Upstream request latency", ["code"])
+    websockets = metrics.gauge("gandalf_websockets", "Open WebSocket connections")
+    websockets.set(0)
+    ioloop_lag = metrics.histogram("gandalf_ioloop_lag_seconds", "How late timed IOLoop callbacks run")
+    IOLoopLagMonitor(tornado.ioloop.IOLoop.current(), ioloop_lag,
+                     metrics.gauge("gandalf_ioloop_last_lag_seconds", "The most recently measured IOLoop lag")).start()
+
+    # Before anything below starts a thread, since the password workers are forked
+    password_hasher = PasswordHasher(workers=config.password_workers, max_pending=config.password_queue_size)
+    password_hasher.start()
+    passwords = MeteredProxy(password_hasher, password_latency, ["encrypt", "encrypt_many", "verify"])
+
+    token_store = config.token_store
+    if token_store is None:
+        token_store = RedisTokenStore(host=os.getenv("GANDALF_REDIS_HOST", "localhost"),
+                                      port=int(os.getenv("GANDALF_REDIS_PORT", "6379")),
+                                      max_connections=int(os.getenv("GANDALF_REDIS_MAX_CONNECTIONS", "50")),
+                                      ttl=config.session_ttl)
+    token_store = MeteredProxy(token_store, token_store_latency,
+                               ["issue", "refresh", "lookup", "lookup_with_ttl", "revoke", "revoke_all_for_user",
+                                "revoke_all_for_users", "revoke_token_id", "revoke_tokens_issued_before",
+                                "revoke_tokens_issued_before_for_users", "revocations", "revocations_since",
+                                "is_token_id_revoked", "announce_user_changes", "ping"])
+    db = MeteredProxy(AsyncDBAdapter(config.db_adapter, max_workers=config.db_workers), db_latency,
+                      ["get_user", "create_user", "import_users", "update_user_password", "search_for_users_by_id",
+                       "search_for_users_by_username", "deactivate_user", "reactivate_user", "deactivate_users",
+                       "reactivate_users"])
+    user_cache = UserCache(db, config.user_cache_size, ttl=config.user_cache_ttl,
+                           announce=token_store.announce_user_changes if config.user_cache_size > 0 else None)
+    if config.user_cache_size > 0:
+        token_store.add_user_change_listener(user_cache.forget)
+    if config.stream_uploads and config.upstream_client == CURL:
+        raise ValueError("Streaming uploads require the simple upstream client")
+
+    upstream_client = make_upstream_client(config.upstream_client, max_clients=config.upstream_max_clients,
+                                           connect_timeout=config.upstream_connect_timeout,
+                                           request_timeout=config.upstream_request_timeout)
+
+    def make_upstream_pool(spec):
+        pool = UpstreamPool.parse(spec, config.upstream_strategy)
+        if config.health_check_interval and len(pool.upstreams) > 1:
+            HealthChecker(pool, interval=config.health_check_interval, timeout=config.health_check_timeout,
+                          path=config.health_check_path).start()
+        return pool
+
+    route_table = RouteTable.parse(config.routes, make_upstream_pool, default=make_upstream_pool(config.proxy_host))
+    token_cache = LRUCache(config.token_cache_size, ttl=config.token_cache_ttl)
+    response_cache = ResponseCache(config.response_cache_size)
+    # ETags are only forwarded when the cache can answer conditional requests with them
+    blocked_response_headers = blocked_headers() - {'Etag'} if response_cache.enabled else blocked_headers()
+    forgotten_tokens = 0
+
+    def forget_token(token):
+        nonlocal forgotten_tokens
+        forgotten_tokens += 1
+        if token is None:
+            token_cache.clear()
+        else:
+            token_cache.invalidate(token)
+
+    # Self-contained tokens are only checked against this copy of the revocation list, which is refreshed
+    # periodically and whenever a revocation is announced
+    revocations = RevocationFilter(token_store, config.token_lifetime, capacity=config.revocation_filter_capacity)
+
+    if config.stateless_tokens:
+        tornado.ioloop.IOLoop.current().add_callback(revocations.sync)
+        tornado.ioloop.PeriodicCallback(revocations.sync, config.revocation_sync_interval * 1000).start()
+        token_store.add_revocation_listener(lambda _: revocations.sync())
+    elif config.token_cache_size > 0:
+        token_store.add_revocation_listener(forget_token)
+
+    # Tokens whose session was refreshed within the last `session_refresh_interval` seconds
+    refreshed_tokens = LRUCache(config.token_cache_size or 10000, ttl=config.session_refresh_interval)
+
+    def log_refresh_failure(future):
+        if future.exception() is not None:
+            logger.warning("Unable to refresh a session: {}".format(future.exception()))
+
+    def refresh_session(token, user):
+        if config.session_ttl is None or config.session_refresh_interval is None:
+            return
+        if refreshed_tokens.get(token) is not None:
+            return
+
+        refreshed_tokens.set(token, True)
+        tornado.ioloop.IOLoop.current().add_future(token_store.refresh(token, user['userId']), log_refresh_failure)
+
+    @tornado.gen.coroutine
+    def revoke_user_tokens(user_ids):
+        if config.stateless_tokens:
+            # At sub-second precision, so that tokens issued later in the same second still verify
+            issued_before = time.time()
+            yield token_store.revoke_tokens_issued_before_for_users(user_ids, issued_before)
+            revocations.add([], {user_id: issued_before for user_id in user_ids})
+        else:
+            yield token_store.revoke_all_for_users(user_ids)
 
     def generate_token(user):
         token_payload = {
             "userId": user.user_id,
             "username": user.username
         }
+        if config.stateless_tokens:
+            issued_at = time.time()
+            token_payload.update(iat=issued_at, exp=issued_at + config.token_lifetime, jti=uuid.uuid4().hex)
 
         return base64.b64encode(jwt.encode(
             token_payload,
@@ -48,7 +181,25 @@ def make_app(config: GandalfConfiguration):
         )).decode()
 
     def decode_token(token):
-        return jwt.decode(base64.b64decode(token), key=config.signing_secret)
+        return jwt.decode(base64.b64decode(token), key=config.signing_secret, leeway=config.token_clock_skew,
+                          options={"require_exp": config.stateless_tokens, "require_iat": config.stateless_tokens})
+
+    @tornado.gen.coroutine
+    def verify_stateless_token(token):
+        started = time.monotonic()
+        try:
+            claims = decode_token(token)
+        except (jwt.InvalidTokenError, ValueError):
+            return None
+        finally:
+            jwt_decode_latency.observe(time.monotonic() - started)
+
+        if 'jti' not in claims:
+            return None
+        revoked = yield revocations.is_revoked(claims)
+        if revoked:
+            return None
+        return {"userId": claims['userId'], "username": claims['username']}
 
     def extract_token(authorization_value):
         token_start = authorization_value.rfind(" ") + 1
@@ -57,33 +208,66 @@ def make_app(config: GandalfConfiguration):
 
         return authorization_value[token_start:]
 
+    @tornado.gen.coroutine
     def extract_and_verify_user_from_token(token):
-        cache_hit = cache.get(token)
-        if cache_hit is None:
+        if token is None:
+            return None
+
+        if config.stateless_tokens:
+            user = yield verify_stateless_token(token)
+            return user
+
+        verified_user = token_cache.get(token)
+        if verified_user is not None:
+            refresh_session(token, verified_user)
+            return verified_user
+
+        forgotten_before_lookup = forgotten_tokens
+        cached_user, expires_in = yield token_store.lookup_with_ttl(token)
+        if cached_user is None:
             return None
 
-        cached_user = json.loads(cache_hit.decode())
+        started = time.monotonic()
         decoded_user = decode_token(token)
+        jwt_decode_latency.observe(time.monotonic() - started)
 
         if cached_user == decoded_user:
+            # Expiry publishes no revocation, so the cached copy must not outlive the session
+            cache_ttl = config.token_cache_ttl or None
+            if expires_in is not None:
+                cache_ttl = min(cache_ttl, expires_in) if cache_ttl is not None else expires_in
+            # A revocation that landed while waiting on the token store must not be undone by caching a stale answer
+            if forgotten_tokens == forgotten_before_lookup and (cache_ttl is None or cache_ttl > 0):
+                token_cache.set(token, cached_user, ttl=cache_ttl)
+            refresh_session(token, cached_user)
             return cached_user
         else:
             return None
 
+    def extract_token_from_request(request):
+        authorization = request.headers.get_list('Authorization')
+        if len(authorization) == 0:
+            return None
+
+        authorization_value = authorization[0].strip()
+        return extract_token(authorization_value)
+
+    @tornado.gen.coroutine
+    def extract_and_verify_user_from_request(request):
+        user = yield extract_and_verify_user_from_token(extract_token_from_request(request))
+        return user
+
     def base_authenticated(block, failure_block):
+        @tornado.gen.coroutine
         def wrapper(self):
-            authorization = self.request.headers.get_list('Authorization')
-            if len(authorization) == 0:
-                failure_block(self)
-            else:
-                authorization_value = authorization[0].strip()
-                token = extract_token(authorization_value)
-                user = extract_and_verify_user_from_token(token)
+            user = yield extract_and_verify_user_from_request(self.request)
 
-                if user is not None:
-                    block(self, user)
-                else:
-                    failure_block(self)
+            if user is not None:
+                result = block(self, user)
+                if result is not None:
+                    yield result
+            else:
+                failure_block(self)
 
         return wrapper
 
@@ -100,36 +284,169 @@ def make_app(config: GandalfConfiguration):
         return base_authenticated(block, failure)
 
     class RestHandler(tornado.web.RequestHandler):
+        upstream = None
+
         def compute_etag(self):
             return None
 
-        def passthru(self, user):
+        def passthru(self, user, body_producer=None):
+            method = self.request.method
+
+            hop_by_hop = hop_by_hop_headers()
+            headers = {header_name: self.request.headers[header_name] for header_name in self.request.headers
+                       if header_name not in hop_by_hop}
+            if body_producer is not None:
+                # The upstream request is re-framed by the client, with chunked encoding if there is no Content-Length
+                headers.pop('Transfer-Encoding', None)
+
+            headers['USER_ID'] = user['userId']
+            headers['USERNAME'] = user['username']
+
+            self.user_id = user['userId']
+            self.upstream_request_headers = tornado.httputil.HTTPHeaders(headers)
+            self.upstream_pool = route_table.resolve(self.request.host, self.request.path)
+            self.cacheable = method == "GET" and response_cache.enabled
+            if self.cacheable:
+                cached = response_cache.lookup(self.user_id, self.request.host, self.request.uri,
+                                               self.upstream_request_headers)
+                if cached is not None:
+                    self.write_cached(cached)
+                    return
+                # Ask for the full response if it is likely to be cached, and answer If-None-Match here once it
+                # arrives; otherwise the upstream answers If-None-Match and its 304 is forwarded
+                if response_cache.expects_to_store(self.request.host, self.request.uri):
+                    headers.pop('If-None-Match', None)
+
+            try:
+                self.upstream = self.upstream_pool.acquire()
+            except NoUpstreamException:
+                logger.warning("No upstream configured for {}".format(self.request.uri))
+                self.send_error(502)
+                return
+
+            upstream = self.upstream
+
             def callback(response):
-                if response.body:
-                    self.write(response.body)
+                self.release_upstream()
+                upstream_latency.observe(response.request_time, response.code)
+                if response.code == 599:
+                    logger.warning("Unable to reach {}: {}".format(upstream.address, response.error))
+                    self.send_error(502)
+                    return
+
                 self.set_status(response.code)
-                blocked = blocked_headers()
-                for header_name in filter(lambda header_name: header_name not in blocked, response.headers):
-                    print("{} {}".format(header_name, response.headers[header_name]))
-                    self.set_header(header_name, response.headers[header_name])
+                forwarded_headers = [(header_name, response.headers[header_name]) for header_name in response.headers
+                                     if header_name not in blocked_response_headers]
+                for header_name, value in forwarded_headers:
+                    print("{} {}".format(header_name, value))
+                    self.set_header(header_name, value)
+
+                self.update_response_cache(response.code, forwarded_headers, response.body or b"")
+                if self.cacheable and self.check_etag_header():
+                    self.set_status(304)
+                elif response.body:
+                    self.write(response.body)
                 self.finish()
 
-            url = "http://{}{}".format(config.proxy_host, self.request.uri)
-            method = self.request.method
+            url = "http://{}{}".format(upstream.address, self.request.uri)
 
-            if method == "GET" or method == "DELETE":
+            if method == "GET" or method == "DELETE" or body_producer is not None:
                 body = None
             else:
                 body = self.request.body
 
-            headers = {header_name: self.request.headers[header_name] for header_name in self.request.headers}
+            if config.stream_responses:
+                self.upstream_start_line = None
+                self.upstream_headers = None
+                self.upstream_response_started = False
+                self.forwarded_headers = []
+                self.cached_chunks = None
+                self.not_modified = False
+                # Redirects are relayed to the client; following them here would splice two responses together
+                req = tornado.httpclient.HTTPRequest(url, method=method, body=body, body_producer=body_producer,
+                                                     headers=headers, follow_redirects=False,
+                                                     header_callback=self.on_upstream_header,
+                                                     streaming_callback=self.on_upstream_chunk)
+                upstream_client.fetch(req, self.on_upstream_finished, raise_error=False)
+            else:
+                req = tornado.httpclient.HTTPRequest(url, method=method, body=body, body_producer=body_producer,
+                                                     headers=headers)
+                upstream_client.fetch(req, callback, raise_error=False)
+
+        def write_cached(self, cached):
+            self.set_status(cached.code)
+            for header_name, value in cached.headers:
+                self.set_header(header_name, value)
+            self.set_header('Age', response_cache.age(cached))
+            if self.check_etag_header():
+                self.set_status(304)
+            else:
+                self.write(cached.body)
+            self.finish()
 
-            headers['USER_ID'] = user['userId']
-            headers['USERNAME'] = user['username']
+        def update_response_cache(self, code, forwarded_headers, body):
+            if self.cacheable:
+                response_cache.store(self.user_id, self.request.host, self.request.uri, self.upstream_request_headers,
+                                     code, forwarded_headers, body)
+            elif self.request.method != "GET" and code < 400 and response_cache.enabled:
+                response_cache.invalidate(self.user_id, self.request.host, self.request.uri)
+
+        def release_upstream(self):
+            if self.upstream is not None:
+                self.upstream_pool.release(self.upstream)
+                self.upstream = None
+
+        def on_upstream_header(self, line):
+            if line.startswith("HTTP/"):
+                self.upstream_start_line = tornado.httputil.parse_response_start_line(line.strip())
+                self.upstream_headers = tornado.httputil.HTTPHeaders()
+            elif line.strip():
+                self.upstream_headers.parse_line(line)
+            elif self.upstream_start_line.code >= 200:
+                self.set_status(self.upstream_start_line.code, self.upstream_start_line.reason)
+                self.forwarded_headers = [(header_name, self.upstream_headers[header_name])
+                                          for header_name in self.upstream_headers
+                                          if header_name not in blocked_response_headers]
+                for header_name, value in self.forwarded_headers:
+                    self.set_header(header_name, value)
+                self.upstream_response_started = True
+
+                if self.cacheable and self.upstream_start_line.code == 200:
+                    self.cached_chunks = []
+                    self.cached_size = 0
+                if self.cacheable and self.check_etag_header():
+                    # The body is still read so that it can be cached, but none of it is sent
+                    self.set_status(304)
+                    self.not_modified = True
+                else:
+                    self.flush()
 
-            req = tornado.httpclient.HTTPRequest(url, method=method, body=body, headers=headers)
-            client = tornado.httpclient.AsyncHTTPClient()
-            client.fetch(req, callback, raise_error=False)
+        def on_upstream_chunk(self, chunk):
+            if self.cached_chunks is not None:
+                self.cached_size += len(chunk)
+                if self.cached_size <= response_cache.max_entry_size:
+                    self.cached_chunks.append(chunk)
+                else:
+                    self.cached_chunks = None
+
+            if not self.not_modified:
+                self.write(chunk)
+                return self.flush()
+
+        def on_upstream_finished(self, response):
+            address = self.upstream.address
+            self.release_upstream()
+            upstream_latency.observe(response.request_time, response.code)
+            if not self.upstream_response_started:
+                logger.warning("Unable to reach {}: {}".format(address, response.error))
+                self.send_error(502)
+            elif response.code == 599:
+                # The upstream went away mid-body; drop the client rather than end the body as if it were complete
+                self.request.connection.close()
+            else:
+                self.update_response_cache(response.code, self.forwarded_headers,
+                                           b"".join(self.cached_chunks) if self.cached_chunks is not None else None)
+                self.finish()
 
         @user_authenticated
         @tornado.web.asynchronous
@@ -156,14 +473,77 @@ def make_app(config: GandalfConfiguration):
         def patch(self, user):
             self.passthru(user)
 
-    def with_user(block):
-        def wrapper(self, *args, **kwargs):
-            user = extract_and_verify_user_from_token(self.authentication_token)
+    @tornado.web.stream_request_body
+    class StreamingRestHandler(RestHandler):
+        """
+        Authorizes on headers alone, then pipes the request body upstream chunk by chunk as it arrives.
+
+        At most `config.upload_buffer_chunks` chunks are held per request; when the upstream falls behind, reading
+        from the client pauses. Unauthorized uploads are answered before any of the body is read.
+        """
+
+        # Queued in place of the end of the body when the client goes away mid-upload
+        ABORTED = object()
+
+        def initialize(self):
+            self.body_chunks = None
+            self.body_ended = False
+
+        @tornado.gen.coroutine
+        def prepare(self):
+            user = yield extract_and_verify_user_from_request(self.request)
             if user is None:
-                self.close(code=401)
-                return None
+                self.send_error(401)
+                return
+
+            self._auto_finish = False
+            if self.request.method == "GET" or self.request.method == "DELETE":
+                self.passthru(user)
             else:
-                return block(self, user, *args, **kwargs)
+                if config.max_upload_size is not None:
+                    self.request.connection.set_max_body_size(config.max_upload_size)
+                self.body_chunks = tornado.queues.Queue(maxsize=config.upload_buffer_chunks)
+                self.passthru(user, body_producer=self.produce_body)
+
+        @tornado.gen.coroutine
+        def produce_body(self, write):
+            while True:
+                chunk = yield self.body_chunks.get()
+                if chunk is None:
+                    return
+                if chunk is self.ABORTED:
+                    # Failing the upstream request keeps the truncated body from reaching it as a complete one
+                    raise tornado.iostream.StreamClosedError()
+                yield write(chunk)
+
+        def data_received(self, chunk):
+            if self.body_chunks is not None:
+                return self.body_chunks.put(chunk)
+
+        def end_body(self, *args, **kwargs):
+            self.body_ended = True
+            if self.body_chunks is not None:
+                return self.body_chunks.put(None)
+
+        get = post = put = delete = patch = end_body
+
+        def on_connection_close(self):
+            super().on_connection_close()
+            if self.body_chunks is not None and not self.body_ended:
+                self.body_ended = True
+                self.body_chunks.put(self.ABORTED)
+
+    def with_user(block):
+        @tornado.gen.coroutine
+        def wrapper(self, *args, **kwargs):
+            # Frames are verified one at a time so they reach the other side in the order they arrived
+            with (yield self.user_lock.acquire()):
+                user = yield extract_and_verify_user_from_token(self.authentication_token)
+                if user is None:
+                    self.close(code=401)
+                    return None
+                else:
+                    return block(self, user, *args, **kwargs)
 
         return wrapper
 
@@ -174,29 +554,44 @@ def make_app(config: GandalfConfiguration):
             self.authentication_timer = None
             self.authentication_token = None
             self.pending_messages = []
+            self.user_lock = tornado.locks.Lock()
+            self.upstream = None
+            self.opened = False
 
         def check_authenticated(self):
             if self.authentication_token is None:
                 self.close(code=401)
 
         def open(self, *args, **kwargs):
+            websockets.inc()
+            self.opened = True
             self.authentication_timer = tornado.ioloop.IOLoop.current().call_later(2, self.check_authenticated)
 
         @with_user
         def forward_message(self, user, message):
             self.proxy.write_message(message)
 
+        @tornado.gen.coroutine
         def on_message(self, message):
             if self.authentication_token is None:
                 tornado.ioloop.IOLoop.current().remove_timeout(self.authentication_timer)
                 self.authentication_timer = None
                 token = extract_token(message)
-                user = extract_and_verify_user_from_token(token)
+                # Claim the token before yielding so frames arriving mid-verification are queued, not re-authenticated
+                self.authentication_token = token
+                user = yield extract_and_verify_user_from_token(token)
                 if user is None:
                     self.close(code=401)
+                    return
+
+                try:
+                    self.upstream_pool = route_table.resolve(self.request.host, self.request.path)
+                    self.upstream = self.upstream_pool.acquire()
+                except NoUpstreamException:
+                    logger.warning("No upstream configured for {}".format(self.request.uri))
+                    self.close(code=1011)
                 else:
-                    self.authentication_token = token
-                    url = "ws://{}{}".format(config.proxy_host, self.request.uri)
+                    url = "ws://{}{}".format(self.upstream.address, self.request.uri)
                     tornado.websocket.websocket_connect(url, callback=self.on_proxy_connected,
                                                         on_message_callback=self.on_proxy_message)
             elif self.proxy is None:
@@ -218,40 +613,53 @@ def make_app(config: GandalfConfiguration):
                 self.write_message(message)
 
         def on_close(self):
+            if self.opened:
+                websockets.dec()
+                self.opened = False
             if self.proxy:
                 self.proxy.close()
                 self.proxy = None
+            if self.upstream is not None:
+                self.upstream_pool.release(self.upstream)
+                self.upstream = None
 
     class LoginHandler(tornado.web.RequestHandler):
+        @tornado.gen.coroutine
         def post(self):
             try:
                 username = self.get_body_argument("username").lower()
                 password = self.get_body_argument("password")
 
-                user = config.db_adapter.get_user(username)
+                user = yield db.get_user(username)
 
-                if pwd_context.verify(password, user.hashed_password):
-                    cached_token = cache.get(user.user_id)
-                    if cached_token:
-                        token = cached_token.decode()
-                    else:
+                verified = yield passwords.verify(password, user.hashed_password)
+                if verified:
+                    if config.stateless_tokens:
                         token = generate_token(user)
-                        cache.set(token, json.dumps({"userId": user.user_id, "username": user.username}))
-                        cache.set(user.user_id, token)
+                    else:
+                        token = yield token_store.issue({"userId": user.user_id, "username": user.username},
+                                                        generate_token(user))
                     self.write(json.dumps({"access_token": token}))
                     self.set_status(200)
                     self.finish()
                 else:
                     self.send_error(401)
+            except PasswordHasherSaturatedException:
+                self.send_error(503)
             except Exception:
                 self.send_error(401)
 
     class LogoutHandler(tornado.web.RequestHandler):
         @user_authenticated
+        @tornado.gen.coroutine
         def post(self, user):
-            token = cache.get(user['userId'])
-            cache.delete(user['userId'])
-            cache.delete(token)
+            if config.stateless_tokens:
+                # Only the token being used is signed out; the user's other sessions stay valid until they expire
+                claims = decode_token(extract_token_from_request(self.request))
+                yield token_store.revoke_token_id(claims['jti'], claims['exp'])
+                revocations.add([claims['jti']], {})
+            else:
+                yield token_store.revoke_all_for_user(user['userId'])
             self.set_status(200)
             self.finish()
 
@@ -262,28 +670,91 @@ def make_app(config: GandalfConfiguration):
                 logger.info("Attempted access of {} from host {}".format(self.request.path, hostname))
                 self.send_error(404)
             else:
-                block(self, *args, **kwargs)
+                return block(self, *args, **kwargs)
 
         return wrapper
 
     class CreateUserHandler(tornado.web.RequestHandler):
         @internal_only
+        @tornado.gen.coroutine
         def post(self):
             username = self.get_body_argument("username").lower()
             password = self.get_body_argument("password")
             user_id = str(uuid.uuid1())
 
-            hashed_password = pwd_context.encrypt(password)
-
             try:
-                config.db_adapter.create_user(user_id, username, hashed_password)
+                hashed_password = yield passwords.encrypt(password)
+                yield db.create_user(user_id, username, hashed_password)
                 self.set_status(201)
                 self.add_header("USER_ID", user_id)
                 self.finish()
             except UserExistsException:
                 self.send_error(409)
+            except PasswordHasherSaturatedException:
+                self.send_error(503)
+
+    @tornado.web.stream_request_body
+    class ImportUsersHandler(tornado.web.RequestHandler):
+        """
+        Imports users from a CSV or NDJSON body as it is uploaded, writing one JSON result per row. Reading from the
+        client pauses while a batch waits for the one before it to be written to the database.
+        """
+
+        BATCH_SIZE = 1000
+
+        def initialize(self):
+            self.parser = None
+            self.importer = None
+            self.error = None
+
+        @internal_only
+        def prepare(self):
+            content_type = self.request.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            if content_type not in CONTENT_TYPES:
+                self.set_status(400)
+                self.finish("Expected a text/csv or application/x-ndjson body")
+                return
+
+            if config.max_upload_size is not None:
+                self.request.connection.set_max_body_size(config.max_upload_size)
+            self.parser = ImportParser(CONTENT_TYPES[content_type])
+            self.importer = UserImporter(db, passwords, self.report, batch_size=self.BATCH_SIZE)
+            self.set_header("Content-Type", "application/x-ndjson")
+
+        def report(self, results):
+            self.write("".join(json.dumps(result) + "\n" for result in results))
+            # Not waited on: a client still uploading may not read the response until it is done
+            self.flush()
+
+        def data_received(self, chunk):
+            if self.parser is None or self.error is not None:
+                return None
+
+            try:
+                rows = self.parser.feed(chunk)
+            except ImportFormatException as e:
+                self.error = str(e)
+                return None
+            return self.importer.add(rows)
+
+        @tornado.gen.coroutine
+        def post(self):
+            if self.error is None:
+                try:
+                    yield self.importer.add(self.parser.close())
+                except ImportFormatException as e:
+                    self.error = str(e)
+
+            if self.error is not None:
+                self.set_status(400)
+                self.finish(self.error)
+                return
+
+            yield self.importer.close()
+            self.finish()
 
     class UserGetHandler(tornado.web.RequestHandler):
+        @tornado.gen.coroutine
         def get_user(self, user_id):
             def payload(user):
                 return {
@@ -291,7 +762,7 @@ def make_app(config: GandalfConfiguration):
                     "userId": user.user_id
                 }
 
-            users = config.db_adapter.search_for_users_by_id([user_id])
+            users = yield user_cache.search_for_users_by_id([user_id])
 
             if len(users) > 0:
                 user = users[0]
@@ -301,51 +772,103 @@ def make_app(config: GandalfConfiguration):
 
     class MeUserHandler(UserGetHandler):
         @user_authenticated
+        @tornado.gen.coroutine
         def get(self, user):
-            self.get_user(user['userId'])
+            yield self.get_user(user['userId'])
 
     class UpdateUserHandler(UserGetHandler):
         @internal_only
+        @tornado.gen.coroutine
         def get(self, user_id):
-            self.get_user(user_id)
+            yield self.get_user(user_id)
 
         @internal_only
+        @tornado.gen.coroutine
         def post(self, user_id):
             password = self.get_body_argument("password")
 
-            hashed_password = pwd_context.encrypt(password)
+            try:
+                hashed_password = yield passwords.encrypt(password)
+            except PasswordHasherSaturatedException:
+                self.send_error(503)
+                return
 
-            config.db_adapter.update_user_password(user_id, hashed_password)
+            yield user_cache.update_user_password(user_id, hashed_password)
 
             self.set_status(200)
             self.finish()
 
     class DeactivateUserHandler(tornado.web.RequestHandler):
         @internal_only
+        @tornado.gen.coroutine
         def post(self, user_id):
-            token = cache.get(user_id)
-            cache.delete(user_id)
-            cache.delete(token)
-
-            config.db_adapter.deactivate_user(user_id)
+            deactivated = yield user_cache.deactivate_users([user_id])
+            if deactivated:
+                # As in the bulk endpoint, unknown or already deactivated ids leave no cutoff behind
+                yield revoke_user_tokens(deactivated)
 
             self.set_status(200)
             self.finish()
 
     class ReactivateUserHandler(tornado.web.RequestHandler):
         @internal_only
+        @tornado.gen.coroutine
         def post(self, user_id):
-            config.db_adapter.reactivate_user(user_id)
+            yield user_cache.reactivate_user(user_id)
 
             self.set_status(200)
             self.finish()
 
+    class BulkUserStatusHandler(tornado.web.RequestHandler):
+        """Changes the status of every user in a JSON array of `user_id`'s, `BATCH_SIZE` users per query."""
+
+        BATCH_SIZE = 1000
+        STATUS = None
+
+        @internal_only
+        @tornado.gen.coroutine
+        def post(self):
+            user_ids = json_strings(self.request.body)
+            if user_ids is None:
+                self.set_status(400)
+                self.finish("Expected a JSON array of strings")
+                return
+
+            user_ids = list(OrderedDict.fromkeys(user_ids))
+            changed = set()
+            for start in range(0, len(user_ids), self.BATCH_SIZE):
+                changed.update((yield self.change(user_ids[start:start + self.BATCH_SIZE])))
+
+            self.finish({
+                self.STATUS: [user_id for user_id in user_ids if user_id in changed],
+                "errors": [{"message": "Unable to find user_id", "key": "user_id", "value": user_id}
+                           for user_id in user_ids if user_id not in changed]
+            })
+
+    class BulkDeactivateUsersHandler(BulkUserStatusHandler):
+        STATUS = "deactivated"
+
+        @tornado.gen.coroutine
+        def change(self, user_ids):
+            deactivated = yield user_cache.deactivate_users(user_ids)
+            if deactivated:
+                # Only users that were deactivated, so unknown ids don't leave cutoffs behind
+                yield revoke_user_tokens(deactivated)
+            return deactivated
+
+    class BulkReactivateUsersHandler(BulkUserStatusHandler):
+        STATUS = "reactivated"
+
+        def change(self, user_ids):
+            return user_cache.reactivate_users(user_ids)
+
     class SearchUserHandler(tornado.web.RequestHandler):
+        @tornado.gen.coroutine
         def search_with_user_ids(self, user_ids):
-            users = config.db_adapter.search_for_users_by_id(user_ids)
+            users = yield user_cache.search_for_users_by_id(user_ids)
 
-            found_user_ids = [user.user_id for user in users]
-            missing_user_ids = list(filter(lambda user_id: user_id not in found_user_ids, user_ids))
+            found_user_ids = {user.user_id for user in users}
+            missing_user_ids = [user_id for user_id in user_ids if user_id not in found_user_ids]
 
             response_payload = {}
 
@@ -372,11 +895,12 @@ def make_app(config: GandalfConfiguration):
             self.set_status(200)
             self.finish()
 
+        @tornado.gen.coroutine
         def search_with_usernames(self, usernames):
-            users = config.db_adapter.search_for_users_by_username(usernames)
+            users = yield user_cache.search_for_users_by_username(usernames)
 
-            found_usernames = [user.username for user in users]
-            missing_usernames = list(filter(lambda username: username not in found_usernames, usernames))
+            found_usernames = {user.username for user in users}
+            missing_usernames = [username for username in usernames if username not in found_usernames]
 
             response_payload = {}
 
@@ -404,6 +928,7 @@ def make_app(config: GandalfConfiguration):
             self.finish()
 
         @internal_only
+        @tornado.gen.coroutine
         def post(self):
             user_ids = self.get_body_arguments("user_id")
             usernames = [username.lower() for username in self.get_body_arguments("username")]
@@ -413,39 +938,180 @@ def make_app(config: GandalfConfiguration):
                 self.write("Cannot search with both 'user_id' and 'username'. Please choose one.")
                 self.finish()
             elif len(user_ids) > 0:
-                self.search_with_user_ids(user_ids)
+                yield self.search_with_user_ids(user_ids)
             elif len(usernames) > 0:
-                self.search_with_usernames(usernames)
+                yield self.search_with_usernames(usernames)
             else:
                 self.write({'results': []})
                 self.set_status(200)
                 self.finish()
 
+    def json_strings(body):
+        try:
+            values = json.loads(body.decode())
+        except ValueError:
+            return None
+        if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+            return None
+        return values
+
+    class BulkSearchUserHandler(tornado.web.RequestHandler):
+        CHUNK_SIZE = 1000
+
+        SEARCHES = {
+            "user_id": (user_cache.search_for_users_by_id, lambda user: user.user_id),
+            "username": (user_cache.search_for_users_by_username, lambda user: user.username)
+        }
+
+        @internal_only
+        @tornado.gen.coroutine
+        def post(self):
+            key = self.get_query_argument("by", "user_id")
+            if key not in self.SEARCHES:
+                self.set_status(400)
+                self.finish("'by' must be either 'user_id' or 'username'")
+                return
+
+            values = json_strings(self.request.body)
+            if values is None:
+                self.set_status(400)
+                self.finish("Expected a JSON array of strings")
+                return
+
+            if key == "username":
+                values = [value.lower() for value in values]
+
+            search, key_of = self.SEARCHES[key]
+            chunks = [values[start:start + self.CHUNK_SIZE] for start in range(0, len(values), self.CHUNK_SIZE)]
+
+            self.set_header("Content-Type", "application/x-ndjson")
+            pending = search(chunks[0]) if chunks else None
+            for index, chunk in enumerate(chunks):
+                users = yield pending
+                # Start on the next chunk while this one is written out
+                if index + 1 < len(chunks):
+                    pending = search(chunks[index + 1])
+
+                found = {key_of(user): user for user in users}
+                lines = []
+                for value in chunk:
+                    user = found.get(value)
+                    if user is not None:
+                        lines.append({"username": user.username, "userId": user.user_id})
+                    else:
+                        lines.append({"message": "Unable to find {}".format(key), "key": key, "value": value})
+                self.write("".join(json.dumps(line) + "\n" for line in lines))
+
+                try:
+                    yield self.flush()
+                except tornado.iostream.StreamClosedError:
+                    return
+
+            self.finish()
+
+    def stats():
+        return {
+            "token_cache": token_cache.stats(),
+            "token_store": token_store.stats(),
+            "revocations": revocations.stats(),
+            "user_cache": user_cache.stats(),
+            "response_cache": response_cache.stats(),
+            "database": db.stats(),
+            "passwords": passwords.stats(),
+            "upstream": dict(upstream_client_stats(upstream_client), members=route_table.default.stats()),
+            "routes": [{"host": host, "prefix": prefix, "members": pool.stats()}
+                       for host, prefix, pool in route_table.routes]
+        }
+
+    metrics.add_collector(lambda: gauges_from_stats("gandalf", stats()))
+
+    class StatsHandler(tornado.web.RequestHandler):
+        @internal_only
+        def get(self):
+            self.write(stats())
+
+    class MetricsHandler(tornado.web.RequestHandler):
+        @internal_only
+        def get(self):
+            self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.write(metrics.render())
+
+    class DebugHandler(tornado.web.RequestHandler):
+        def get_number(self, name, default, maximum):
+            try:
+                value = float(self.get_query_argument(name, default))
+            except ValueError:
+                value = 0
+            if not 0 < value <= maximum:
+                self.set_status(400)
+                self.finish("'{}' must be a number between 0 and {}".format(name, maximum))
+                return None
+            return value
+
+    class ProfileHandler(DebugHandler):
+        @internal_only
+        @tornado.gen.coroutine
+        def get(self):
+            seconds = self.get_number("seconds", "10", 300)
+            if seconds is None:
+                return
+
+            profiler = SamplingProfiler()
+            try:
+                profiler.start()
+            except ProfilerBusyException:
+                self.set_status(409)
+                self.finish("A profile is already being taken")
+                return
+
+            try:
+                yield tornado.gen.sleep(seconds)
+            finally:
+                profiler.stop()
+
+            self.set_header("Content-Type", "text/plain; charset=utf-8")
+            self.finish(profiler.collapsed())
+
+    class SlowCallbacksHandler(DebugHandler):
+        @internal_only
+        @tornado.gen.coroutine
+        def get(self):
+            seconds = self.get_number("seconds", "10", 300)
+            threshold = self.get_number("threshold", "0.05", 10) if seconds is not None else None
+            if threshold is None:
+                return
+
+            monitor = BlockingMonitor(tornado.ioloop.IOLoop.current(), threshold=threshold)
+            try:
+                monitor.start()
+            except ProfilerBusyException:
+                self.set_status(409)
+                self.finish("Slow callbacks are already being recorded")
+                return
+
+            try:
+                yield tornado.gen.sleep(seconds)
+            finally:
+                monitor.stop()
+
+            self.finish({"threshold": monitor.threshold, "slow_callbacks": monitor.report()})
+
     class LiveHandler(tornado.web.RequestHandler):
         def get(self, *args, **kwargs):
             self.write("OK")
 
     class ReadyHandler(tornado.web.RequestHandler):
+        @tornado.gen.coroutine
         def get(self, *args, **kwargs):
-            def check_redis():
-                key = "health-%s" % str(uuid.uuid4())
-                value = str(uuid.uuid4())
-                cache_set = cache.set(key, value)
-                if not cache_set:
-                    return False
-
-                if not cache.delete(key, value):
-                    return False
-
-                return True
-
+            @tornado.gen.coroutine
             def check_postgres():
-                return config.db_adapter.search_for_users_by_username([str(uuid.uuid4())]) == []
+                users = yield db.search_for_users_by_username([str(uuid.uuid4())])
+                return users == []
 
-            if not check_redis():
-                self.write("Failed to connect to Redis")
+            if not (yield token_store.ping()):
+                self.write("Failed to connect to the token store")
                 self.set_status(503)
-            elif not check_postgres():
+            elif not (yield check_postgres()):
                 self.write("Failed to connect to Postgres")
                 self.set_status(503)
             else:
@@ -454,15 +1120,32 @@ def make_app(config: GandalfConfiguration):
 
     if config.mode == WEBSOCKET:
         handler = WebsocketHandler
+    elif config.stream_uploads:
+        handler = StreamingRestHandler
     else:
         handler = RestHandler
 
-    return tornado.web.Application([
+    class Application(tornado.web.Application):
+        def log_request(self, handler):
+            super().log_request(handler)
+            handler_name = type(handler).__name__
+            request_count.inc(handler_name, handler.request.method, handler.get_status())
+            request_latency.observe(handler.request.request_time(), handler_name)
+
+    return Application([
         (r"/auth/live", LiveHandler),
         (r"/auth/ready", ReadyHandler),
+        (r"/auth/stats", StatsHandler),
+        (r"/auth/metrics", MetricsHandler),
+        (r"/auth/debug/profile", ProfileHandler),
+        (r"/auth/debug/slow-callbacks", SlowCallbacksHandler),
         (r"/auth/login", LoginHandler),
         (r"/auth/logout", LogoutHandler),
         (r"/auth/users/search", SearchUserHandler),
+        (r"/auth/users/search/bulk", BulkSearchUserHandler),
+        (r"/auth/users/import", ImportUsersHandler),
+        (r"/auth/users/deactivate", BulkDeactivateUsersHandler),
+        (r"/auth/users/reactivate", BulkReactivateUsersHandler),
         (r"/auth/users/(.*)/deactivate", DeactivateUserHandler),
         (r"/auth/users/(.*)/reactivate", ReactivateUserHandler),
         (r"/auth/users/me", MeUserHandler),
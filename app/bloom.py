@@ -0,0 +1,45 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    A fixed-size set of strings that answers membership with no false negatives and about `error_rate` false
+    positives, as long as no more than `capacity` strings are added. Strings can't be removed.
+
+    A million strings at a 1% error rate take about 1.2 MB.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Double hashing: two independent 64 bit hashes stand in for `hashes` hash functions
+        digest = hashlib.md5(key.encode()).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * second) % self.size for index in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def __len__(self):
+        return self.count
+
+    def stats(self):
+        return {
+            "count": self.count,
+            "capacity": self.capacity,
+            "error_rate": self.error_rate,
+            "bytes": len(self.bits)
+        }
@@ -0,0 +1,99 @@
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    A bounded, in-process least-recently-used cache with an optional time-to-live per entry.
+
+    A `max_size` of 0 disables the cache; every `get` is then a miss and `set` does nothing. With a `weigher`,
+    `max_size` bounds the total weight of the entries (e.g. their size in bytes) rather than their number.
+    """
+
+    def __init__(self, max_size, ttl=None, clock=time.monotonic, weigher=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.weigher = weigher if weigher is not None else lambda value: 1
+        self.entries = OrderedDict()
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        value, expires_at, weight = entry
+        if expires_at is not None and expires_at <= self.clock():
+            del self.entries[key]
+            self.weight -= weight
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        weight = self.weigher(value)
+        if weight > self.max_size:
+            self.invalidate(key)
+            return
+
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = self.clock() + ttl if ttl else None
+        self.invalidate(key)
+        self.entries[key] = (value, expires_at, weight)
+        self.weight += weight
+
+        while self.weight > self.max_size:
+            _, (_, _, evicted_weight) = self.entries.popitem(last=False)
+            self.weight -= evicted_weight
+            self.evictions += 1
+
+    def expires_in(self, key):
+        """Returns the number of seconds before `key` expires, or `None` if it is missing or never expires."""
+        entry = self.entries.get(key)
+        if entry is None or entry[1] is None:
+            return None
+        return entry[1] - self.clock()
+
+    def invalidate(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+
+        self.weight -= entry[2]
+        return True
+
+    def clear(self):
+        self.entries.clear()
+        self.weight = 0
+
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def stats(self):
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "weight": self.weight,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hit_ratio(),
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
@@ -2,9 +2,46 @@ HTTP = 1
 WEBSOCKET = 2
 
 class GandalfConfiguration:
-    def __init__(self, proxy_host, db_adapter, allowed_hosts, signing_secret='', mode=HTTP):
+    def __init__(self, proxy_host, db_adapter, allowed_hosts, signing_secret='', mode=HTTP,
+                 token_cache_size=10000, token_cache_ttl=30, db_workers=10,
+                 password_workers=0, password_queue_size=None, stream_uploads=False, upload_buffer_chunks=4,
+                 max_upload_size=None, stream_responses=False, upstream_client='simple', upstream_max_clients=100,
+                 upstream_connect_timeout=20.0, upstream_request_timeout=20.0, upstream_strategy='round_robin',
+                 health_check_interval=5.0, health_check_timeout=2.0, health_check_path=None, routes=None,
+                 response_cache_size=0, token_store=None, user_cache_size=10000, user_cache_ttl=30,
+                 stateless_tokens=False, token_lifetime=3600, token_clock_skew=5, revocation_sync_interval=5.0,
+                 revocation_filter_capacity=100000, session_ttl=None, session_refresh_interval=None):
         self.proxy_host = proxy_host
         self.db_adapter = db_adapter
         self.allowed_hosts = allowed_hosts
         self.signing_secret = signing_secret
         self.mode = mode
+        self.token_cache_size = token_cache_size
+        self.token_cache_ttl = token_cache_ttl
+        self.db_workers = db_workers
+        self.password_workers = password_workers
+        self.password_queue_size = password_queue_size
+        self.stream_uploads = stream_uploads
+        self.upload_buffer_chunks = upload_buffer_chunks
+        self.max_upload_size = max_upload_size
+        self.stream_responses = stream_responses
+        self.upstream_client = upstream_client
+        self.upstream_max_clients = upstream_max_clients
+        self.upstream_connect_timeout = upstream_connect_timeout
+        self.upstream_request_timeout = upstream_request_timeout
+        self.upstream_strategy = upstream_strategy
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self.health_check_path = health_check_path
+        self.routes = routes
+        self.response_cache_size = response_cache_size
+        self.token_store = token_store
+        self.user_cache_size = user_cache_size
+        self.user_cache_ttl = user_cache_ttl
+        self.stateless_tokens = stateless_tokens
+        self.token_lifetime = token_lifetime
+        self.token_clock_skew = token_clock_skew
+        self.revocation_sync_interval = revocation_sync_interval
+        self.revocation_filter_capacity = revocation_filter_capacity
+        self.session_ttl = session_ttl
+        self.session_refresh_interval = session_refresh_interval
@@ -1,3 +1,6 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
 class User:
     def __init__(self, user_id, username, hashed_password):
         self.user_id = user_id
@@ -16,6 +19,10 @@ class DBAdapter:
     def create_user(self, user_id, username, password):
         pass
 
+    def import_users(self, users):
+        """Inserts `(user_id, username, hashed_password)` tuples, skipping taken usernames. Returns the ids inserted."""
+        return []
+
     def update_user_password(self, user_id, password):
         pass
 
@@ -30,3 +37,62 @@ class DBAdapter:
 
     def reactivate_user(self, user_id):
         pass
+
+    def deactivate_users(self, user_ids):
+        """Deactivates every active user in `user_ids`. Returns the ids that were deactivated."""
+        return []
+
+    def reactivate_users(self, user_ids):
+        """Reactivates every deactivated user in `user_ids`. Returns the ids that were reactivated."""
+        return []
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+class AsyncDBAdapter:
+    """
+    Runs a blocking `DBAdapter` on a bounded thread pool so callers can yield on its results instead of blocking.
+
+    Every method mirrors `DBAdapter` but returns a `concurrent.futures.Future`.
+    """
+
+    def __init__(self, adapter: DBAdapter, max_workers=10):
+        self.adapter = adapter
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def get_user(self, username):
+        return self.executor.submit(self.adapter.get_user, username)
+
+    def create_user(self, user_id, username, password):
+        return self.executor.submit(self.adapter.create_user, user_id, username, password)
+
+    def import_users(self, users):
+        return self.executor.submit(self.adapter.import_users, users)
+
+    def update_user_password(self, user_id, password):
+        return self.executor.submit(self.adapter.update_user_password, user_id, password)
+
+    def search_for_users_by_id(self, user_ids):
+        return self.executor.submit(self.adapter.search_for_users_by_id, user_ids)
+
+    def search_for_users_by_username(self, usernames):
+        return self.executor.submit(self.adapter.search_for_users_by_username, usernames)
+
+    def deactivate_user(self, user_id):
+        return self.executor.submit(self.adapter.deactivate_user, user_id)
+
+    def reactivate_user(self, user_id):
+        return self.executor.submit(self.adapter.reactivate_user, user_id)
+
+    def deactivate_users(self, user_ids):
+        return self.executor.submit(self.adapter.deactivate_users, user_ids)
+
+    def reactivate_users(self, user_ids):
+        return self.executor.submit(self.adapter.reactivate_users, user_ids)
+
+    def stats(self):
+        return self.adapter.stats()
@@ -0,0 +1,69 @@
+"""
+Imports users from a CSV or NDJSON file straight into the database, without going through a Gandalf process. Passwords
+are hashed on a pool of processes, and one JSON result per row is written to standard output:
+
+    python -m app.db.import_users [--format csv|ndjson] [--workers N] [--batch-size N] [FILE]
+
+It reads the `GANDALF_POSTGRES_*` variables like Gandalf does. See `app.user_import` for the input format.
+"""
+import argparse
+import json
+import os
+import sys
+
+import tornado.gen
+import tornado.ioloop
+
+from app.db import AsyncDBAdapter
+from app.db.postgres_adapter import PostgresAdapter
+from app.passwords import PasswordHasher
+from app.user_import import CSV, NDJSON, ImportFormatException, ImportParser, UserImporter
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.db.import_users",
+                                     description="Import users into Gandalf's database, writing one result per row.")
+    parser.add_argument("file", nargs="?", help="the file to import (default: standard input)")
+    parser.add_argument("--format", choices=[CSV, NDJSON], default=CSV)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="processes to hash passwords with (default: the number of cores)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    def report(results):
+        sys.stdout.write("".join(json.dumps(result) + "\n" for result in results))
+
+    @tornado.gen.coroutine
+    def run(source):
+        # Nothing else hashes in this process, so the import may use every worker
+        passwords = PasswordHasher(workers=args.workers, max_pending=args.workers, bulk_workers=args.workers)
+        passwords.start()
+        adapter = PostgresAdapter()
+        try:
+            importer = UserImporter(AsyncDBAdapter(adapter, max_workers=1), passwords, report,
+                                    batch_size=args.batch_size)
+            rows = ImportParser(args.format)
+            while True:
+                chunk = source.read(65536)
+                if not chunk:
+                    break
+                yield importer.add(rows.feed(chunk))
+            yield importer.add(rows.close())
+            counts = yield importer.close()
+        finally:
+            adapter.close()
+        sys.stderr.write("Created {} users; {} already existed, {} were invalid\n".format(
+            counts.get("created", 0), counts.get("exists", 0), counts.get("invalid", 0)))
+
+    try:
+        if args.file is None:
+            tornado.ioloop.IOLoop.current().run_sync(lambda: run(sys.stdin.buffer))
+        else:
+            with open(args.file, "rb") as source:
+                tornado.ioloop.IOLoop.current().run_sync(lambda: run(source))
+    except ImportFormatException as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+
+
+class PoolTimeoutException(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    A bounded, thread-safe pool of psycopg2 connections.
+
+    Borrowers wait up to `timeout` seconds for a free connection once `max_size` connections are open. Connections
+    that sat idle for longer than `health_check_interval` seconds are pinged before being handed out, and broken
+    connections are replaced instead of being returned to the pool.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=5.0, health_check_interval=30.0,
+                 clock=time.monotonic):
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.clock = clock
+        self.condition = threading.Condition()
+        self.idle = deque()
+        self.size = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+        for _ in range(min_size):
+            self.idle.append((self.connect(), self.clock()))
+            self.size += 1
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def getconn(self):
+        started = self.clock()
+        deadline = started + self.timeout
+
+        while True:
+            conn, idle_since = self._checkout(deadline)
+            if conn is None:
+                conn = self._open()
+            elif not self._is_healthy(conn, idle_since):
+                self._discard(conn)
+                continue
+
+            waited = self.clock() - started
+            with self.condition:
+                self.checkouts += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+            return conn
+
+    def putconn(self, conn):
+        if not conn.closed and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+
+        if conn.closed:
+            self._discard(conn)
+        else:
+            with self.condition:
+                self.idle.append((conn, self.clock()))
+                self.condition.notify()
+
+    def close(self):
+        with self.condition:
+            while self.idle:
+                conn, _ = self.idle.pop()
+                conn.close()
+                self.size -= 1
+
+    def stats(self):
+        with self.condition:
+            in_use = self.size - len(self.idle)
+            return {
+                "size": self.size,
+                "idle": len(self.idle),
+                "in_use": in_use,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "utilization": in_use / self.max_size if self.max_size > 0 else 0.0,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "average_wait": self.total_wait / self.checkouts if self.checkouts > 0 else 0.0,
+                "max_wait": self.max_wait
+            }
+
+    def _checkout(self, deadline):
+        with self.condition:
+            while True:
+                if self.idle:
+                    return self.idle.pop()
+
+                if self.size < self.max_size:
+                    # Reserve the slot now; the connection itself is opened outside the lock
+                    self.size += 1
+                    return None, None
+
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeoutException()
+                self.condition.wait(remaining)
+
+    def _open(self):
+        try:
+            return self.connect()
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+    def _is_healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+
+        if self.clock() - idle_since < self.health_check_interval:
+            return True
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
@@ -1,8 +1,52 @@
+import csv
+import io
 import os
 
 import psycopg2
+import psycopg2.extensions
 
 from app.db import DBAdapter, User, UserExistsException
+from app.db.pool import ConnectionPool
+
+
+def _move_users(source, destination):
+    # Rows whose username is taken in `destination` stay where they are
+    return ("WITH moved AS ("
+            "  INSERT INTO {destination} (user_id, username, password)"
+            "  SELECT user_id, username, password FROM {source} WHERE user_id = ANY($1)"
+            "  ON CONFLICT DO NOTHING RETURNING user_id"
+            ") DELETE FROM {source} WHERE user_id IN (SELECT user_id FROM moved)"
+            "  RETURNING user_id").format(source=source, destination=destination)
+
+
+# The fixed set of queries, each prepared once per connection the first time it is used there
+STATEMENTS = {
+    "gandalf_get_user": "SELECT user_id, username, password FROM gandalf.users WHERE username = $1",
+    "gandalf_create_user": "INSERT INTO gandalf.users (user_id, username, password) VALUES ($1, $2, $3)"
+                           "  ON CONFLICT DO NOTHING RETURNING user_id",
+    "gandalf_update_user_password": "UPDATE gandalf.users SET password = $1 WHERE user_id = $2",
+    "gandalf_search_for_users_by_id": "SELECT user_id, username, password FROM gandalf.users WHERE user_id = ANY($1)",
+    "gandalf_search_for_users_by_username": "SELECT user_id, username, password FROM gandalf.users"
+                                            "  WHERE username = ANY($1)",
+    "gandalf_deactivate_users": _move_users("gandalf.users", "gandalf.deactivated_users"),
+    "gandalf_reactivate_users": _move_users("gandalf.deactivated_users", "gandalf.users")
+}
+
+
+class PreparingConnection(psycopg2.extensions.connection):
+    """A psycopg2 connection that remembers which `STATEMENTS` have been prepared on it."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+    def execute(self, name, args):
+        cursor = self.cursor()
+        if name not in self.prepared:
+            cursor.execute("PREPARE {} AS {}".format(name, STATEMENTS[name]))
+            self.prepared.add(name)
+        cursor.execute("EXECUTE {} ({})".format(name, ", ".join(["%s"] * len(args))), args)
+        return cursor
 
 
 class PostgresAdapter(DBAdapter):
@@ -13,7 +57,8 @@ class PostgresAdapter(DBAdapter):
         database = os.getenv("GANDALF_POSTGRES_DB", None)
         user = os.getenv("GANDALF_POSTGRES_USER", "postgres")
         password = os.getenv("GANDALF_POSTGRES_PASSWORD", "postgres")
-        return psycopg2.connect(host=host, port=port, user=user, password=password, database=database)
+        return psycopg2.connect(host=host, port=port, user=user, password=password, database=database,
+                                connection_factory=PreparingConnection)
 
     @staticmethod
     def _user_row_mapper(row):
@@ -22,74 +67,106 @@ class PostgresAdapter(DBAdapter):
         else:
             return None
 
-    def __init__(self):
-        conn = self._new_connection()
-        cursor = conn.cursor()
-        cursor.execute("CREATE SCHEMA IF NOT EXISTS gandalf")
-        cursor.execute(
-            "CREATE TABLE IF NOT EXISTS gandalf.users ("
-            "  user_id TEXT PRIMARY KEY,"
-            "  username TEXT UNIQUE,"
-            "  password TEXT"
-            ")"
-        )
-        cursor.execute(
-            "CREATE TABLE IF NOT EXISTS gandalf.deactivated_users ("
-            "  user_id TEXT PRIMARY KEY,"
-            "  username TEXT UNIQUE,"
-            "  password TEXT"
-            ")"
-        )
-        conn.commit()
+    def __init__(self, min_connections=None, max_connections=None, checkout_timeout=None, create_schema=True):
+        if min_connections is None:
+            min_connections = int(os.getenv("GANDALF_POSTGRES_POOL_MIN", "1"))
+        if max_connections is None:
+            max_connections = int(os.getenv("GANDALF_POSTGRES_POOL_MAX", "10"))
+        if checkout_timeout is None:
+            checkout_timeout = float(os.getenv("GANDALF_POSTGRES_POOL_TIMEOUT", "5"))
+
+        self.pool = ConnectionPool(self._new_connection, min_size=min_connections, max_size=max_connections,
+                                   timeout=checkout_timeout)
+
+        if create_schema:
+            self.create_schema()
+
+    def create_schema(self):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("CREATE SCHEMA IF NOT EXISTS gandalf")
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS gandalf.users ("
+                "  user_id TEXT PRIMARY KEY,"
+                "  username TEXT UNIQUE,"
+                "  password TEXT"
+                ")"
+            )
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS gandalf.deactivated_users ("
+                "  user_id TEXT PRIMARY KEY,"
+                "  username TEXT UNIQUE,"
+                "  password TEXT"
+                ")"
+            )
+            conn.commit()
 
     def get_user(self, username) -> User:
-        conn = self._new_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT user_id, username, password FROM gandalf.users WHERE username = %s", [username])
-        return self._user_row_mapper(cursor.fetchone())
+        with self.pool.connection() as conn:
+            cursor = conn.execute("gandalf_get_user", [username])
+            return self._user_row_mapper(cursor.fetchone())
 
     def create_user(self, user_id, username, password):
-        conn = self._new_connection()
-        cursor = conn.cursor()
+        with self.pool.connection() as conn:
+            cursor = conn.execute("gandalf_create_user", [user_id, username, password])
+            created = cursor.fetchone() is not None
+            conn.commit()
+            if not created:
+                raise UserExistsException()
 
-        cursor.execute("SELECT username FROM gandalf.users WHERE username = %s", [username])
-        if cursor.fetchone() is not None:
-            raise UserExistsException()
+    def import_users(self, users):
+        rows = io.StringIO()
+        csv.writer(rows).writerows(users)
+        rows.seek(0)
 
-        cursor.execute("INSERT INTO gandalf.users (user_id, username, password) VALUES (%s, %s, %s)",
-                       [user_id, username, password])
-        conn.commit()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("CREATE TEMPORARY TABLE imported_users (user_id TEXT, username TEXT, password TEXT)"
+                           "  ON COMMIT DROP")
+            cursor.copy_expert("COPY imported_users (user_id, username, password) FROM STDIN WITH (FORMAT csv)", rows)
+            cursor.execute("INSERT INTO gandalf.users (user_id, username, password)"
+                           "  SELECT user_id, username, password FROM imported_users"
+                           "  ON CONFLICT DO NOTHING RETURNING user_id")
+            user_ids = [row[0] for row in cursor]
+            conn.commit()
+            return user_ids
 
     def update_user_password(self, user_id, password):
-        conn = self._new_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE gandalf.users SET password = %s WHERE user_id = %s", [password, user_id]),
-        conn.commit()
+        with self.pool.connection() as conn:
+            conn.execute("gandalf_update_user_password", [password, user_id])
+            conn.commit()
 
     def search_for_users_by_id(self, user_ids):
-        conn = self._new_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT user_id, username, password FROM gandalf.users WHERE user_id = ANY(%s)", [user_ids]),
-        return [self._user_row_mapper(row) for row in cursor]
+        with self.pool.connection() as conn:
+            cursor = conn.execute("gandalf_search_for_users_by_id", [list(user_ids)])
+            return [self._user_row_mapper(row) for row in cursor]
 
     def search_for_users_by_username(self, usernames):
-        conn = self._new_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT user_id, username, password FROM gandalf.users WHERE username = ANY(%s)", [usernames]),
-        return [self._user_row_mapper(row) for row in cursor]
+        with self.pool.connection() as conn:
+            cursor = conn.execute("gandalf_search_for_users_by_username", [list(usernames)])
+            return [self._user_row_mapper(row) for row in cursor]
 
     def deactivate_user(self, user_id):
-        conn = self._new_connection()
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO gandalf.deactivated_users (user_id, username, password)"
-                       "SELECT user_id, username, password FROM gandalf.users WHERE user_id = %s", [user_id])
-        cursor.execute("DELETE FROM gandalf.users WHERE user_id = %s", [user_id]),
-        conn.commit()
+        self.deactivate_users([user_id])
+
+    def deactivate_users(self, user_ids):
+        return self._move_users("gandalf_deactivate_users", user_ids)
 
     def reactivate_user(self, user_id):
-        conn = self._new_connection()
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO gandalf.users (user_id, username, password)"
-                       "SELECT user_id, username, password FROM gandalf.deactivated_users WHERE user_id = %s", [user_id])
-        cursor.execute("DELETE FROM gandalf.deactivated_users WHERE user_id = %s", [user_id]),
-        conn.commit()
+        self.reactivate_users([user_id])
+
+    def reactivate_users(self, user_ids):
+        return self._move_users("gandalf_reactivate_users", user_ids)
+
+    def _move_users(self, statement, user_ids):
+        with self.pool.connection() as conn:
+            cursor = conn.execute(statement, [list(user_ids)])
+            moved = [row[0] for row in cursor]
+            conn.commit()
+            return moved
+
+    def stats(self):
+        return {"pool": self.pool.stats()}
+
+    def close(self):
+        self.pool.close()
@@ -0,0 +1,217 @@
+import bisect
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+             for name, value in zip(names, values))
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Values may be recorded from worker threads (e.g. database calls) as well as the IOLoop
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def header(self):
+        return ["# HELP {} {}".format(self.name, self.documentation), "# TYPE {} {}".format(self.name, self.type)]
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        with self.lock:
+            values = sorted(self.values.items())
+        return self.header() + ["{}{} {}".format(self.name, _format_labels(self.labelnames, labels),
+                                                 _format_value(value)) for labels, value in values]
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def render(self):
+        with self.lock:
+            values = sorted(self.values.items())
+        return self.header() + ["{}{} {}".format(self.name, _format_labels(self.labelnames, labels),
+                                                 _format_value(value)) for labels, value in values]
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        # Counts are kept per bucket and only accumulated when rendering, so recording is one bisect and two adds
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, future, *labels):
+        """Observes how long `future` takes to resolve, starting now. Returns `future`."""
+        started = time.monotonic()
+        future.add_done_callback(lambda _: self.observe(time.monotonic() - started, *labels))
+        return future
+
+    def render(self):
+        with self.lock:
+            values = sorted((labels, (list(counts), total)) for labels, (counts, total) in self.values.items())
+
+        lines = self.header()
+        labelnames = self.labelnames + ('le',)
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append("{}_bucket{} {}".format(self.name, _format_labels(labelnames, labels + (
+                    _format_value(bound),)), cumulative))
+            lines.append("{}_sum{} {}".format(self.name, _format_labels(self.labelnames, labels), repr(total)))
+            lines.append("{}_count{} {}".format(self.name, _format_labels(self.labelnames, labels), cumulative))
+        return lines
+
+
+class Registry:
+    """
+    A set of metrics rendered together in the Prometheus text exposition format.
+
+    Collectors are functions called on every render that return freshly built metrics, for values that are already
+    tracked elsewhere and only need to be exported.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        metrics = list(self.metrics)
+        for collector in self.collectors:
+            metrics.extend(collector())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+def _stat_samples(name, value, labels):
+    if isinstance(value, (bool, int, float)):
+        yield name, labels, value
+    elif isinstance(value, dict):
+        # Strings describe the values next to them (e.g. an upstream's address), so they become labels
+        labels = dict(labels, **{key: item for key, item in value.items() if isinstance(item, str)})
+        for key, item in sorted(value.items()):
+            yield from _stat_samples("{}_{}".format(name, key), item, labels)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _stat_samples(name, item, labels)
+
+
+def gauges_from_stats(prefix, stats):
+    """Turns every number in a nested stats dict into a gauge named after its path, e.g. `gandalf_database_size`."""
+    samples = {}
+    for name, labels, value in _stat_samples(prefix, stats, {}):
+        samples.setdefault(name, []).append((labels, value))
+
+    gauges = []
+    for name, values in sorted(samples.items()):
+        labelnames = sorted(set(labelname for labels, _ in values for labelname in labels))
+        gauge = Gauge(name, "Exported from /auth/stats", labelnames)
+        for labels, value in values:
+            gauge.set(int(value) if isinstance(value, bool) else value,
+                      *(labels.get(labelname, "") for labelname in labelnames))
+        gauges.append(gauge)
+    return gauges
+
+
+class MeteredProxy:
+    """
+    Wraps an object whose methods return futures, timing each call to one of `methods` in `histogram`, labelled
+    with the method name. Everything else is passed through untouched.
+    """
+
+    def __init__(self, target, histogram, methods):
+        self.target = target
+        self.histogram = histogram
+        self.methods = frozenset(methods)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.target, name)
+        if name not in self.methods:
+            return attribute
+
+        def timed(*args, **kwargs):
+            return self.histogram.time(attribute(*args, **kwargs), name)
+
+        return timed
+
+
+class IOLoopLagMonitor:
+    """
+    Schedules a callback every `interval` seconds and records how late it runs, which is how long the IOLoop was
+    busy with something else.
+    """
+
+    def __init__(self, io_loop, histogram, gauge, interval=0.5):
+        self.io_loop = io_loop
+        self.histogram = histogram
+        self.gauge = gauge
+        self.interval = interval
+
+    def start(self):
+        self.io_loop.call_later(self.interval, self.check, self.io_loop.time() + self.interval)
+
+    def check(self, expected):
+        lag = max(0.0, self.io_loop.time() - expected)
+        self.histogram.observe(lag)
+        self.gauge.set(lag)
+        self.start()
@@ -0,0 +1,112 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import tornado.gen
+import tornado.locks
+from passlib.apps import custom_app_context as pwd_context
+
+
+class PasswordHasherSaturatedException(Exception):
+    pass
+
+
+def encrypt_password(password):
+    return pwd_context.encrypt(password)
+
+
+def verify_password(password, hashed_password):
+    return pwd_context.verify(password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords on a pool of worker processes so the CPU cost never lands on the IOLoop thread.
+
+    At most `max_pending` operations may be queued or running at once; beyond that, calls fail immediately with
+    `PasswordHasherSaturatedException` so callers can shed load instead of queueing indefinitely. With `workers=0`
+    the work runs inline, which is only suitable for tests and tooling.
+
+    Bulk hashing with `encrypt_many` keeps at most `bulk_workers` (default: half the workers, at least one) of its
+    passwords in the pool at once, across every caller, so that logins are not queued behind a large import.
+
+    The worker processes are forked, so `start` must be called before the process starts any thread: a child forked
+    while another thread holds a lock, such as a connection pool's or a logging handler's, can deadlock on it.
+    """
+
+    def __init__(self, workers=0, max_pending=None, bulk_workers=None):
+        self.workers = workers
+        self.max_pending = max_pending if max_pending is not None else workers * 4
+        self.bulk_workers = bulk_workers if bulk_workers is not None else max(1, workers // 2)
+        self.bulk_slots = tornado.locks.Semaphore(self.bulk_workers)
+        self.pending = 0
+        self.rejected = 0
+        self.executor = None
+
+    def start(self):
+        """Forks the worker processes and waits until they run."""
+        if self.workers <= 0 or self.executor is not None:
+            return
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        # The executor only forks its workers once something is submitted
+        self.executor.submit(int).result()
+
+    @tornado.gen.coroutine
+    def _run(self, function, *args):
+        results = yield self._run_all(function, [args])
+        return results[0]
+
+    @tornado.gen.coroutine
+    def _run_all(self, function, calls, slots=None):
+        """
+        Runs `function` once per argument tuple in `calls`, in parallel, as a single pending operation. With `slots`,
+        a `Semaphore`, each call holds one of them while it is in the pool.
+        """
+        if self.workers <= 0:
+            return [function(*args) for args in calls]
+
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherSaturatedException()
+
+        if self.executor is None:
+            raise RuntimeError("PasswordHasher.start() must be called before hashing with worker processes")
+
+        self.pending += 1
+        try:
+            if slots is not None:
+                results = yield [self._run_in_slot(slots, function, args) for args in calls]
+                return results
+
+            futures = [self.executor.submit(function, *args) for args in calls]
+            # Each is yielded on its own: a list of executor futures would be resolved on the executor's threads,
+            # without waking the IOLoop
+            results = []
+            for future in futures:
+                results.append((yield future))
+            return results
+        finally:
+            self.pending -= 1
+
+    @tornado.gen.coroutine
+    def _run_in_slot(self, slots, function, args):
+        with (yield slots.acquire()):
+            result = yield self.executor.submit(function, *args)
+        return result
+
+    def encrypt(self, password):
+        return self._run(encrypt_password, password)
+
+    def encrypt_many(self, passwords):
+        # The whole batch only takes one slot of `max_pending`, and only `bulk_workers` of its passwords at a time
+        return self._run_all(encrypt_password, [(password,) for password in passwords], slots=self.bulk_slots)
+
+    def verify(self, password, hashed_password):
+        return self._run(verify_password, password, hashed_password)
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "bulk_workers": self.bulk_workers,
+            "rejected": self.rejected
+        }
@@ -0,0 +1,105 @@
+import signal
+import time
+from collections import Counter
+
+
+class ProfilerBusyException(Exception):
+    pass
+
+
+def collapse(frame):
+    """Formats the stack ending at `frame` root first, separated by `;`, as used by flamegraph tools."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append("{} ({}:{})".format(code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of the main thread every `interval` seconds of CPU time, using `SIGPROF`.
+
+    Sampling only costs a stack walk per sample, so it is cheap enough to run on a live worker. Only one profiler can
+    run per process at a time, and it must be started from the main thread, which is where Gandalf runs its IOLoop.
+    """
+
+    running = False
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self.previous_handler = None
+
+    def start(self):
+        if SamplingProfiler.running:
+            raise ProfilerBusyException()
+        SamplingProfiler.running = True
+
+        try:
+            self.previous_handler = signal.signal(signal.SIGPROF, self.sample)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        except Exception:
+            SamplingProfiler.running = False
+            raise
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self.previous_handler or signal.SIG_DFL)
+        SamplingProfiler.running = False
+
+    def sample(self, signum, frame):
+        self.samples[collapse(frame)] += 1
+
+    def collapsed(self):
+        """Returns one `stack count` line per distinct stack, the most sampled first."""
+        return "".join("{} {}\n".format(stack, count) for stack, count in self.samples.most_common())
+
+
+class BlockingMonitor:
+    """
+    Records what the IOLoop was running whenever it went `threshold` seconds without getting back to polling, using
+    `IOLoop.set_blocking_signal_threshold`.
+
+    How long it stayed blocked is measured from when the loop next gets to run a callback, so it is approximate.
+    """
+
+    running = False
+
+    def __init__(self, io_loop, threshold=0.05, clock=time.monotonic):
+        self.io_loop = io_loop
+        self.threshold = threshold
+        self.clock = clock
+        self.events = {}
+
+    def start(self):
+        if BlockingMonitor.running:
+            raise ProfilerBusyException()
+        BlockingMonitor.running = True
+
+        try:
+            self.io_loop.set_blocking_signal_threshold(self.threshold, self.on_blocked)
+        except Exception:
+            BlockingMonitor.running = False
+            raise
+
+    def stop(self):
+        self.io_loop.set_blocking_signal_threshold(None, None)
+        BlockingMonitor.running = False
+
+    def on_blocked(self, signum, frame):
+        stack = collapse(frame)
+        self.io_loop.add_callback_from_signal(self.on_unblocked, stack, self.clock())
+
+    def on_unblocked(self, stack, signalled_at):
+        blocked = self.threshold + self.clock() - signalled_at
+        count, total, longest = self.events.get(stack, (0, 0.0, 0.0))
+        self.events[stack] = (count + 1, total + blocked, max(longest, blocked))
+
+    def report(self):
+        """Returns the blocking stacks, the longest block first."""
+        return [
+            {"stack": stack.split(";"), "count": count, "total_seconds": total, "max_seconds": longest}
+            for stack, (count, total, longest) in sorted(self.events.items(), key=lambda event: -event[1][2])
+        ]
@@ -0,0 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import redis
+
+
+class AsyncRedis:
+    """
+    A non-blocking facade over `redis.StrictRedis`.
+
+    Each operation passed to `run` runs on a bounded thread pool backed by a connection pool of the same size, and
+    returns a `concurrent.futures.Future` that Tornado coroutines can yield on. A slow Redis then only delays the
+    requests waiting on it instead of stalling the whole IOLoop.
+    """
+
+    def __init__(self, host='localhost', port=6379, max_connections=50):
+        self.connection_pool = redis.ConnectionPool(host=host, port=port, max_connections=max_connections)
+        self.client = redis.StrictRedis(connection_pool=self.connection_pool)
+        self.executor = ThreadPoolExecutor(max_workers=max_connections)
+
+    def run(self, function, *args):
+        """Runs `function(client, *args)` on the pool. Every operation, from a single command up, goes through here."""
+        return self.executor.submit(function, self.client, *args)
+
+    def pubsub(self, **kwargs):
+        """Subscriptions hold a dedicated connection and block while listening, so they stay synchronous."""
+        return self.client.pubsub(**kwargs)
@@ -0,0 +1,150 @@
+import time
+
+import tornado.httputil
+
+from app.cache import LRUCache
+
+
+def parse_cache_control(value):
+    """Parses a `Cache-Control` header into a dict of lowercased directive names to their value (or `None`)."""
+    directives = {}
+    for directive in (value or "").split(","):
+        name, _, argument = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip().strip('"') if argument else None
+    return directives
+
+
+def _seconds(directives, name):
+    try:
+        return int(directives[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class CachedResponse:
+    def __init__(self, code, headers, body, vary, stored_at, age=0):
+        self.code = code
+        self.headers = headers
+        self.body = body
+        self.vary = vary
+        self.stored_at = stored_at
+        self.age = age
+
+    @property
+    def size(self):
+        return len(self.body) + sum(len(name) + len(value) for name, value in self.headers)
+
+
+class ResponseCache:
+    """
+    A memory-bounded LRU cache of proxied `GET` responses, following the upstream's `Cache-Control` and `Vary`.
+
+    Only `200` responses with a `max-age` or `s-maxage` are stored. Entries are keyed by the requested host and URI,
+    since different hosts may route to different services. Responses marked `public` or carrying an `s-maxage` are
+    shared between users; everything else is private and only served back to the same `USER_ID`. Each URI keeps a
+    single variant per scope: a request whose `Vary` headers differ from the stored ones falls back
+    to the shared variant, or misses and replaces it. `max_size` bounds the total size of the stored bodies and headers
+    in bytes.
+
+    URIs whose last response could not be stored are remembered for `hint_ttl` seconds, so that `expects_to_store`
+    can tell the proxy not to ask for a full response it would not keep.
+    """
+
+    def __init__(self, max_size, max_entry_size=None, clock=time.monotonic, max_hints=10000, hint_ttl=60):
+        self.clock = clock
+        self.max_entry_size = max_entry_size if max_entry_size is not None else max_size // 8
+        self.entries = LRUCache(max_size, clock=clock, weigher=lambda response: response.size)
+        self.uncacheable = LRUCache(max_hints if self.enabled else 0, ttl=hint_ttl, clock=clock)
+
+    @property
+    def enabled(self):
+        return self.entries.max_size > 0
+
+    @staticmethod
+    def bypass(request_headers):
+        directives = parse_cache_control(request_headers.get('Cache-Control'))
+        return 'no-cache' in directives or 'no-store' in directives or _seconds(directives, 'max-age') == 0
+
+    def lookup(self, user_id, host, uri, request_headers):
+        """Returns a fresh `CachedResponse` for the request, or `None`. `request_headers` are those sent upstream."""
+        if not self.enabled or self.bypass(request_headers):
+            return None
+
+        def matches(response):
+            return all(request_headers.get(name) == value for name, value in response.vary.items())
+
+        # Only the shared lookup counts as a miss, so that each request is counted once
+        key = (user_id, host, uri)
+        response = self.entries.get(key) if key in self.entries else None
+        if response is not None and matches(response):
+            return response
+        response = self.entries.get((None, host, uri))
+        if response is not None and matches(response):
+            return response
+        return None
+
+    def expects_to_store(self, host, uri):
+        """Whether the next response for `uri` is likely to be stored, i.e. the last one was not rejected."""
+        return self.enabled and not self.uncacheable.get((host, uri), False)
+
+    def store(self, user_id, host, uri, request_headers, code, headers, body):
+        """
+        Stores the upstream response if it may be reused. `headers` are the response headers as they are forwarded
+        to the client, as `(name, value)` pairs. `body` is `None` when it was too large to keep.
+        """
+        if not self.enabled:
+            return False
+
+        stored = self._store(user_id, host, uri, request_headers, code, headers, body)
+        # Neither a 304 nor a response the client asked not to store says whether the next full response can be stored
+        if code != 304 and 'no-store' not in parse_cache_control(request_headers.get('Cache-Control')):
+            if stored:
+                self.uncacheable.invalidate((host, uri))
+            else:
+                self.uncacheable.set((host, uri), True)
+        return stored
+
+    def _store(self, user_id, host, uri, request_headers, code, headers, body):
+        if code != 200 or body is None or len(body) > self.max_entry_size:
+            return False
+
+        request_directives = parse_cache_control(request_headers.get('Cache-Control'))
+        response_headers = tornado.httputil.HTTPHeaders()
+        for name, value in headers:
+            response_headers.add(name, value)
+        directives = parse_cache_control(response_headers.get('Cache-Control'))
+        if 'no-store' in request_directives or 'no-store' in directives or 'no-cache' in directives:
+            return False
+
+        vary_names = [name.strip() for name in response_headers.get('Vary', "").split(",") if name.strip()]
+        if '*' in vary_names:
+            return False
+
+        shared = 'private' not in directives and ('public' in directives or 's-maxage' in directives)
+        if shared and 'Set-Cookie' in response_headers:
+            return False
+
+        max_age = _seconds(directives, 's-maxage') if shared else None
+        if max_age is None:
+            max_age = _seconds(directives, 'max-age')
+        age = _seconds({'age': response_headers.get('Age')}, 'age') or 0
+        if max_age is None or max_age - age <= 0:
+            return False
+
+        vary = {name: request_headers.get(name) for name in vary_names}
+        response = CachedResponse(code, [(name, value) for name, value in headers if name != 'Age'], body, vary,
+                                  self.clock(), age)
+        self.entries.set((None if shared else user_id, host, uri), response, ttl=max_age - age)
+        return True
+
+    def age(self, response):
+        return response.age + int(self.clock() - response.stored_at)
+
+    def invalidate(self, user_id, host, uri):
+        """Drops the requesting user's and the shared copies of `uri`, e.g. after it was modified through the proxy."""
+        self.entries.invalidate((user_id, host, uri))
+        self.entries.invalidate((None, host, uri))
+
+    def stats(self):
+        return self.entries.stats()
@@ -0,0 +1,97 @@
+import logging
+import time
+
+import tornado.gen
+
+from app.bloom import BloomFilter
+
+logger = logging.getLogger('gandalf')
+
+
+class RevocationFilter:
+    """
+    This process's copy of the token store's revocation list for self-contained tokens.
+
+    Revoked token ids go into a Bloom filter, so checking a token is a local probe; the rare hit, which may be a false
+    positive, is confirmed with the token store. Users whose tokens were all revoked are few, and are kept exactly.
+
+    `sync` reads the revocations made since the last sync from the token store. The whole list is read again every
+    `max_token_age` seconds, or once the filter holds more than its capacity, to forget revocations of tokens that
+    have expired since.
+    """
+
+    def __init__(self, token_store, max_token_age, capacity=100000, clock=time.time):
+        self.token_store = token_store
+        self.max_token_age = max_token_age
+        self.capacity = capacity
+        self.clock = clock
+        self.token_ids = BloomFilter(capacity)
+        self.users = {}
+        self.position = None
+        self.reload_at = 0
+        self.syncing = False
+        self.sync_again = False
+        self.confirmations = 0
+        self.false_positives = 0
+
+    def add(self, token_ids, users):
+        for token_id in token_ids:
+            self.token_ids.add(token_id)
+        for user_id, issued_before in users.items():
+            self.users[user_id] = max(issued_before, self.users.get(user_id, issued_before))
+
+    @tornado.gen.coroutine
+    def reload(self):
+        token_ids, users, position = yield self.token_store.revocations(self.max_token_age)
+        self.token_ids = BloomFilter(max(self.capacity, len(token_ids) * 2))
+        self.users = {}
+        self.add(token_ids, users)
+        self.position = position
+        self.reload_at = self.clock() + self.max_token_age
+
+    def needs_reload(self):
+        return self.position is None or self.clock() >= self.reload_at or len(self.token_ids) > self.token_ids.capacity
+
+    @tornado.gen.coroutine
+    def sync(self):
+        # Announcements can arrive in bursts; they are folded into at most one more sync after the current one
+        if self.syncing:
+            self.sync_again = True
+            return
+
+        self.syncing = True
+        try:
+            self.sync_again = True
+            while self.sync_again:
+                self.sync_again = False
+                if self.needs_reload():
+                    yield self.reload()
+                else:
+                    token_ids, users, position = yield self.token_store.revocations_since(self.position)
+                    self.add(token_ids, users)
+                    self.position = position
+        except Exception:
+            logger.exception("Unable to sync the token revocation list")
+        finally:
+            self.syncing = False
+
+    @tornado.gen.coroutine
+    def is_revoked(self, claims):
+        if claims['iat'] <= self.users.get(claims['userId'], -1):
+            return True
+        if claims['jti'] not in self.token_ids:
+            return False
+
+        self.confirmations += 1
+        revoked = yield self.token_store.is_token_id_revoked(claims['jti'])
+        if not revoked:
+            self.false_positives += 1
+        return revoked
+
+    def stats(self):
+        return {
+            "token_ids": self.token_ids.stats(),
+            "users": len(self.users),
+            "confirmations": self.confirmations,
+            "false_positives": self.false_positives
+        }
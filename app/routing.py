@@ -0,0 +1,80 @@
+class _Node:
+    __slots__ = ('children', 'target')
+
+    def __init__(self):
+        self.children = {}
+        self.target = None
+
+
+class RouteTable:
+    """
+    Maps a request's host and path to a target (usually an `UpstreamPool`) by longest matching path prefix.
+
+    Prefixes match whole path segments, so `/orders` matches `/orders` and `/orders/1` but not `/orders-archive`.
+    Routes for a specific host win over host-less routes, which in turn win over the default. Each host's routes
+    are kept in a trie of path segments, so a lookup costs O(length of the path) however many routes there are.
+    """
+
+    def __init__(self, default=None):
+        self.default = default
+        self.roots = {}
+        self.routes = []
+
+    @staticmethod
+    def _segments(path):
+        return [segment for segment in path.split("/") if segment]
+
+    @staticmethod
+    def _hostname(host):
+        return host.split(":")[0].lower() if host else None
+
+    def add(self, prefix, target, host=None):
+        host = self._hostname(host)
+        node = self.roots.setdefault(host, _Node())
+        for segment in self._segments(prefix):
+            node = node.children.setdefault(segment, _Node())
+        node.target = target
+        self.routes.append((host, prefix, target))
+
+    def _longest_match(self, host, segments):
+        node = self.roots.get(host)
+        if node is None:
+            return None
+
+        match = node.target
+        for segment in segments:
+            node = node.children.get(segment)
+            if node is None:
+                break
+            if node.target is not None:
+                match = node.target
+        return match
+
+    def resolve(self, host, path):
+        segments = self._segments(path)
+        hostname = self._hostname(host)
+
+        if hostname is not None:
+            match = self._longest_match(hostname, segments)
+            if match is not None:
+                return match
+
+        match = self._longest_match(None, segments)
+        return match if match is not None else self.default
+
+    @classmethod
+    def parse(cls, spec, make_target, default=None):
+        """
+        Parses whitespace separated `[host]/prefix=>target` entries, handing each `target` string to `make_target`.
+
+        For example `/orders=>orders-1:80,orders-2:80 api.example.com/users=>users:80`.
+        """
+        table = cls(default)
+        for entry in (spec or "").split():
+            route, separator, target = entry.partition("=>")
+            if not separator or not target:
+                raise ValueError("Invalid route '{}', expected '[host]/prefix=>target'".format(entry))
+
+            host, _, path = route.partition("/")
+            table.add("/" + path, make_target(target), host=host or None)
+        return table
@@ -0,0 +1,113 @@
+from concurrent.futures import Future
+
+
+def resolved(value):
+    """Wraps a value that is already known in a `Future`, for stores that never need to wait."""
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+class TokenStore:
+    """
+    Holds the access tokens that are currently valid and the user each one belongs to.
+
+    Every method returns a `concurrent.futures.Future` so that stores backed by a network service don't block the
+    IOLoop. A user has at most one token at a time. Stores given a `ttl` expire tokens that many seconds after they
+    were issued or last refreshed.
+    """
+
+    def issue(self, user, token):
+        """
+        Makes `token` valid for `user` (a `{"userId": ..., "username": ...}` dict), unless the user already has a
+        token, whose session is then refreshed. Resolves to the user's token, which is either the existing one or
+        `token`.
+        """
+        raise NotImplementedError()
+
+    def refresh(self, token, user_id):
+        """Restarts the `ttl` of `token`, issued to `user_id`. Resolves to `False` if the token is no longer valid."""
+        raise NotImplementedError()
+
+    def lookup(self, token):
+        """Resolves to the user dict `token` was issued for, or `None` if it is unknown or revoked."""
+        raise NotImplementedError()
+
+    def lookup_with_ttl(self, token):
+        """
+        Resolves to `(user, ttl)`: the user dict `token` was issued for, or `None`, and the number of seconds before its
+        session expires, or `None` if it never does.
+        """
+        raise NotImplementedError()
+
+    def revoke(self, token):
+        """Invalidates `token`. Resolves to `True` if it was valid."""
+        raise NotImplementedError()
+
+    def revoke_all_for_user(self, user_id):
+        """Invalidates every token issued to `user_id`. Resolves to the list of revoked tokens."""
+        raise NotImplementedError()
+
+    def revoke_all_for_users(self, user_ids):
+        """Invalidates every token issued to any of `user_ids`. Resolves to the list of revoked tokens."""
+        raise NotImplementedError()
+
+    def revoke_token_id(self, token_id, expires_at):
+        """
+        Adds the `jti` of a self-contained token to the revocation list until `expires_at` (a Unix timestamp), after
+        which the token is rejected for having expired anyway.
+        """
+        raise NotImplementedError()
+
+    def revoke_tokens_issued_before(self, user_id, issued_before):
+        """Adds `user_id` to the revocation list, rejecting its self-contained tokens issued at or before then."""
+        raise NotImplementedError()
+
+    def revoke_tokens_issued_before_for_users(self, user_ids, issued_before):
+        """Does `revoke_tokens_issued_before` for each of `user_ids`."""
+        raise NotImplementedError()
+
+    def revocations(self, max_token_age):
+        """
+        Resolves to the whole revocation list as a `({jti: expires_at}, {user_id: issued_before}, position)` tuple,
+        first dropping the entries that can no longer match a token younger than `max_token_age` seconds. `position`
+        can be passed to `revocations_since` to get the revocations made after this call.
+        """
+        raise NotImplementedError()
+
+    def revocations_since(self, position):
+        """Resolves to the revocations made after `position`, in the same form as `revocations`."""
+        raise NotImplementedError()
+
+    def is_token_id_revoked(self, token_id):
+        """Resolves to `True` if the `jti` of a self-contained token is on the revocation list."""
+        raise NotImplementedError()
+
+    def add_revocation_listener(self, callback):
+        """
+        Calls `callback(token)` on the IOLoop whenever a token is revoked, including by other processes sharing the
+        store. `callback(None)` means revocations may have been missed and anything derived from the store should be
+        dropped.
+        """
+        raise NotImplementedError()
+
+    def announce_user_changes(self, user_ids):
+        """Tells every process sharing the store that the records of `user_ids` have changed."""
+        raise NotImplementedError()
+
+    def add_user_change_listener(self, callback):
+        """
+        Calls `callback(user_ids)` on the IOLoop whenever `announce_user_changes` is called, including by other
+        processes sharing the store. `callback(None)` means announcements may have been missed.
+        """
+        raise NotImplementedError()
+
+    def ping(self):
+        """Resolves to `True` if the store can currently be written to and read from."""
+        raise NotImplementedError()
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        pass
@@ -0,0 +1,150 @@
+"""
+Cleans up the keys the Redis token store has accumulated:
+
+- tokens whose user key no longer points at them, which can't be signed out and would never expire; they are
+  published on the revocation channel so that no Gandalf worker keeps serving them from its token cache
+- user keys pointing at tokens that no longer exist
+- with `--ttl`, sessions stored without an expiry, which are given one
+
+Run it once against the Redis used by Gandalf:
+
+    python -m app.token_store.compact [--host HOST] [--port PORT] [--ttl SECONDS] [--dry-run]
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+
+import redis
+
+from app.token_store.redis_store import REVOCATION_CHANNEL
+
+
+def _token_user_id(value):
+    try:
+        user = json.loads(value.decode())
+    except ValueError:
+        return None
+    return user.get('userId') if isinstance(user, dict) else None
+
+
+def _is_user_id(key):
+    try:
+        uuid.UUID(key.decode())
+    except ValueError:
+        return False
+    return True
+
+
+def classify(client, keys):
+    """Returns the orphaned tokens and orphaned user keys among `keys`, and the token store keys that don't expire."""
+    pipeline = client.pipeline(transaction=False)
+    for key in keys:
+        pipeline.get(key)
+        pipeline.ttl(key)
+    replies = pipeline.execute(raise_on_error=False)
+
+    pairs = []
+    unexpiring = []
+    for key, value, ttl in zip(keys, replies[::2], replies[1::2]):
+        # Other kinds of keys, such as the revocation sets, fail `GET` and are left alone
+        if value is None or isinstance(value, Exception):
+            continue
+
+        user_id = _token_user_id(value)
+        if user_id is not None:
+            # A token, whose user key must point back at it
+            pairs.append((key, True, user_id.encode(), lambda user_value, token=key: user_value == token))
+        elif _is_user_id(key):
+            # A user key, whose token must belong to the user
+            pairs.append((key, False, value,
+                          lambda token_value, user_id=key.decode(): _token_user_id(token_value) == user_id))
+        else:
+            continue
+
+        if ttl == -1:
+            unexpiring.append(key)
+
+    pipeline = client.pipeline(transaction=False)
+    for _, _, counterpart, _ in pairs:
+        pipeline.get(counterpart)
+    counterpart_values = pipeline.execute(raise_on_error=False)
+
+    orphaned = set()
+    for (key, _, _, consistent), counterpart_value in zip(pairs, counterpart_values):
+        if counterpart_value is None or isinstance(counterpart_value, Exception) or not consistent(counterpart_value):
+            orphaned.add(key)
+
+    return ([key for key, is_token, _, _ in pairs if is_token and key in orphaned],
+            [key for key, is_token, _, _ in pairs if not is_token and key in orphaned],
+            [key for key in unexpiring if key not in orphaned])
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def compact(client, ttl=None, dry_run=False, batch_size=1000, grace=1.0):
+    """Scans every key once. Returns how many keys were scanned, removed and given a TTL."""
+    scanned = 0
+    expiring = 0
+    candidates = []
+    for keys in _batches(client.scan_iter(count=batch_size), batch_size):
+        scanned += len(keys)
+        orphaned_tokens, orphaned_users, unexpiring = classify(client, keys)
+        candidates.extend(orphaned_tokens + orphaned_users)
+
+        if ttl is not None and unexpiring:
+            expiring += len(unexpiring)
+            if not dry_run:
+                pipeline = client.pipeline(transaction=False)
+                for key in unexpiring:
+                    pipeline.expire(key, ttl)
+                pipeline.execute()
+
+    # Each key is read separately from the one it points at, so a session signed in or out during the scan can look
+    # orphaned; only keys that are still orphaned after `grace` seconds are removed
+    time.sleep(grace if candidates else 0)
+    removed = 0
+    for keys in _batches(candidates, batch_size):
+        orphaned_tokens, orphaned_users, _ = classify(client, keys)
+        removed += len(orphaned_tokens) + len(orphaned_users)
+        if (orphaned_tokens or orphaned_users) and not dry_run:
+            pipeline = client.pipeline(transaction=False)
+            pipeline.delete(*(orphaned_tokens + orphaned_users))
+            for token in orphaned_tokens:
+                pipeline.publish(REVOCATION_CHANNEL, token)
+            pipeline.execute()
+
+    return {"scanned": scanned, "removed": removed, "expiring": expiring}
+
+
+def main(argv=None):
+    session_ttl = os.getenv("GANDALF_SESSION_TTL")
+    parser = argparse.ArgumentParser(prog="python -m app.token_store.compact",
+                                     description="Remove orphaned token store keys from Redis.")
+    parser.add_argument("--host", default=os.getenv("GANDALF_REDIS_HOST", "localhost"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("GANDALF_REDIS_PORT", "6379")))
+    parser.add_argument("--ttl", type=int, default=int(session_ttl) if session_ttl is not None else None,
+                        help="give sessions without an expiry this many seconds (default: $GANDALF_SESSION_TTL)")
+    parser.add_argument("--dry-run", action="store_true", help="only count the keys that would change")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    result = compact(redis.StrictRedis(host=args.host, port=args.port), ttl=args.ttl, dry_run=args.dry_run,
+                     batch_size=args.batch_size)
+    print("Scanned {} keys; {} {} orphaned keys and {} {} sessions a TTL".format(
+        result["scanned"], "would remove" if args.dry_run else "removed", result["removed"],
+        "would give" if args.dry_run else "gave", result["expiring"]))
+
+
+if __name__ == "__main__":
+    main()
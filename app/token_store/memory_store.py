@@ -0,0 +1,132 @@
+import time
+
+from app.cache import LRUCache
+from app.token_store import TokenStore, resolved
+
+
+class MemoryTokenStore(TokenStore):
+    """
+    Keeps tokens in the memory of the current process, for single-process deployments that don't run Redis.
+
+    At most `max_tokens` tokens are kept; issuing more signs out the least recently used sessions. Tokens don't
+    survive a restart and aren't visible to other processes, so this store requires `GANDALF_WORKERS=1`.
+    """
+
+    def __init__(self, max_tokens=100000, ttl=None):
+        self.tokens = LRUCache(max_tokens, ttl=ttl)
+        self.user_tokens = LRUCache(max_tokens, ttl=ttl)
+        self.revoked_token_ids = {}
+        self.revoked_users = {}
+        # Revocations since the last call to `revocations`, which starts the log over at `log_start`
+        self.revocation_log = []
+        self.log_start = 0
+        self.listeners = []
+        self.user_change_listeners = []
+
+    def issue(self, user, token):
+        existing = self.user_tokens.get(user['userId'])
+        if existing is not None and self.refresh(existing, user['userId']).result():
+            return resolved(existing)
+
+        self.tokens.set(token, user)
+        self.user_tokens.set(user['userId'], token)
+        return resolved(token)
+
+    def refresh(self, token, user_id):
+        user = self.tokens.get(token)
+        if user is None:
+            return resolved(False)
+
+        # Setting an entry again restarts its time-to-live
+        self.tokens.set(token, user)
+        self.user_tokens.set(user_id, token)
+        return resolved(True)
+
+    def lookup(self, token):
+        return resolved(self.tokens.get(token))
+
+    def lookup_with_ttl(self, token):
+        user = self.tokens.get(token)
+        return resolved((user, self.tokens.expires_in(token) if user is not None else None))
+
+    def revoke(self, token):
+        user = self.tokens.get(token)
+        if user is None:
+            return resolved(False)
+
+        self.tokens.invalidate(token)
+        if self.user_tokens.get(user['userId']) == token:
+            self.user_tokens.invalidate(user['userId'])
+        self._notify(token)
+        return resolved(True)
+
+    def revoke_all_for_user(self, user_id):
+        token = self.user_tokens.get(user_id)
+        self.user_tokens.invalidate(user_id)
+        if token is None or not self.tokens.invalidate(token):
+            return resolved([])
+
+        self._notify(token)
+        return resolved([token])
+
+    def revoke_all_for_users(self, user_ids):
+        return resolved([token for user_id in user_ids for token in self.revoke_all_for_user(user_id).result()])
+
+    def revoke_token_id(self, token_id, expires_at):
+        self.revoked_token_ids[token_id] = expires_at
+        self.revocation_log.append(({token_id: expires_at}, {}))
+        self._notify(token_id)
+        return resolved(None)
+
+    def revoke_tokens_issued_before(self, user_id, issued_before):
+        self.revoked_users[user_id] = max(issued_before, self.revoked_users.get(user_id, issued_before))
+        self.revocation_log.append(({}, {user_id: issued_before}))
+        self._notify(user_id)
+        return resolved(None)
+
+    def revoke_tokens_issued_before_for_users(self, user_ids, issued_before):
+        for user_id in user_ids:
+            self.revoke_tokens_issued_before(user_id, issued_before)
+        return resolved(None)
+
+    def revocations(self, max_token_age):
+        now = time.time()
+        self.revoked_token_ids = {token_id: expires_at for token_id, expires_at in self.revoked_token_ids.items()
+                                  if expires_at >= now}
+        self.revoked_users = {user_id: issued_before for user_id, issued_before in self.revoked_users.items()
+                              if issued_before >= now - max_token_age}
+        self.log_start += len(self.revocation_log)
+        self.revocation_log = []
+        return resolved((dict(self.revoked_token_ids), dict(self.revoked_users), self.log_start))
+
+    def revocations_since(self, position):
+        token_ids = {}
+        users = {}
+        for revoked_token_ids, revoked_users in self.revocation_log[max(0, position - self.log_start):]:
+            token_ids.update(revoked_token_ids)
+            users.update(revoked_users)
+        return resolved((token_ids, users, self.log_start + len(self.revocation_log)))
+
+    def is_token_id_revoked(self, token_id):
+        return resolved(self.revoked_token_ids.get(token_id, 0) >= time.time())
+
+    def add_revocation_listener(self, callback):
+        self.listeners.append(callback)
+
+    def _notify(self, token):
+        for listener in self.listeners:
+            listener(token)
+
+    def announce_user_changes(self, user_ids):
+        for listener in self.user_change_listeners:
+            listener(user_ids)
+        return resolved(None)
+
+    def add_user_change_listener(self, callback):
+        self.user_change_listeners.append(callback)
+
+    def ping(self):
+        return resolved(True)
+
+    def stats(self):
+        return dict(self.tokens.stats(), backend="memory")
@@ -0,0 +1,300 @@
+import json
+import logging
+import threading
+import time
+import uuid
+
+import redis
+import tornado.ioloop
+
+from app.redis_client import AsyncRedis
+from app.token_store import TokenStore
+
+logger = logging.getLogger('gandalf')
+
+REVOCATION_CHANNEL = 'gandalf:revoked-tokens'
+USER_CHANGE_CHANNEL = 'gandalf:changed-users'
+REVOKED_TOKEN_IDS = 'gandalf:revoked-token-ids'
+REVOKED_USERS = 'gandalf:revoked-users'
+REVOCATION_STREAM = 'gandalf:revocations'
+# Roughly how many revocations the stream keeps for processes catching up; older ones are only in the sorted sets
+REVOCATION_STREAM_LENGTH = 1000000
+
+# Sessions are issued and revoked by scripts so that each takes one round trip and concurrent logins and logouts for
+# the same user can't leave the token and user keys pointing at different sessions
+
+# KEYS: user id, new token. ARGV: JSON encoded user, TTL in seconds or "". Returns the user's token.
+ISSUE_SCRIPT = """
+local ttl = tonumber(ARGV[2])
+local existing = redis.call('GET', KEYS[1])
+if existing and redis.call('EXISTS', existing) == 1 then
+    if ttl then
+        redis.call('EXPIRE', existing, ttl)
+        redis.call('EXPIRE', KEYS[1], ttl)
+    end
+    return existing
+end
+if ttl then
+    redis.call('SET', KEYS[2], ARGV[1], 'EX', ttl)
+    redis.call('SET', KEYS[1], KEYS[2], 'EX', ttl)
+else
+    redis.call('SET', KEYS[2], ARGV[1])
+    redis.call('SET', KEYS[1], KEYS[2])
+end
+return KEYS[2]
+"""
+
+# KEYS: token. ARGV: revocation channel. Returns 1 if the token was valid.
+REVOKE_SCRIPT = """
+local user = redis.call('GET', KEYS[1])
+if not user then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+local user_id = cjson.decode(user)['userId']
+if redis.call('GET', user_id) == KEYS[1] then
+    redis.call('DEL', user_id)
+end
+redis.call('PUBLISH', ARGV[1], KEYS[1])
+return 1
+"""
+
+# KEYS: user id. ARGV: revocation channel. Returns the revoked token, if the user had one.
+REVOKE_ALL_SCRIPT = """
+local token = redis.call('GET', KEYS[1])
+if not token then
+    return false
+end
+redis.call('DEL', KEYS[1], token)
+redis.call('PUBLISH', ARGV[1], token)
+return token
+"""
+
+
+class RedisTokenStore(TokenStore):
+    """
+    Keeps tokens in Redis, so that every Gandalf process and host shares them.
+
+    Each token is stored under its own key with the JSON encoded user as the value, and each user id under its own
+    key with the user's token as the value. With a `ttl`, both keys expire through Redis. Revocations are announced
+    on `REVOCATION_CHANNEL`, and changes to user records on `USER_CHANGE_CHANNEL`. The scripts that issue and revoke
+    tokens touch keys they aren't passed, so the store needs a single Redis server rather than a cluster.
+
+    The revocation list for self-contained tokens is kept in two sorted sets, `REVOKED_TOKEN_IDS` scored by when each
+    token expires and `REVOKED_USERS` scored by when the user's tokens were revoked, so old entries can be trimmed
+    by score. Every revocation is also appended to `REVOCATION_STREAM`, whose entry ids are the positions that
+    `revocations_since` reads from, so processes can follow the list without fetching all of it.
+    """
+
+    def __init__(self, host='localhost', port=6379, max_connections=50, ttl=None):
+        self.redis = AsyncRedis(host=host, port=port, max_connections=max_connections)
+        self.ttl = ttl
+        self.issue_script = self.redis.client.register_script(ISSUE_SCRIPT)
+        self.revoke_script = self.redis.client.register_script(REVOKE_SCRIPT)
+        self.revoke_all_script = self.redis.client.register_script(REVOKE_ALL_SCRIPT)
+        self.listeners = []
+        self.user_change_listeners = []
+        self.io_loop = None
+
+    def issue(self, user, token):
+        def issue(client):
+            ttl = self.ttl if self.ttl is not None else ""
+            return self.issue_script(keys=[user['userId'], token], args=[json.dumps(user), ttl], client=client).decode()
+
+        return self.redis.run(issue)
+
+    def refresh(self, token, user_id):
+        def refresh(client):
+            if self.ttl is None:
+                return client.exists(token)
+
+            pipeline = client.pipeline(transaction=False)
+            pipeline.expire(token, self.ttl)
+            pipeline.expire(user_id, self.ttl)
+            token_exists, _ = pipeline.execute()
+            return token_exists
+
+        return self.redis.run(refresh)
+
+    def lookup(self, token):
+        def lookup(client):
+            value = client.get(token)
+            return json.loads(value.decode()) if value is not None else None
+
+        return self.redis.run(lookup)
+
+    def lookup_with_ttl(self, token):
+        def lookup_with_ttl(client):
+            pipeline = client.pipeline(transaction=False)
+            pipeline.get(token)
+            pipeline.pttl(token)
+            value, ttl = pipeline.execute()
+            if value is None:
+                return None, None
+            # PTTL answers -1 for keys without an expiry
+            return json.loads(value.decode()), ttl / 1000 if ttl >= 0 else None
+
+        return self.redis.run(lookup_with_ttl)
+
+    def revoke(self, token):
+        self._notify(token)
+
+        def revoke(client):
+            return self.revoke_script(keys=[token], args=[REVOCATION_CHANNEL], client=client) == 1
+
+        return self.redis.run(revoke)
+
+    def revoke_all_for_user(self, user_id):
+        return self.revoke_all_for_users([user_id])
+
+    def revoke_all_for_users(self, user_ids):
+        def revoke_all_for_users(client):
+            pipeline = client.pipeline(transaction=False)
+            for user_id in user_ids:
+                self.revoke_all_script(keys=[user_id], args=[REVOCATION_CHANNEL], client=pipeline)
+
+            tokens = [token.decode() for token in pipeline.execute() if token is not None]
+            for token in tokens:
+                self._notify_from_thread(token)
+            return tokens
+
+        return self.redis.run(revoke_all_for_users)
+
+    @staticmethod
+    def _append_revocation(pipeline, kind, key, value):
+        # redis-py predates streams, so XADD and XREAD are sent as raw commands
+        pipeline.execute_command('XADD', REVOCATION_STREAM, 'MAXLEN', '~', REVOCATION_STREAM_LENGTH, '*',
+                                 'kind', kind, 'key', key, 'value', value)
+        pipeline.publish(REVOCATION_CHANNEL, key)
+
+    def revoke_token_id(self, token_id, expires_at):
+        def revoke_token_id(client):
+            pipeline = client.pipeline(transaction=False)
+            pipeline.zadd(REVOKED_TOKEN_IDS, expires_at, token_id)
+            self._append_revocation(pipeline, 'token', token_id, expires_at)
+            pipeline.execute()
+
+        return self.redis.run(revoke_token_id)
+
+    def revoke_tokens_issued_before(self, user_id, issued_before):
+        return self.revoke_tokens_issued_before_for_users([user_id], issued_before)
+
+    def revoke_tokens_issued_before_for_users(self, user_ids, issued_before):
+        def revoke_tokens_issued_before_for_users(client):
+            if not user_ids:
+                return
+            pipeline = client.pipeline(transaction=False)
+            pipeline.zadd(REVOKED_USERS, *[value for user_id in user_ids for value in (issued_before, user_id)])
+            for user_id in user_ids:
+                self._append_revocation(pipeline, 'user', user_id, issued_before)
+            pipeline.execute()
+
+        return self.redis.run(revoke_tokens_issued_before_for_users)
+
+    def revocations(self, max_token_age):
+        def revocations(client):
+            now = time.time()
+            pipeline = client.pipeline(transaction=False)
+            # The position is read first, so revocations made while the sets are read are also read again later
+            pipeline.execute_command('XREVRANGE', REVOCATION_STREAM, '+', '-', 'COUNT', 1)
+            pipeline.zremrangebyscore(REVOKED_TOKEN_IDS, '-inf', '(' + repr(now))
+            pipeline.zremrangebyscore(REVOKED_USERS, '-inf', '(' + repr(now - max_token_age))
+            pipeline.zrange(REVOKED_TOKEN_IDS, 0, -1, withscores=True)
+            pipeline.zrange(REVOKED_USERS, 0, -1, withscores=True)
+            last_entry, _, _, token_ids, users = pipeline.execute()
+            return ({token_id.decode(): expires_at for token_id, expires_at in token_ids},
+                    {user_id.decode(): issued_before for user_id, issued_before in users},
+                    last_entry[0][0].decode() if last_entry else '0-0')
+
+        return self.redis.run(revocations)
+
+    def revocations_since(self, position, batch_size=10000):
+        def revocations_since(client):
+            token_ids = {}
+            users = {}
+            current = position
+            while True:
+                reply = client.execute_command('XREAD', 'COUNT', batch_size, 'STREAMS', REVOCATION_STREAM, current)
+                entries = reply[0][1] if reply else []
+                for entry_id, fields in entries:
+                    fields = dict(zip(fields[::2], fields[1::2]))
+                    revoked = token_ids if fields[b'kind'] == b'token' else users
+                    revoked[fields[b'key'].decode()] = float(fields[b'value'])
+                    current = entry_id.decode()
+                if len(entries) < batch_size:
+                    return token_ids, users, current
+
+        return self.redis.run(revocations_since)
+
+    def is_token_id_revoked(self, token_id):
+        def is_token_id_revoked(client):
+            expires_at = client.zscore(REVOKED_TOKEN_IDS, token_id)
+            return expires_at is not None and expires_at >= time.time()
+
+        return self.redis.run(is_token_id_revoked)
+
+    def announce_user_changes(self, user_ids):
+        def announce_user_changes(client):
+            client.publish(USER_CHANGE_CHANNEL, json.dumps(list(user_ids)))
+
+        return self.redis.run(announce_user_changes)
+
+    def add_revocation_listener(self, callback):
+        self.listeners.append(callback)
+        self._listen()
+
+    def add_user_change_listener(self, callback):
+        self.user_change_listeners.append(callback)
+        self._listen()
+
+    def _listen(self):
+        if self.io_loop is None:
+            self.io_loop = tornado.ioloop.IOLoop.current()
+            threading.Thread(target=self._listen_for_announcements, name="gandalf-announcements", daemon=True).start()
+
+    def _notify(self, token):
+        for listener in self.listeners:
+            listener(token)
+
+    def _notify_user_change(self, user_ids):
+        for listener in self.user_change_listeners:
+            listener(user_ids)
+
+    def _notify_from_thread(self, token):
+        if self.io_loop is not None:
+            self.io_loop.add_callback(self._notify, token)
+
+    def _listen_for_announcements(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(REVOCATION_CHANNEL, USER_CHANGE_CHANNEL)
+                for message in pubsub.listen():
+                    if message['channel'] == USER_CHANGE_CHANNEL.encode():
+                        self.io_loop.add_callback(self._notify_user_change, json.loads(message['data'].decode()))
+                    else:
+                        self._notify_from_thread(message['data'].decode())
+            except Exception:
+                logger.exception("Lost subscription to {}, flushing token and user caches".format(REVOCATION_CHANNEL))
+                self._notify_from_thread(None)
+                self.io_loop.add_callback(self._notify_user_change, None)
+                time.sleep(1)
+
+    def ping(self):
+        def ping(client):
+            key = "health-%s" % str(uuid.uuid4())
+            try:
+                return bool(client.set(key, str(uuid.uuid4()))) and client.delete(key) == 1
+            except redis.RedisError:
+                return False
+
+        return self.redis.run(ping)
+
+    def stats(self):
+        pool = self.redis.connection_pool
+        return {
+            "backend": "redis",
+            "max_connections": pool.max_connections,
+            "connections": pool._created_connections,
+            "in_use": len(pool._in_use_connections)
+        }
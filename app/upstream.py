@@ -0,0 +1,252 @@
+import datetime
+import logging
+
+import tornado.gen
+import tornado.httpclient
+import tornado.ioloop
+import tornado.simple_httpclient
+import tornado.tcpclient
+
+logger = logging.getLogger('gandalf')
+
+
+class _FlowControlledConnection(tornado.simple_httpclient._HTTPConnection):
+    def data_received(self, chunk):
+        if self._should_follow_redirect():
+            return
+        if self.request.streaming_callback is not None:
+            # Unlike the stock connection, hand the callback's Future back to the HTTP1Connection so that reading
+            # from the upstream waits on it
+            return self.request.streaming_callback(chunk)
+        else:
+            self.chunks.append(chunk)
+
+
+class FlowControlledHTTPClient(tornado.simple_httpclient.SimpleAsyncHTTPClient):
+    """
+    A `SimpleAsyncHTTPClient` whose `streaming_callback` may return a Future. Reading the response body pauses
+    until that Future resolves, so a slow downstream client slows the upstream down instead of filling memory.
+    """
+
+    def _connection_class(self):
+        return _FlowControlledConnection
+
+    @property
+    def active_count(self):
+        return len(self.active)
+
+    @property
+    def queued_count(self):
+        return len(self.queue)
+
+
+SIMPLE = 'simple'
+CURL = 'curl'
+
+
+def make_upstream_client(implementation=SIMPLE, max_clients=100, connect_timeout=20.0, request_timeout=20.0):
+    """
+    Builds a dedicated HTTP client for proxied traffic. Either client reports its `max_clients`, the `active_count`
+    of requests in flight and the `queued_count` of requests waiting for a free slot.
+
+    The simple client opens a new connection per request. The curl client keeps connections to the upstream alive and
+    reuses them, but cannot stream request bodies. It needs `pycurl`, which is not in requirements.txt: without it,
+    connections to the upstream are never kept alive and asking for the curl client raises `ValueError`.
+    """
+    defaults = dict(connect_timeout=connect_timeout, request_timeout=request_timeout)
+
+    if implementation == SIMPLE:
+        return FlowControlledHTTPClient(force_instance=True, max_clients=max_clients, defaults=defaults)
+    elif implementation == CURL:
+        try:
+            from app.upstream_curl import PooledCurlHTTPClient
+        except ImportError:
+            raise ValueError("The '{}' upstream client requires pycurl, which is not installed".format(CURL))
+        return PooledCurlHTTPClient(force_instance=True, max_clients=max_clients, defaults=defaults)
+    else:
+        raise ValueError("Unknown upstream client '{}', expected '{}' or '{}'".format(implementation, SIMPLE, CURL))
+
+
+def upstream_client_stats(client):
+    return {
+        "max_clients": client.max_clients,
+        "active": client.active_count,
+        "queued": client.queued_count
+    }
+
+
+ROUND_ROBIN = 'round_robin'
+LEAST_OUTSTANDING = 'least_outstanding'
+WEIGHTED = 'weighted'
+
+
+class NoUpstreamException(Exception):
+    pass
+
+
+class Upstream:
+    def __init__(self, address, weight=1):
+        self.address = address
+        self.weight = weight
+        self.healthy = True
+        self.outstanding = 0
+        self.current_weight = 0
+        self.consecutive_failures = 0
+        self.consecutive_successes = 0
+
+    @property
+    def host(self):
+        return self.address.rsplit(":", 1)[0]
+
+    @property
+    def port(self):
+        host_port = self.address.rsplit(":", 1)
+        return int(host_port[1]) if len(host_port) > 1 else 80
+
+
+class UpstreamPool:
+    """
+    A set of interchangeable upstream addresses and the strategy used to spread requests across them.
+
+    Only healthy members are chosen. If every member has been marked unhealthy, all of them are used again rather
+    than failing every request, since the health checks themselves may be what is broken.
+    """
+
+    def __init__(self, upstreams, strategy=ROUND_ROBIN):
+        if strategy not in (ROUND_ROBIN, LEAST_OUTSTANDING, WEIGHTED):
+            raise ValueError("Unknown load balancing strategy '{}'".format(strategy))
+
+        self.upstreams = upstreams
+        self.strategy = strategy
+        self.next_index = 0
+
+    @classmethod
+    def parse(cls, spec, strategy=ROUND_ROBIN):
+        """Parses a comma separated list of `hostname:port` entries, each optionally suffixed with `=weight`."""
+        upstreams = []
+        for entry in (spec or "").split(","):
+            entry = entry.strip()
+            if not entry:
+                continue
+            address, _, weight = entry.partition("=")
+            upstreams.append(Upstream(address.strip(), int(weight) if weight else 1))
+        return cls(upstreams, strategy)
+
+    def candidates(self):
+        healthy = [upstream for upstream in self.upstreams if upstream.healthy]
+        return healthy if len(healthy) > 0 else self.upstreams
+
+    def choose(self):
+        candidates = self.candidates()
+        if len(candidates) == 0:
+            raise NoUpstreamException()
+
+        if self.strategy == LEAST_OUTSTANDING:
+            # Rotate the starting point so ties don't always land on the first member
+            self.next_index = (self.next_index + 1) % len(candidates)
+            rotated = candidates[self.next_index:] + candidates[:self.next_index]
+            return min(rotated, key=lambda upstream: upstream.outstanding / upstream.weight)
+        elif self.strategy == WEIGHTED:
+            # Smooth weighted round-robin: heavier members are picked more often without being picked in bursts
+            total_weight = 0
+            chosen = None
+            for upstream in candidates:
+                upstream.current_weight += upstream.weight
+                total_weight += upstream.weight
+                if chosen is None or upstream.current_weight > chosen.current_weight:
+                    chosen = upstream
+            chosen.current_weight -= total_weight
+            return chosen
+        else:
+            self.next_index = (self.next_index + 1) % len(candidates)
+            return candidates[self.next_index]
+
+    def acquire(self):
+        upstream = self.choose()
+        upstream.outstanding += 1
+        return upstream
+
+    def release(self, upstream):
+        upstream.outstanding -= 1
+
+    def stats(self):
+        return [
+            {
+                "address": upstream.address,
+                "weight": upstream.weight,
+                "healthy": upstream.healthy,
+                "outstanding": upstream.outstanding
+            }
+            for upstream in self.upstreams
+        ]
+
+
+class HealthChecker:
+    """
+    Periodically probes every member of an `UpstreamPool`, ejecting members after `unhealthy_threshold`
+    consecutive failures and re-admitting them after `healthy_threshold` consecutive successes.
+
+    Without a `path`, a probe is a TCP connect; with one, it is a GET that must not answer with a 5xx.
+    """
+
+    def __init__(self, pool, interval=5.0, timeout=2.0, path=None, healthy_threshold=2, unhealthy_threshold=3):
+        self.pool = pool
+        self.interval = interval
+        self.timeout = timeout
+        self.path = path
+        self.healthy_threshold = healthy_threshold
+        self.unhealthy_threshold = unhealthy_threshold
+        self.checking = False
+        self.periodic_callback = None
+
+    def start(self):
+        self.periodic_callback = tornado.ioloop.PeriodicCallback(self.check_all, self.interval * 1000)
+        self.periodic_callback.start()
+
+    def stop(self):
+        if self.periodic_callback is not None:
+            self.periodic_callback.stop()
+
+    @tornado.gen.coroutine
+    def check_all(self):
+        if self.checking:
+            return
+        self.checking = True
+        try:
+            results = yield [self.probe(upstream) for upstream in self.pool.upstreams]
+            for upstream, ok in zip(self.pool.upstreams, results):
+                self.record(upstream, ok)
+        finally:
+            self.checking = False
+
+    @tornado.gen.coroutine
+    def probe(self, upstream):
+        try:
+            if self.path is None:
+                stream = yield tornado.gen.with_timeout(datetime.timedelta(seconds=self.timeout),
+                                                        tornado.tcpclient.TCPClient().connect(upstream.host,
+                                                                                              upstream.port))
+                stream.close()
+                return True
+            else:
+                response = yield tornado.httpclient.AsyncHTTPClient().fetch(
+                    "http://{}{}".format(upstream.address, self.path), request_timeout=self.timeout,
+                    connect_timeout=self.timeout, raise_error=False)
+                return response.code < 500
+        except Exception:
+            return False
+
+    def record(self, upstream, ok):
+        if ok:
+            upstream.consecutive_failures = 0
+            upstream.consecutive_successes += 1
+            if not upstream.healthy and upstream.consecutive_successes >= self.healthy_threshold:
+                logger.info("Upstream {} is healthy again".format(upstream.address))
+                upstream.healthy = True
+        else:
+            upstream.consecutive_successes = 0
+            upstream.consecutive_failures += 1
+            if upstream.healthy and upstream.consecutive_failures >= self.unhealthy_threshold:
+                logger.warning("Upstream {} failed {} health checks, ejecting it".format(
+                    upstream.address, upstream.consecutive_failures))
+                upstream.healthy = False
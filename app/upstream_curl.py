@@ -0,0 +1,21 @@
+"""
+The upstream client that keeps connections alive. It is built on `pycurl`, which is not in requirements.txt: this
+module can only be imported once `pycurl` has been installed separately.
+"""
+import tornado.curl_httpclient
+
+
+class PooledCurlHTTPClient(tornado.curl_httpclient.CurlAsyncHTTPClient):
+    """A `CurlAsyncHTTPClient` that reports how many of its handles are busy and how many requests wait for one."""
+
+    def initialize(self, io_loop, max_clients=10, defaults=None):
+        super().initialize(io_loop, max_clients=max_clients, defaults=defaults)
+        self.max_clients = max_clients
+
+    @property
+    def active_count(self):
+        return self.max_clients - len(self._free_list)
+
+    @property
+    def queued_count(self):
+        return len(self._requests)
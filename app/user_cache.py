@@ -0,0 +1,102 @@
+import time
+
+import tornado.gen
+
+from app.cache import LRUCache
+
+
+class UserCache:
+    """
+    Wraps an `AsyncDBAdapter`, answering user searches from a bounded in-process cache of `User` records and only
+    asking the database for the ones it doesn't have.
+
+    Users are cached by id, with a second cache mapping usernames to ids. Updating, deactivating or reactivating a
+    user drops it once the database has been changed, and passes the user's id to `announce` so other processes can
+    `forget` it too; the write only completes once the change has been announced.
+    """
+
+    def __init__(self, db, max_size, ttl=None, clock=time.monotonic, announce=None):
+        self.db = db
+        self.announce = announce
+        self.users = LRUCache(max_size, ttl=ttl, clock=clock)
+        self.user_ids = LRUCache(max_size, ttl=ttl, clock=clock)
+        self.invalidations = 0
+
+    def cached_by_username(self, username):
+        user_id = self.user_ids.get(username)
+        user = self.users.get(user_id) if user_id is not None else None
+        return user if user is not None and user.username == username else None
+
+    @tornado.gen.coroutine
+    def search(self, keys, cached, query, key_of):
+        found = {}
+        missing = set()
+        for key in keys:
+            user = cached(key)
+            if user is not None:
+                found[key] = user
+            else:
+                missing.add(key)
+
+        if missing:
+            invalidations_before_query = self.invalidations
+            users = yield query(list(missing))
+            for user in users:
+                found[key_of(user)] = user
+                # A write that finished while the query ran may not be reflected in its answer
+                if self.invalidations == invalidations_before_query:
+                    self.users.set(user.user_id, user)
+                    self.user_ids.set(user.username, user.user_id)
+
+        results = []
+        for key in keys:
+            user = found.pop(key, None)
+            if user is not None:
+                results.append(user)
+        return results
+
+    def search_for_users_by_id(self, user_ids):
+        return self.search(user_ids, self.users.get, self.db.search_for_users_by_id, lambda user: user.user_id)
+
+    def search_for_users_by_username(self, usernames):
+        return self.search(usernames, self.cached_by_username, self.db.search_for_users_by_username,
+                           lambda user: user.username)
+
+    def forget(self, user_ids):
+        """Drops `user_ids` from the cache, or every user if `user_ids` is `None`."""
+        self.invalidations += 1
+        if user_ids is None:
+            self.users.clear()
+            self.user_ids.clear()
+            return
+
+        for user_id in user_ids:
+            self.users.invalidate(user_id)
+
+    @tornado.gen.coroutine
+    def invalidate_after(self, user_ids, write):
+        try:
+            result = yield write
+        finally:
+            self.forget(user_ids)
+            if self.announce is not None:
+                yield self.announce(user_ids)
+        return result
+
+    def update_user_password(self, user_id, password):
+        return self.invalidate_after([user_id], self.db.update_user_password(user_id, password))
+
+    def deactivate_user(self, user_id):
+        return self.invalidate_after([user_id], self.db.deactivate_user(user_id))
+
+    def reactivate_user(self, user_id):
+        return self.invalidate_after([user_id], self.db.reactivate_user(user_id))
+
+    def deactivate_users(self, user_ids):
+        return self.invalidate_after(user_ids, self.db.deactivate_users(user_ids))
+
+    def reactivate_users(self, user_ids):
+        return self.invalidate_after(user_ids, self.db.reactivate_users(user_ids))
+
+    def stats(self):
+        return self.users.stats()
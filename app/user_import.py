@@ -0,0 +1,188 @@
+"""
+Imports users in bulk from CSV or newline delimited JSON, for `POST /auth/users/import` and
+`python -m app.db.import_users`.
+
+Each row has a `username` and either a `password`, which is hashed, or a `hashed_password` in one of the formats
+Gandalf verifies. CSV input starts with a header row naming its columns, and has one row per line. One JSON result is
+written per row, in input order.
+"""
+import csv
+import json
+import uuid
+from collections import Counter
+
+import tornado.gen
+from passlib.apps import custom_app_context as pwd_context
+
+from app.passwords import PasswordHasherSaturatedException
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+
+CONTENT_TYPES = {
+    "text/csv": CSV,
+    "application/x-ndjson": NDJSON
+}
+
+
+class ImportFormatException(Exception):
+    pass
+
+
+class ImportParser:
+    """Parses rows out of input fed in chunks of any size, which may end mid line."""
+
+    def __init__(self, format):
+        self.format = format
+        self.buffer = b""
+        self.line = 0
+        self.columns = None
+
+    def feed(self, chunk):
+        lines = (self.buffer + chunk).split(b"\n")
+        self.buffer = lines.pop()
+        return self.parse_lines(lines)
+
+    def close(self):
+        lines, self.buffer = [self.buffer], b""
+        rows = self.parse_lines(lines)
+        if self.format == CSV and self.columns is None:
+            raise ImportFormatException("Expected a header row")
+        return rows
+
+    def parse_lines(self, lines):
+        rows = []
+        for line in lines:
+            self.line += 1
+            try:
+                text = line.decode().rstrip("\r")
+            except UnicodeDecodeError:
+                rows.append(self.invalid("Expected UTF-8"))
+                continue
+            if not text.strip():
+                continue
+
+            if self.format == CSV:
+                row = self.parse_csv(text)
+            else:
+                row = self.parse_json(text)
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    def parse_csv(self, text):
+        values = next(csv.reader([text]))
+        if self.columns is None:
+            columns = [column.strip().lower() for column in values]
+            if "username" not in columns or ("password" in columns) == ("hashed_password" in columns):
+                raise ImportFormatException(
+                    "The header row must name a 'username' column and either a 'password' or 'hashed_password' column")
+            self.columns = columns
+            return None
+
+        if len(values) != len(self.columns):
+            return self.invalid("Expected {} values".format(len(self.columns)))
+        return self.validate(dict(zip(self.columns, values)))
+
+    def parse_json(self, text):
+        try:
+            fields = json.loads(text)
+        except ValueError:
+            return self.invalid("Expected a JSON object")
+        if not isinstance(fields, dict):
+            return self.invalid("Expected a JSON object")
+        return self.validate(fields)
+
+    def validate(self, fields):
+        username = fields.get("username")
+        password = fields.get("password")
+        hashed_password = fields.get("hashed_password")
+
+        if not isinstance(username, str) or not username:
+            return self.invalid("Expected a username")
+        if (password is None) == (hashed_password is None):
+            return self.invalid("Expected either a password or a hashed_password", username)
+        if password is not None and (not isinstance(password, str) or not password):
+            return self.invalid("Expected a password", username)
+        if hashed_password is not None and (not isinstance(hashed_password, str) or
+                                            pwd_context.identify(hashed_password) is None):
+            return self.invalid("Unrecognized hashed_password", username)
+
+        return {"line": self.line, "username": username.lower(), "password": password,
+                "hashed_password": hashed_password}
+
+    def invalid(self, message, username=None):
+        return {"line": self.line, "username": username, "error": message}
+
+
+class UserImporter:
+    """
+    Imports parsed rows `batch_size` at a time: a batch's passwords are hashed with `passwords.encrypt_many` and the
+    batch is loaded with one `import_users` call. The next batch is collected and hashed while the previous one is
+    written to the database. The results of each batch are passed to `report` in input order.
+    """
+
+    def __init__(self, db, passwords, report, batch_size=1000):
+        self.db = db
+        self.passwords = passwords
+        self.report = report
+        self.batch_size = batch_size
+        self.rows = []
+        self.pending = None
+        self.counts = Counter()
+
+    @tornado.gen.coroutine
+    def add(self, rows):
+        self.rows.extend(rows)
+        while len(self.rows) >= self.batch_size:
+            batch, self.rows = self.rows[:self.batch_size], self.rows[self.batch_size:]
+            yield self.start(batch)
+
+    @tornado.gen.coroutine
+    def close(self):
+        batch, self.rows = self.rows, []
+        yield self.start(batch)
+        yield self.start([])
+        return dict(self.counts)
+
+    @tornado.gen.coroutine
+    def start(self, batch):
+        """Starts importing `batch`, then reports the batch started before it."""
+        previous, self.pending = self.pending, self.import_rows(batch) if batch else None
+        if previous is not None:
+            results = yield previous
+            self.counts.update(result["status"] for result in results)
+            self.report(results)
+
+    @tornado.gen.coroutine
+    def import_rows(self, rows):
+        valid = [row for row in rows if "error" not in row]
+        hashing = [row for row in valid if row["password"] is not None]
+        errors = {}
+        try:
+            hashed_passwords = yield self.passwords.encrypt_many([row["password"] for row in hashing])
+            for row, hashed_password in zip(hashing, hashed_passwords):
+                row["hashed_password"] = hashed_password
+        except PasswordHasherSaturatedException:
+            for row in hashing:
+                errors[row["line"]] = "Password hashing is saturated, try again later"
+            valid = [row for row in valid if row["line"] not in errors]
+
+        for row in valid:
+            row["user_id"] = str(uuid.uuid1())
+        users = [(row["user_id"], row["username"], row["hashed_password"]) for row in valid]
+        created = set((yield self.db.import_users(users))) if users else set()
+
+        results = []
+        for row in rows:
+            result = {"line": row["line"], "username": row["username"]}
+            if "error" in row:
+                result.update(status="invalid", message=row["error"])
+            elif row["line"] in errors:
+                result.update(status="error", message=errors[row["line"]])
+            elif row["user_id"] in created:
+                result.update(status="created", userId=row["user_id"])
+            else:
+                result.update(status="exists")
+            results.append(result)
+        return results
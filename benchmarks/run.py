@@ -0,0 +1,376 @@
+"""
+Drives load at a local Gandalf and reports throughput, latency and memory as JSON.
+
+Gandalf runs in its own process against an in-memory `DBAdapter` and the in-process token store, with an echo
+upstream in a second process, so the numbers describe Gandalf itself rather than its dependencies. With
+`--token-store redis`, Gandalf uses the real Redis at `GANDALF_REDIS_HOST`:`GANDALF_REDIS_PORT` instead, and the
+benchmark leaves its users' sessions there. Each scenario keeps `--concurrency` requests in flight for `--duration`
+seconds, except `login`, which keeps `--login-concurrency`: by default half of Gandalf's password queue, so that
+logins are measured rather than shed with `503`s. Throughput and latency only count successful requests, and
+`error_rate` the share of requests that failed.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --tolerance 0.1
+"""
+import argparse
+import json
+import logging
+import math
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from urllib.parse import urlencode
+
+import tornado.gen
+import tornado.httpclient
+import tornado.ioloop
+import tornado.websocket
+
+SCENARIOS = ['login', 'proxied_get', 'proxied_post', 'search', 'websocket_echo']
+
+# How far each metric may move, and in which direction, before it counts as a regression
+HIGHER_IS_BETTER = {'requests_per_second': True, 'p50': False, 'p99': False, 'p999': False, 'rss': False}
+# Scenarios that run at `--login-concurrency` rather than `--concurrency`
+PASSWORD_SCENARIOS = {'login'}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def rss(pid):
+    """Returns the resident and peak resident set size of `pid` in bytes, or `None` where /proc is unavailable."""
+    try:
+        with open("/proc/{}/status".format(pid)) as status:
+            fields = dict(line.split(":", 1) for line in status if ":" in line)
+        return int(fields["VmRSS"].split()[0]) * 1024, int(fields["VmHWM"].split()[0]) * 1024
+    except (OSError, KeyError):
+        return None, None
+
+
+def check_redis():
+    """Returns why the Redis that Gandalf would use can't be reached, or `None` if it can."""
+    import redis
+
+    host = os.getenv("GANDALF_REDIS_HOST", "localhost")
+    port = int(os.getenv("GANDALF_REDIS_PORT", "6379"))
+    try:
+        redis.StrictRedis(host=host, port=port, socket_timeout=5).ping()
+    except redis.RedisError as e:
+        return "Unable to reach Redis at {}:{}: {}".format(host, port, e)
+    return None
+
+
+def serve_upstream(upstream_port):
+    from benchmarks.stand_ins import make_upstream_app
+
+    make_upstream_app().listen(upstream_port, "127.0.0.1")
+    tornado.ioloop.IOLoop.current().start()
+
+
+def serve_gandalf(http_port, websocket_port, upstream_port, token_store, overrides):
+    # Lead a process group of our own so the password hashing processes can be stopped along with this one
+    os.setpgrp()
+
+    from app import GandalfConfiguration, WEBSOCKET, make_app
+    from app.token_store.memory_store import MemoryTokenStore
+    from benchmarks.stand_ins import MemoryDBAdapter
+
+    db_adapter = MemoryDBAdapter()
+    settings = dict(password_workers=multiprocessing.cpu_count(), **overrides)
+    if token_store == "memory":
+        # Both apps share the store, as they would share Redis
+        settings["token_store"] = MemoryTokenStore()
+    upstream = "127.0.0.1:{}".format(upstream_port)
+
+    make_app(GandalfConfiguration(upstream, db_adapter, r"127\.0\.0\.1", **settings)).listen(http_port, "127.0.0.1")
+    make_app(GandalfConfiguration(upstream, db_adapter, r"127\.0\.0\.1", mode=WEBSOCKET, **settings)).listen(
+        websocket_port, "127.0.0.1")
+
+    # Anything Gandalf prints would otherwise end up in the middle of the results
+    sys.stdout = open(os.devnull, "w")
+    # Writing an access log line per request would be measured along with everything else; errors are counted instead
+    logging.getLogger("tornado.access").disabled = True
+    tornado.ioloop.IOLoop.current().start()
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank: the smallest value that at least `fraction` of the values are less than or equal to
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+class Benchmark:
+    def __init__(self, http_port, websocket_port, pid, concurrency, login_concurrency, duration, users):
+        self.base_url = "http://127.0.0.1:{}".format(http_port)
+        self.websocket_url = "ws://127.0.0.1:{}/ws".format(websocket_port)
+        self.pid = pid
+        self.concurrency = concurrency
+        self.login_concurrency = login_concurrency
+        self.duration = duration
+        self.user_count = users
+        self.client = tornado.httpclient.AsyncHTTPClient(force_instance=True, max_clients=concurrency)
+        self.users = []
+
+    def fetch(self, path, **kwargs):
+        return self.client.fetch(self.base_url + path, raise_error=False, **kwargs)
+
+    def token(self, worker):
+        return self.users[worker % len(self.users)]["token"]
+
+    def authorization(self, worker):
+        return {"Authorization": "Bearer {}".format(self.token(worker))}
+
+    @tornado.gen.coroutine
+    def setup(self):
+        for index in range(0, self.user_count):
+            username = "benchmark{}".format(index)
+            body = urlencode({"username": username, "password": username})
+            response = yield self.fetch("/auth/users", method="POST", body=body)
+            if response.code != 201:
+                raise RuntimeError("Unable to create {}: {}".format(username, response.code))
+
+            response = yield self.fetch("/auth/login", method="POST", body=body)
+            self.users.append({"username": username, "token": json.loads(response.body.decode())["access_token"]})
+
+        response = yield self.fetch("/auth/users/search", method="POST",
+                                    body=urlencode([("username", user["username"]) for user in self.users]))
+        user_ids = {result["username"]: result["userId"] for result in json.loads(response.body.decode())["results"]}
+        for user in self.users:
+            user["user_id"] = user_ids[user["username"]]
+
+    @tornado.gen.coroutine
+    def login(self, worker):
+        user = self.users[worker % len(self.users)]
+        response = yield self.fetch("/auth/login", method="POST",
+                                    body=urlencode({"username": user["username"], "password": user["username"]}))
+        return response.code == 200
+
+    @tornado.gen.coroutine
+    def proxied_get(self, worker):
+        response = yield self.fetch("/items/{}".format(worker), headers=self.authorization(worker))
+        return response.code == 200
+
+    @tornado.gen.coroutine
+    def proxied_post(self, worker):
+        response = yield self.fetch("/items", method="POST", headers=self.authorization(worker), body=b"x" * 1024)
+        return response.code == 200
+
+    @tornado.gen.coroutine
+    def search(self, worker):
+        body = urlencode([("user_id", user["user_id"]) for user in self.users[:10]])
+        response = yield self.fetch("/auth/users/search", method="POST", body=body)
+        return response.code == 200
+
+    @tornado.gen.coroutine
+    def run_scenario(self, name):
+        deadline = time.monotonic() + self.duration
+        latencies = []
+        counts = {"requests": 0, "errors": 0}
+
+        @tornado.gen.coroutine
+        def http_worker(worker):
+            request = getattr(self, name)
+            while time.monotonic() < deadline:
+                started = time.monotonic()
+                ok = yield request(worker)
+                counts["requests"] += 1
+                # Failures are often answered faster than successes, so they'd flatter throughput and latency
+                if ok:
+                    latencies.append(time.monotonic() - started)
+                else:
+                    counts["errors"] += 1
+
+        @tornado.gen.coroutine
+        def websocket_worker(worker):
+            connection = yield tornado.websocket.websocket_connect(self.websocket_url)
+            connection.write_message("Authorization: Bearer {}".format(self.token(worker)))
+            try:
+                while time.monotonic() < deadline:
+                    started = time.monotonic()
+                    connection.write_message("ping {}".format(worker))
+                    message = yield connection.read_message()
+                    counts["requests"] += 1
+                    if message is None:
+                        counts["errors"] += 1
+                        return
+                    latencies.append(time.monotonic() - started)
+            finally:
+                connection.close()
+
+        worker = websocket_worker if name == 'websocket_echo' else http_worker
+        concurrency = self.login_concurrency if name in PASSWORD_SCENARIOS else self.concurrency
+        started = time.monotonic()
+        yield [worker(index) for index in range(0, concurrency)]
+        elapsed = time.monotonic() - started
+
+        latencies.sort()
+        resident, peak = rss(self.pid)
+        return {
+            "requests": counts["requests"],
+            "errors": counts["errors"],
+            "error_rate": counts["errors"] / counts["requests"] if counts["requests"] else None,
+            "concurrency": concurrency,
+            "duration": elapsed,
+            "requests_per_second": len(latencies) / elapsed,
+            "p50": percentile(latencies, 0.50) * 1000 if latencies else None,
+            "p99": percentile(latencies, 0.99) * 1000 if latencies else None,
+            "p999": percentile(latencies, 0.999) * 1000 if latencies else None,
+            "rss": resident,
+            "peak_rss": peak
+        }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns a description of every metric that got worse than the baseline by more than `tolerance`, and of every
+    scenario whose error rate rose by more than `tolerance` (any error at all against an error-free baseline).
+    """
+    regressions = []
+    for name, scenario in results["scenarios"].items():
+        expected = baseline.get("scenarios", {}).get(name)
+        if expected is None:
+            continue
+
+        actual, reference = scenario.get("error_rate"), expected.get("error_rate") or 0
+        if actual is not None and actual > reference * (1 + tolerance):
+            regressions.append("{} error_rate: {:.2%} against a baseline of {:.2%}".format(name, actual, reference))
+
+        for metric, higher_is_better in HIGHER_IS_BETTER.items():
+            actual, reference = scenario.get(metric), expected.get(metric)
+            if actual is None or not reference:
+                continue
+
+            change = (actual - reference) / reference
+            if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+                regressions.append("{} {}: {:.2f} against a baseline of {:.2f} ({:+.1%})".format(
+                    name, metric, actual, reference, change))
+    return regressions
+
+
+def parse_override(value):
+    key, _, raw = value.partition("=")
+    try:
+        return key, json.loads(raw)
+    except ValueError:
+        return key, raw
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help="Comma separated scenarios to run (default: all of {})".format(", ".join(SCENARIOS)))
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run each scenario (default: 10)")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests kept in flight (default: 32)")
+    parser.add_argument("--login-concurrency", type=int,
+                        help="Logins kept in flight (default: half of Gandalf's password queue, at least one)")
+    parser.add_argument("--users", type=int, default=20, help="Users to create and log in (default: 20)")
+    parser.add_argument("--token-store", choices=["memory", "redis"], default="memory",
+                        help="The token store Gandalf uses; redis needs a Redis server at GANDALF_REDIS_HOST and "
+                             "GANDALF_REDIS_PORT (default: memory)")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], type=parse_override,
+                        metavar="NAME=VALUE", help="Overrides a GandalfConfiguration setting, e.g. token_cache_size=0")
+    parser.add_argument("--output", help="Writes the results to this file instead of stdout")
+    parser.add_argument("--baseline", help="Compares the results against a file written by --save-baseline")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Relative change tolerated before a metric counts as a regression (default: 0.1)")
+    parser.add_argument("--save-baseline", help="Writes the results to this file for later comparisons")
+    args = parser.parse_args(argv)
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error("Unknown scenarios: {}".format(", ".join(sorted(unknown))))
+    if args.token_store == "redis":
+        error = check_redis()
+        if error is not None:
+            parser.error(error)
+
+    overrides = dict(args.overrides)
+    login_concurrency = args.login_concurrency
+    if login_concurrency is None:
+        # Matches the queue size GANDALF_PASSWORD_QUEUE_SIZE defaults to; logins beyond it are shed with a 503
+        workers = overrides.get("password_workers", multiprocessing.cpu_count())
+        login_concurrency = max(1, overrides.get("password_queue_size", workers * 4) // 2)
+
+    http_port, websocket_port, upstream_port = [free_port() for _ in range(0, 3)]
+    upstream = multiprocessing.Process(target=serve_upstream, args=(upstream_port,))
+    upstream.start()
+    wait_for_port(upstream_port)
+
+    gandalf = multiprocessing.Process(target=serve_gandalf,
+                                      args=(http_port, websocket_port, upstream_port, args.token_store, overrides))
+    gandalf.start()
+    wait_for_port(http_port)
+    wait_for_port(websocket_port)
+
+    try:
+        benchmark = Benchmark(http_port, websocket_port, gandalf.pid, args.concurrency, login_concurrency,
+                              args.duration, args.users)
+        io_loop = tornado.ioloop.IOLoop.current()
+        io_loop.run_sync(benchmark.setup, timeout=max(60, args.users * 5))
+
+        results = {
+            "settings": {
+                "duration": args.duration,
+                "concurrency": args.concurrency,
+                "login_concurrency": login_concurrency,
+                "users": args.users,
+                "token_store": args.token_store,
+                "overrides": overrides,
+                "cpu_count": multiprocessing.cpu_count(),
+                "python": sys.version.split()[0]
+            },
+            "scenarios": {}
+        }
+        for name in scenarios:
+            results["scenarios"][name] = io_loop.run_sync(lambda: benchmark.run_scenario(name))
+    finally:
+        os.killpg(gandalf.pid, signal.SIGTERM)
+        upstream.terminate()
+        gandalf.join()
+        upstream.join()
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as file:
+            file.write(output + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get("settings") != results["settings"]:
+            print("Warning: the baseline was recorded with different settings: {}".format(
+                json.dumps(baseline.get("settings"), sort_keys=True)), file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print("Regression: {}".format(regression), file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
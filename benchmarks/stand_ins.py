@@ -0,0 +1,98 @@
+"""
+Local stand-ins for Postgres and the proxied backend, so Gandalf can be benchmarked without them.
+"""
+import tornado.web
+import tornado.websocket
+
+from app.db import DBAdapter, User, UserExistsException
+
+
+class MemoryDBAdapter(DBAdapter):
+    def __init__(self):
+        self.users_by_id = {}
+        self.users_by_username = {}
+        self.deactivated = {}
+
+    def get_user(self, username):
+        return self.users_by_username.get(username)
+
+    def create_user(self, user_id, username, password):
+        if username in self.users_by_username or any(user.username == username
+                                                     for user in self.deactivated.values()):
+            raise UserExistsException()
+        user = User(user_id, username, password)
+        self.users_by_id[user_id] = user
+        self.users_by_username[username] = user
+
+    def import_users(self, users):
+        user_ids = []
+        for user_id, username, password in users:
+            try:
+                self.create_user(user_id, username, password)
+                user_ids.append(user_id)
+            except UserExistsException:
+                pass
+        return user_ids
+
+    def update_user_password(self, user_id, password):
+        user = self.users_by_id.get(user_id)
+        if user is not None:
+            user.hashed_password = password
+
+    def search_for_users_by_id(self, user_ids):
+        return [self.users_by_id[user_id] for user_id in user_ids if user_id in self.users_by_id]
+
+    def search_for_users_by_username(self, usernames):
+        return [self.users_by_username[username] for username in usernames if username in self.users_by_username]
+
+    def deactivate_user(self, user_id):
+        user = self.users_by_id.pop(user_id, None)
+        if user is not None:
+            del self.users_by_username[user.username]
+            self.deactivated[user_id] = user
+
+    def reactivate_user(self, user_id):
+        user = self.deactivated.pop(user_id, None)
+        if user is not None:
+            self.users_by_id[user_id] = user
+            self.users_by_username[user.username] = user
+
+    def deactivate_users(self, user_ids):
+        user_ids = [user_id for user_id in user_ids if user_id in self.users_by_id]
+        for user_id in user_ids:
+            self.deactivate_user(user_id)
+        return user_ids
+
+    def reactivate_users(self, user_ids):
+        user_ids = [user_id for user_id in user_ids if user_id in self.deactivated]
+        for user_id in user_ids:
+            self.reactivate_user(user_id)
+        return user_ids
+
+
+class EchoHandler(tornado.web.RequestHandler):
+    def get(self, *args):
+        self.write({"user_id": self.request.headers.get("USER_ID"), "path": self.request.path})
+
+    def post(self, *args):
+        self.set_header("Content-Type", self.request.headers.get("Content-Type", "application/octet-stream"))
+        self.write(self.request.body)
+
+
+class EchoWebSocketHandler(tornado.websocket.WebSocketHandler):
+    def initialize(self):
+        self.identified = False
+
+    def on_message(self, message):
+        # Gandalf introduces the user in the first frame; only the client's own frames are echoed
+        if not self.identified:
+            self.identified = True
+        else:
+            self.write_message(message)
+
+
+def make_upstream_app():
+    return tornado.web.Application([
+        (r"/ws(.*)", EchoWebSocketHandler),
+        (r"(.*)", EchoHandler),
+    ])
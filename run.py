@@ -1,14 +1,18 @@
 import logging
 import os
 
+import tornado.httpserver
 import tornado.ioloop
 import tornado.log as tornado_logging
+import tornado.netutil
+import tornado.process
 
 from app import GandalfConfiguration
 from app import PostgresAdapter
 from app import WEBSOCKET
 from app import make_app
 from app.config import HTTP
+from app.token_store.memory_store import MemoryTokenStore
 
 tornado_logging.access_log.setLevel(logging.DEBUG)
 tornado_logging.app_log.setLevel(logging.DEBUG)
@@ -28,6 +32,86 @@ if __name__ == "__main__":
     internal_hosts = os.getenv("GANDALF_ALLOWED_HOSTS", "").strip()
     if len(secret) == 0:
         print("GANDALF_SIGNING_SECRET is not set. *DO NOT RUN THIS IN PRODUCTION!!!*")
-    app = make_app(GandalfConfiguration(host, PostgresAdapter(), internal_hosts, signing_secret=secret, mode=mode))
-    app.listen(8888)
+    token_cache_size = int(os.getenv("GANDALF_TOKEN_CACHE_SIZE", "10000"))
+    token_cache_ttl = float(os.getenv("GANDALF_TOKEN_CACHE_TTL", "30"))
+    user_cache_size = int(os.getenv("GANDALF_USER_CACHE_SIZE", "10000"))
+    user_cache_ttl = float(os.getenv("GANDALF_USER_CACHE_TTL", "30"))
+    stateless_tokens = os.getenv("GANDALF_STATELESS_TOKENS", "False").lower() == "true"
+    token_lifetime = int(os.getenv("GANDALF_TOKEN_LIFETIME", "3600"))
+    token_clock_skew = int(os.getenv("GANDALF_TOKEN_CLOCK_SKEW", "5"))
+    revocation_sync_interval = float(os.getenv("GANDALF_REVOCATION_SYNC_INTERVAL", "5"))
+    revocation_filter_capacity = int(os.getenv("GANDALF_REVOCATION_FILTER_CAPACITY", "100000"))
+    token_store = os.getenv("GANDALF_TOKEN_STORE", "redis").lower()
+    if token_store not in ("redis", "memory"):
+        raise SystemExit("GANDALF_TOKEN_STORE must be 'redis' or 'memory'")
+    token_store_size = int(os.getenv("GANDALF_TOKEN_STORE_SIZE", "100000"))
+    session_ttl = os.getenv("GANDALF_SESSION_TTL")
+    if session_ttl is not None:
+        session_ttl = int(session_ttl)
+    session_refresh_interval = os.getenv("GANDALF_SESSION_REFRESH_INTERVAL")
+    if session_refresh_interval is not None:
+        session_refresh_interval = float(session_refresh_interval)
+    # Tokens kept in memory are only known to the process that issued them
+    workers = int(os.getenv("GANDALF_WORKERS", "1" if token_store == "memory" else str(tornado.process.cpu_count())))
+    if token_store == "memory" and workers != 1:
+        raise SystemExit("GANDALF_TOKEN_STORE=memory requires GANDALF_WORKERS=1")
+    max_restarts = int(os.getenv("GANDALF_MAX_RESTARTS", "100"))
+    # Share the cores between the server workers' password pools rather than giving each worker one per core
+    password_workers = int(os.getenv("GANDALF_PASSWORD_WORKERS",
+                                     str(max(1, tornado.process.cpu_count() // max(1, workers)))))
+    password_queue_size = int(os.getenv("GANDALF_PASSWORD_QUEUE_SIZE", str(password_workers * 4)))
+    stream_uploads = os.getenv("GANDALF_STREAM_UPLOADS", "False").lower() == "true"
+    upload_chunk_size = int(os.getenv("GANDALF_UPLOAD_CHUNK_SIZE", "65536"))
+    upload_buffer_chunks = int(os.getenv("GANDALF_UPLOAD_BUFFER_CHUNKS", "4"))
+    max_upload_size = os.getenv("GANDALF_MAX_UPLOAD_SIZE")
+    if max_upload_size is not None:
+        max_upload_size = int(max_upload_size)
+    stream_responses = os.getenv("GANDALF_STREAM_RESPONSES", "False").lower() == "true"
+    upstream_client = os.getenv("GANDALF_UPSTREAM_CLIENT", "simple").lower()
+    upstream_max_clients = int(os.getenv("GANDALF_UPSTREAM_MAX_CLIENTS", "100"))
+    upstream_connect_timeout = float(os.getenv("GANDALF_UPSTREAM_CONNECT_TIMEOUT", "20"))
+    upstream_request_timeout = float(os.getenv("GANDALF_UPSTREAM_REQUEST_TIMEOUT", "20"))
+    upstream_strategy = os.getenv("GANDALF_UPSTREAM_STRATEGY", "round_robin").lower()
+    health_check_interval = float(os.getenv("GANDALF_HEALTH_CHECK_INTERVAL", "5"))
+    health_check_timeout = float(os.getenv("GANDALF_HEALTH_CHECK_TIMEOUT", "2"))
+    health_check_path = os.getenv("GANDALF_HEALTH_CHECK_PATH")
+    routes = os.getenv("GANDALF_ROUTES")
+    response_cache_size = int(os.getenv("GANDALF_RESPONSE_CACHE_SIZE", "0"))
+    db_workers = int(os.getenv("GANDALF_DB_WORKERS", os.getenv("GANDALF_POSTGRES_POOL_MAX", "10")))
+
+    # Create the schema once, before forking, so the workers don't race each other to create it
+    PostgresAdapter(min_connections=0).close()
+
+    sockets = tornado.netutil.bind_sockets(8888)
+    if workers != 1:
+        print("Starting {} workers.".format(workers))
+        tornado.process.fork_processes(workers, max_restarts=max_restarts)
+
+    db_adapter = PostgresAdapter(create_schema=False)
+    # Left unset, the Redis token store is configured by make_app
+    memory_token_store = None
+    if token_store == "memory":
+        memory_token_store = MemoryTokenStore(max_tokens=token_store_size, ttl=session_ttl)
+    app = make_app(GandalfConfiguration(host, db_adapter, internal_hosts, signing_secret=secret, mode=mode,
+                                        token_cache_size=token_cache_size, token_cache_ttl=token_cache_ttl,
+                                        db_workers=db_workers, password_workers=password_workers,
+                                        password_queue_size=password_queue_size, stream_uploads=stream_uploads,
+                                        upload_buffer_chunks=upload_buffer_chunks, max_upload_size=max_upload_size,
+                                        stream_responses=stream_responses, upstream_client=upstream_client,
+                                        upstream_max_clients=upstream_max_clients,
+                                        upstream_connect_timeout=upstream_connect_timeout,
+                                        upstream_request_timeout=upstream_request_timeout,
+                                        upstream_strategy=upstream_strategy,
+                                        health_check_interval=health_check_interval,
+                                        health_check_timeout=health_check_timeout,
+                                        health_check_path=health_check_path, routes=routes,
+                                        response_cache_size=response_cache_size,
+                                        token_store=memory_token_store, user_cache_size=user_cache_size,
+                                        user_cache_ttl=user_cache_ttl, stateless_tokens=stateless_tokens,
+                                        token_lifetime=token_lifetime, token_clock_skew=token_clock_skew,
+                                        revocation_sync_interval=revocation_sync_interval,
+                                        revocation_filter_capacity=revocation_filter_capacity,
+                                        session_ttl=session_ttl, session_refresh_interval=session_refresh_interval))
+    server = tornado.httpserver.HTTPServer(app, chunk_size=upload_chunk_size)
+    server.add_sockets(sockets)
     tornado.ioloop.IOLoop.current().start()
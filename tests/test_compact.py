@@ -0,0 +1,59 @@
+import json
+import uuid
+import unittest
+
+import redis
+
+from app.token_store.compact import compact
+from app.token_store.redis_store import REVOCATION_CHANNEL
+
+
+class CompactTest(unittest.TestCase):
+    def setUp(self):
+        self.client = redis.StrictRedis(db=15)
+        self.client.flushdb()
+
+    def tearDown(self):
+        self.client.flushdb()
+
+    def session(self, token):
+        user_id = str(uuid.uuid1())
+        self.client.set(token, json.dumps({"userId": user_id, "username": token}))
+        self.client.set(user_id, token)
+        return user_id
+
+    def test_removes_orphaned_keys(self):
+        valid_user_id = self.session("valid")
+        replaced_user_id = self.session("replaced")
+        self.client.set(replaced_user_id, "replacement")
+        self.client.set("replacement", json.dumps({"userId": replaced_user_id, "username": "replaced"}))
+        missing_token_user_id = str(uuid.uuid1())
+        self.client.set(missing_token_user_id, "missing")
+        self.client.set("unrelated", "value")
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(REVOCATION_CHANNEL)
+        self.addCleanup(pubsub.close)
+
+        result = compact(self.client, grace=0)
+
+        self.assertEqual(result["removed"], 2)
+        messages = [pubsub.get_message(timeout=0.1) for _ in range(5)]
+        self.assertEqual([message["data"] for message in messages if message is not None], [b"replaced"])
+        self.assertIsNone(self.client.get("replaced"))
+        self.assertIsNone(self.client.get(missing_token_user_id))
+        self.assertEqual(self.client.get(valid_user_id), b"valid")
+        self.assertEqual(self.client.get(replaced_user_id), b"replacement")
+        self.assertEqual(self.client.get("unrelated"), b"value")
+
+    def test_sets_ttl_on_sessions(self):
+        user_id = self.session("token")
+        self.client.set("unrelated", "value")
+
+        result = compact(self.client, ttl=3600, dry_run=True, grace=0)
+        self.assertEqual(result, {"scanned": 3, "removed": 0, "expiring": 2})
+        self.assertEqual(self.client.ttl("token"), -1)
+
+        compact(self.client, ttl=3600, grace=0)
+        self.assertGreater(self.client.ttl("token"), 0)
+        self.assertGreater(self.client.ttl(user_id), 0)
+        self.assertEqual(self.client.ttl("unrelated"), -1)
@@ -0,0 +1,89 @@
+import threading
+import unittest
+
+import psycopg2.extensions
+
+from app.db.pool import ConnectionPool, PoolTimeoutException
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.opened = []
+
+        def connect():
+            conn = FakeConnection()
+            self.opened.append(conn)
+            return conn
+
+        self.connect = connect
+
+    def test_opens_min_size_up_front(self):
+        pool = ConnectionPool(self.connect, min_size=2, max_size=5)
+        self.assertEqual(len(self.opened), 2)
+        self.assertEqual(pool.stats()['idle'], 2)
+
+    def test_reuses_connections(self):
+        pool = ConnectionPool(self.connect, min_size=1, max_size=5)
+        for _ in range(10):
+            with pool.connection():
+                pass
+
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(pool.stats()['checkouts'], 10)
+
+    def test_times_out_when_exhausted(self):
+        pool = ConnectionPool(self.connect, min_size=0, max_size=1, timeout=0.01)
+        conn = pool.getconn()
+        self.assertEqual(pool.stats()['utilization'], 1.0)
+
+        with self.assertRaises(PoolTimeoutException):
+            pool.getconn()
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+        pool.putconn(conn)
+        self.assertIs(pool.getconn(), conn)
+
+    def test_waiting_borrower_gets_returned_connection(self):
+        pool = ConnectionPool(self.connect, min_size=0, max_size=1, timeout=5)
+        conn = pool.getconn()
+        borrowed = []
+
+        thread = threading.Thread(target=lambda: borrowed.append(pool.getconn()))
+        thread.start()
+        pool.putconn(conn)
+        thread.join()
+
+        self.assertEqual(borrowed, [conn])
+
+    def test_rolls_back_open_transactions(self):
+        pool = ConnectionPool(self.connect, min_size=1, max_size=1)
+        with pool.connection() as conn:
+            conn.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+
+        self.assertEqual(conn.rollbacks, 1)
+
+    def test_replaces_closed_connections(self):
+        pool = ConnectionPool(self.connect, min_size=1, max_size=1)
+        with pool.connection() as conn:
+            conn.closed = 1
+
+        with pool.connection() as replacement:
+            self.assertIsNot(replacement, conn)
+        self.assertEqual(pool.stats()['size'], 1)
@@ -2,6 +2,7 @@ import json
 import logging
 
 import psycopg2
+import redis
 import tornado.log as tornado_logging
 import tornado.testing
 
@@ -107,4 +108,66 @@ class LoginTest(tornado.testing.AsyncHTTPTestCase):
         authorization_should_fail("Bear {}".format(access_token))
         authorization_should_fail("Bear er {}".format(access_token))
         authorization_should_fail("Bearer{}".format(access_token))
-        authorization_should_fail("b e a r e r {}".format(access_token))
\ No newline at end of file
+        authorization_should_fail("b e a r e r {}".format(access_token))
+
+
+class SessionTTLTest(tornado.testing.AsyncHTTPTestCase):
+    def get_app(self):
+        conn = psycopg2.connect(host="localhost", user="postgres")
+        cursor = conn.cursor()
+        cursor.execute("DROP SCHEMA IF EXISTS gandalf CASCADE")
+        conn.commit()
+
+        return make_app(GandalfConfiguration('localhost:8889', PostgresAdapter(), 'localhost', session_ttl=600,
+                                             session_refresh_interval=60))
+
+    def test_sessions_expire_and_are_refreshed(self):
+        response = self.fetch("/auth/users", method="POST", body="username=test&password=test")
+        self.assertEqual(response.code, 201)
+        user_id = response.headers['USER_ID']
+
+        response = self.fetch("/auth/login", method="POST", body="username=test&password=test")
+        access_token = json.loads(response.body.decode())['access_token']
+
+        client = redis.StrictRedis()
+        self.assertTrue(0 < client.ttl(access_token) <= 600)
+        self.assertTrue(0 < client.ttl(user_id) <= 600)
+
+        client.expire(access_token, 30)
+        response = self.fetch("/auth/users/me", headers={"Authorization": "Bearer {}".format(access_token)})
+        self.assertEqual(response.code, 200)
+        self.io_loop.call_later(0.1, self.stop)
+        self.wait()
+        self.assertGreater(client.ttl(access_token), 30)
+
+        # Refreshes are only sent once per interval
+        client.expire(access_token, 30)
+        response = self.fetch("/auth/users/me", headers={"Authorization": "Bearer {}".format(access_token)})
+        self.assertEqual(response.code, 200)
+        self.io_loop.call_later(0.1, self.stop)
+        self.wait()
+        self.assertLessEqual(client.ttl(access_token), 30)
+
+
+class SessionExpiryTest(tornado.testing.AsyncHTTPTestCase):
+    def get_app(self):
+        conn = psycopg2.connect(host="localhost", user="postgres")
+        cursor = conn.cursor()
+        cursor.execute("DROP SCHEMA IF EXISTS gandalf CASCADE")
+        conn.commit()
+
+        return make_app(GandalfConfiguration('localhost:8889', PostgresAdapter(), 'localhost', session_ttl=600))
+
+    def test_cached_tokens_expire_with_their_session(self):
+        response = self.fetch("/auth/users", method="POST", body="username=test&password=test")
+        self.assertEqual(response.code, 201)
+        response = self.fetch("/auth/login", method="POST", body="username=test&password=test")
+        access_token = json.loads(response.body.decode())['access_token']
+        headers = {"Authorization": "Bearer {}".format(access_token)}
+
+        redis.StrictRedis().pexpire(access_token, 500)
+        self.assertEqual(self.fetch("/auth/users/me", headers=headers).code, 200)
+
+        self.io_loop.call_later(0.7, self.stop)
+        self.wait()
+        self.assertEqual(self.fetch("/auth/users/me", headers=headers).code, 401)
@@ -0,0 +1,76 @@
+import unittest
+
+from app.cache import LRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_expires_entries(self):
+        clock = FakeClock()
+        cache = LRUCache(10, ttl=5, clock=clock)
+        cache.set('a', 1)
+
+        clock.now = 4
+        self.assertEqual(cache.get('a'), 1)
+
+        clock.now = 5
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.expirations, 1)
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidate(self):
+        cache = LRUCache(10)
+        cache.set('a', 1)
+        self.assertTrue(cache.invalidate('a'))
+        self.assertFalse(cache.invalidate('a'))
+        self.assertIsNone(cache.get('a'))
+
+    def test_disabled(self):
+        cache = LRUCache(0)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_weigher(self):
+        cache = LRUCache(10, weigher=len)
+        cache.set('a', 'aaaa')
+        cache.set('b', 'bbbb')
+        cache.set('c', 'cccc')
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.weight, 8)
+
+        cache.set('d', 'd' * 11)
+        self.assertNotIn('d', cache)
+        self.assertEqual(cache.weight, 8)
+
+    def test_stats(self):
+        cache = LRUCache(10)
+        cache.set('a', 1)
+        cache.get('a')
+        cache.get('a')
+        cache.get('a')
+        cache.get('b')
+
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 3)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_ratio'], 0.75)
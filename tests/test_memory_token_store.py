@@ -0,0 +1,63 @@
+import unittest
+
+from app.token_store.memory_store import MemoryTokenStore
+
+ALICE = {"userId": "1", "username": "alice"}
+BOB = {"userId": "2", "username": "bob"}
+
+
+class MemoryTokenStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.store = MemoryTokenStore(max_tokens=2)
+        self.revoked = []
+        self.store.add_revocation_listener(self.revoked.append)
+
+    def test_issue_and_lookup(self):
+        self.assertEqual(self.store.issue(ALICE, "a1").result(), "a1")
+        self.assertEqual(self.store.lookup("a1").result(), ALICE)
+        self.assertIsNone(self.store.lookup("unknown").result())
+
+    def test_lookup_with_ttl(self):
+        self.store.issue(ALICE, "a1")
+        self.assertEqual(self.store.lookup_with_ttl("a1").result(), (ALICE, None))
+        self.assertEqual(self.store.lookup_with_ttl("unknown").result(), (None, None))
+
+        store = MemoryTokenStore(ttl=60)
+        store.issue(ALICE, "a1")
+        user, ttl = store.lookup_with_ttl("a1").result()
+        self.assertEqual(user, ALICE)
+        self.assertTrue(0 < ttl <= 60)
+
+    def test_issue_reuses_existing_token(self):
+        self.store.issue(ALICE, "a1")
+        self.assertEqual(self.store.issue(ALICE, "a2").result(), "a1")
+        self.assertIsNone(self.store.lookup("a2").result())
+
+    def test_revoke(self):
+        self.store.issue(ALICE, "a1")
+        self.assertTrue(self.store.revoke("a1").result())
+        self.assertFalse(self.store.revoke("a1").result())
+        self.assertIsNone(self.store.lookup("a1").result())
+        self.assertEqual(self.store.issue(ALICE, "a2").result(), "a2")
+        self.assertEqual(self.revoked, ["a1"])
+
+    def test_revoke_all_for_user(self):
+        self.store.issue(ALICE, "a1")
+        self.store.issue(BOB, "b1")
+        self.assertEqual(self.store.revoke_all_for_user("1").result(), ["a1"])
+        self.assertEqual(self.store.revoke_all_for_user("1").result(), [])
+        self.assertIsNone(self.store.lookup("a1").result())
+        self.assertEqual(self.store.lookup("b1").result(), BOB)
+        self.assertEqual(self.revoked, ["a1"])
+
+    def test_bounded(self):
+        self.store.issue(ALICE, "a1")
+        self.store.issue(BOB, "b1")
+        self.store.issue({"userId": "3", "username": "carol"}, "c1")
+        self.assertIsNone(self.store.lookup("a1").result())
+        self.assertEqual(self.store.issue(ALICE, "a2").result(), "a2")
+
+    def test_refresh(self):
+        self.store.issue(ALICE, "a1")
+        self.assertTrue(self.store.refresh("a1", "1").result())
+        self.assertFalse(self.store.refresh("unknown", "1").result())
@@ -0,0 +1,40 @@
+import unittest
+
+from app.metrics import Registry, gauges_from_stats
+
+
+class MetricsTest(unittest.TestCase):
+    def test_counter(self):
+        registry = Registry()
+        counter = registry.counter("requests_total", "Requests", ["handler"])
+        counter.inc("Login")
+        counter.inc("Login", amount=2)
+        self.assertIn('requests_total{handler="Login"} 3', registry.render())
+
+    def test_histogram(self):
+        registry = Registry()
+        histogram = registry.histogram("latency_seconds", "Latency", ["method"], buckets=(0.1, 1.0))
+        histogram.observe(0.05, "get")
+        histogram.observe(0.5, "get")
+        histogram.observe(5, "get")
+
+        lines = registry.render().splitlines()
+        self.assertEqual(lines[:2], ["# HELP latency_seconds Latency", "# TYPE latency_seconds histogram"])
+        self.assertIn('latency_seconds_bucket{method="get",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{method="get",le="1.0"} 2', lines)
+        self.assertIn('latency_seconds_bucket{method="get",le="+Inf"} 3', lines)
+        self.assertIn('latency_seconds_sum{method="get"} 5.55', lines)
+        self.assertIn('latency_seconds_count{method="get"} 3', lines)
+
+    def test_gauges_from_stats(self):
+        registry = Registry()
+        registry.add_collector(lambda: gauges_from_stats("gandalf", {
+            "cache": {"size": 3, "hit_ratio": 0.5},
+            "members": [{"address": "a:80", "healthy": True}, {"address": "b:80", "healthy": False}]
+        }))
+
+        lines = registry.render().splitlines()
+        self.assertIn('gandalf_cache_size 3', lines)
+        self.assertIn('gandalf_cache_hit_ratio 0.5', lines)
+        self.assertIn('gandalf_members_healthy{address="a:80"} 1', lines)
+        self.assertIn('gandalf_members_healthy{address="b:80"} 0', lines)
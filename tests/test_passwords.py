@@ -0,0 +1,55 @@
+import threading
+
+import tornado.testing
+
+from app.passwords import PasswordHasher, verify_password
+
+
+class PasswordHasherTest(tornado.testing.AsyncTestCase):
+    def test_requires_start_with_workers(self):
+        passwords = PasswordHasher(workers=1)
+        with self.assertRaises(RuntimeError):
+            self.io_loop.run_sync(lambda: passwords.encrypt("secret"))
+
+    @tornado.testing.gen_test(timeout=10)
+    def test_start_forks_the_workers_up_front(self):
+        passwords = PasswordHasher(workers=1)
+        passwords.start()
+        self.addCleanup(passwords.executor.shutdown)
+        self.assertEqual(len(passwords.executor._processes), 1)
+
+        hashed_password = yield passwords.encrypt("secret")
+        self.assertTrue(verify_password("secret", hashed_password))
+
+    @tornado.testing.gen_test(timeout=10)
+    def test_resumes_on_the_ioloop_thread(self):
+        passwords = PasswordHasher(workers=1)
+        passwords.start()
+        self.addCleanup(passwords.executor.shutdown)
+
+        hashed_passwords = yield passwords.encrypt_many(["first", "second"])
+        self.assertIs(threading.current_thread(), threading.main_thread())
+        self.assertEqual(len(hashed_passwords), 2)
+
+    @tornado.testing.gen_test(timeout=30)
+    def test_bulk_hashing_leaves_workers_for_logins(self):
+        passwords = PasswordHasher(workers=2)
+        passwords.start()
+        self.addCleanup(passwords.executor.shutdown)
+        hashed_password = yield passwords.encrypt("secret")
+
+        finished = []
+        bulk = passwords.encrypt_many(["a", "b", "c", "d"])
+        bulk.add_done_callback(lambda _: finished.append("bulk"))
+        self.assertTrue((yield passwords.verify("secret", hashed_password)))
+        finished.append("login")
+        yield bulk
+
+        self.assertEqual(passwords.bulk_workers, 1)
+        self.assertEqual(finished, ["login", "bulk"])
+
+    def test_start_without_workers(self):
+        passwords = PasswordHasher()
+        passwords.start()
+        self.assertIsNone(passwords.executor)
+
@@ -0,0 +1,44 @@
+import unittest
+import uuid
+
+import psycopg2
+
+from app.db import UserExistsException
+from app.db.postgres_adapter import PostgresAdapter
+
+
+class PostgresAdapterTest(unittest.TestCase):
+    def setUp(self):
+        conn = psycopg2.connect(host="localhost", user="postgres")
+        cursor = conn.cursor()
+        cursor.execute("DROP SCHEMA IF EXISTS gandalf CASCADE")
+        conn.commit()
+        conn.close()
+
+        self.adapter = PostgresAdapter(min_connections=1, max_connections=1)
+        self.addCleanup(self.adapter.close)
+
+    def prepared_statements(self):
+        with self.adapter.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name FROM pg_prepared_statements")
+            return sorted(row[0] for row in cursor)
+
+    def test_create_user_rejects_taken_usernames(self):
+        user_id = str(uuid.uuid1())
+        self.adapter.create_user(user_id, "test", "password")
+
+        with self.assertRaises(UserExistsException):
+            self.adapter.create_user(str(uuid.uuid1()), "test", "other")
+
+        user = self.adapter.get_user("test")
+        self.assertEqual((user.user_id, user.hashed_password), (user_id, "password"))
+
+    def test_statements_are_prepared_once_per_connection(self):
+        for _ in range(3):
+            self.assertIsNone(self.adapter.get_user("missing"))
+            self.assertEqual(self.adapter.search_for_users_by_id([]), [])
+            self.assertEqual(self.adapter.search_for_users_by_username(["missing"]), [])
+
+        self.assertEqual(self.prepared_statements(), ["gandalf_get_user", "gandalf_search_for_users_by_id",
+                                                      "gandalf_search_for_users_by_username"])
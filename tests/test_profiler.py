@@ -0,0 +1,70 @@
+import sys
+import time
+import unittest
+
+import tornado.ioloop
+import tornado.testing
+
+from app.profiler import BlockingMonitor, ProfilerBusyException, SamplingProfiler, collapse
+
+
+def busy(seconds):
+    deadline = time.process_time() + seconds
+    while time.process_time() < deadline:
+        pass
+
+
+class SamplingProfilerTest(unittest.TestCase):
+    def test_collapse(self):
+        stack = collapse(sys._getframe())
+        self.assertTrue(stack.endswith("test_collapse ({}:{})".format(__file__, self.test_collapse.__code__.co_firstlineno)))
+        self.assertGreater(stack.count(";"), 0)
+
+    def test_samples_running_code(self):
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.start()
+        try:
+            self.assertRaises(ProfilerBusyException, SamplingProfiler().start)
+            busy(0.2)
+        finally:
+            profiler.stop()
+
+        lines = profiler.collapsed().splitlines()
+        self.assertTrue(lines)
+        self.assertIn("busy (", lines[0])
+        self.assertFalse(SamplingProfiler.running)
+
+
+class UnwatchableIOLoop:
+    def set_blocking_signal_threshold(self, seconds, action):
+        raise ValueError("signal only works in main thread")
+
+
+class BlockingMonitorTest(tornado.testing.AsyncTestCase):
+    def test_records_blocking_callbacks(self):
+        monitor = BlockingMonitor(self.io_loop, threshold=0.05)
+        try:
+            monitor.start()
+        except (AttributeError, NotImplementedError):
+            self.skipTest("This IOLoop can't report blocking callbacks")
+        self.io_loop.call_later(0.01, time.sleep, 0.2)
+        self.io_loop.call_later(0.3, self.stop)
+        self.wait()
+        monitor.stop()
+
+        report = monitor.report()
+        self.assertEqual(len(report), 1)
+        self.assertEqual(report[0]["count"], 1)
+        self.assertGreaterEqual(report[0]["max_seconds"], 0.15)
+        self.assertFalse(BlockingMonitor.running)
+
+    def test_failed_start_can_be_retried(self):
+        self.assertRaises(ValueError, BlockingMonitor(UnwatchableIOLoop()).start)
+        self.assertFalse(BlockingMonitor.running)
+
+        monitor = BlockingMonitor(self.io_loop)
+        try:
+            monitor.start()
+        except (AttributeError, NotImplementedError):
+            self.skipTest("This IOLoop can't report blocking callbacks")
+        monitor.stop()
@@ -0,0 +1,63 @@
+import json
+import unittest
+import uuid
+
+import redis
+
+from app.token_store.redis_store import RedisTokenStore
+
+
+class RedisTokenStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.store = RedisTokenStore(ttl=60)
+        self.client = redis.StrictRedis()
+        self.user = {"userId": str(uuid.uuid1()), "username": "alice"}
+        self.tokens = [str(uuid.uuid4()) for _ in range(20)]
+
+    def tearDown(self):
+        self.client.delete(self.user['userId'], *self.tokens)
+
+    def test_concurrent_issues_agree(self):
+        futures = [self.store.issue(self.user, token) for token in self.tokens]
+        issued = {future.result() for future in futures}
+
+        self.assertEqual(len(issued), 1)
+        token = issued.pop()
+        self.assertEqual(self.client.get(self.user['userId']), token.encode())
+        self.assertEqual(json.loads(self.client.get(token).decode()), self.user)
+        self.assertEqual([token for token in self.tokens if self.client.exists(token)], [token])
+        self.assertTrue(0 < self.client.ttl(token) <= 60)
+
+    def test_lookup_with_ttl(self):
+        token = self.store.issue(self.user, self.tokens[0]).result()
+        user, ttl = self.store.lookup_with_ttl(token).result()
+        self.assertEqual(user, self.user)
+        self.assertTrue(0 < ttl <= 60)
+
+        self.client.persist(token)
+        self.assertEqual(self.store.lookup_with_ttl(token).result(), (self.user, None))
+        self.assertEqual(self.store.lookup_with_ttl(self.tokens[1]).result(), (None, None))
+
+    def test_revoke(self):
+        token = self.store.issue(self.user, self.tokens[0]).result()
+        self.assertTrue(self.store.revoke(token).result())
+        self.assertFalse(self.store.revoke(token).result())
+        self.assertIsNone(self.client.get(self.user['userId']))
+        self.assertIsNone(self.store.lookup(token).result())
+
+    def test_revoke_all_for_user(self):
+        token = self.store.issue(self.user, self.tokens[0]).result()
+        self.assertEqual(self.store.revoke_all_for_user(self.user['userId']).result(), [token])
+        self.assertEqual(self.store.revoke_all_for_user(self.user['userId']).result(), [])
+        self.assertIsNone(self.store.lookup(token).result())
+        self.assertEqual(self.store.issue(self.user, self.tokens[1]).result(), self.tokens[1])
+
+    def test_revoke_all_for_users(self):
+        other = {"userId": str(uuid.uuid1()), "username": "bob"}
+        self.addCleanup(self.client.delete, other['userId'])
+        tokens = [self.store.issue(self.user, self.tokens[0]).result(), self.store.issue(other, self.tokens[1]).result()]
+
+        revoked = self.store.revoke_all_for_users([self.user['userId'], other['userId'], "unknown"]).result()
+
+        self.assertEqual(revoked, tokens)
+        self.assertEqual([self.store.lookup(token).result() for token in tokens], [None, None])
@@ -0,0 +1,99 @@
+import unittest
+
+from tornado.httputil import HTTPHeaders
+
+from app.response_cache import ResponseCache, parse_cache_control
+
+HOST = 'example.com'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ResponseCache(10000, clock=self.clock)
+
+    def store(self, user_id, cache_control, uri='/things', request_headers=None, host=HOST, **headers):
+        headers = [('Cache-Control', cache_control)] + list(headers.items())
+        return self.cache.store(user_id, host, uri, HTTPHeaders(request_headers or {}), 200, headers, b"body")
+
+    def test_parse_cache_control(self):
+        self.assertEqual(parse_cache_control('Public, max-age="60", no-transform'),
+                         {'public': None, 'max-age': '60', 'no-transform': None})
+
+    def test_private_responses_are_per_user(self):
+        self.assertTrue(self.store('alice', 'max-age=60'))
+        self.assertEqual(self.cache.lookup('alice', HOST, '/things', HTTPHeaders()).body, b"body")
+        self.assertIsNone(self.cache.lookup('bob', HOST, '/things', HTTPHeaders()))
+
+    def test_public_responses_are_shared(self):
+        self.assertTrue(self.store('alice', 'public, max-age=60'))
+        self.assertIsNotNone(self.cache.lookup('bob', HOST, '/things', HTTPHeaders()))
+
+    def test_entries_are_per_host(self):
+        self.assertTrue(self.store('alice', 'public, max-age=60'))
+        self.assertIsNone(self.cache.lookup('alice', 'other.example.com', '/things', HTTPHeaders()))
+        self.assertFalse(self.store('alice', 'no-store', host='other.example.com'))
+        self.assertTrue(self.cache.expects_to_store(HOST, '/things'))
+
+        self.cache.invalidate('alice', 'other.example.com', '/things')
+        self.assertIsNotNone(self.cache.lookup('alice', HOST, '/things', HTTPHeaders()))
+
+    def test_expires(self):
+        self.store('alice', 'max-age=60', Age='20')
+        self.clock.now = 30
+        self.assertEqual(self.cache.age(self.cache.lookup('alice', HOST, '/things', HTTPHeaders())), 50)
+        self.clock.now = 40
+        self.assertIsNone(self.cache.lookup('alice', HOST, '/things', HTTPHeaders()))
+
+    def test_uncacheable(self):
+        self.assertFalse(self.store('alice', 'no-store, max-age=60'))
+        self.assertFalse(self.store('alice', 'no-cache'))
+        self.assertFalse(self.store('alice', 'private'))
+        self.assertFalse(self.store('alice', 'max-age=60', Vary='*'))
+        self.assertFalse(self.store('alice', 'public, max-age=60', **{'Set-Cookie': 'a=b'}))
+
+    def test_vary(self):
+        self.store('alice', 'max-age=60', request_headers={'Accept': 'application/json'}, Vary='Accept')
+        self.assertIsNotNone(self.cache.lookup('alice', HOST, '/things', HTTPHeaders({'Accept': 'application/json'})))
+        self.assertIsNone(self.cache.lookup('alice', HOST, '/things', HTTPHeaders({'Accept': 'text/html'})))
+
+    def test_request_no_cache_bypasses(self):
+        self.store('alice', 'max-age=60')
+        self.assertIsNone(self.cache.lookup('alice', HOST, '/things', HTTPHeaders({'Cache-Control': 'no-cache'})))
+
+    def test_invalidate(self):
+        self.store('alice', 'max-age=60')
+        self.store('alice', 'public, max-age=60', uri='/shared')
+        self.cache.invalidate('alice', HOST, '/things')
+        self.cache.invalidate('bob', HOST, '/shared')
+        self.assertIsNone(self.cache.lookup('alice', HOST, '/things', HTTPHeaders()))
+        self.assertIsNone(self.cache.lookup('alice', HOST, '/shared', HTTPHeaders()))
+
+    def test_vary_falls_back_to_shared(self):
+        self.store('alice', 'public, max-age=60', request_headers={'Accept': 'application/json'}, Vary='Accept')
+        self.store('alice', 'max-age=60', request_headers={'Accept': 'text/html'}, Vary='Accept')
+        self.assertIsNotNone(self.cache.lookup('alice', HOST, '/things', HTTPHeaders({'Accept': 'text/html'})))
+        self.assertIsNotNone(self.cache.lookup('alice', HOST, '/things', HTTPHeaders({'Accept': 'application/json'})))
+
+    def test_expects_to_store(self):
+        self.assertTrue(self.cache.expects_to_store(HOST, '/things'))
+        self.assertFalse(self.store('alice', 'no-store'))
+        self.assertFalse(self.cache.expects_to_store(HOST, '/things'))
+        self.assertTrue(self.cache.expects_to_store(HOST, '/other'))
+
+        self.assertFalse(self.cache.store('alice', HOST, '/things', HTTPHeaders(), 304, [], b""))
+        self.assertFalse(self.cache.expects_to_store(HOST, '/things'))
+        self.clock.now = 60
+        self.assertTrue(self.cache.expects_to_store(HOST, '/things'))
+
+        self.assertFalse(self.store('alice', 'no-store'))
+        self.assertTrue(self.store('alice', 'max-age=60'))
+        self.assertTrue(self.cache.expects_to_store(HOST, '/things'))
@@ -0,0 +1,132 @@
+import json
+import logging
+
+import psycopg2
+import tornado.log as tornado_logging
+import tornado.testing
+import tornado.web
+
+from app import GandalfConfiguration
+from app.db.postgres_adapter import PostgresAdapter
+from run import make_app
+
+tornado_logging.access_log.setLevel(logging.DEBUG)
+tornado_logging.app_log.setLevel(logging.DEBUG)
+tornado_logging.gen_log.setLevel(logging.DEBUG)
+
+
+class ResponseCachingTest(tornado.testing.AsyncHTTPTestCase):
+    stream_responses = False
+
+    def get_app(self):
+        conn = psycopg2.connect(host="localhost", user="postgres")
+        cursor = conn.cursor()
+        cursor.execute("DROP SCHEMA IF EXISTS gandalf CASCADE")
+        conn.commit()
+
+        app = make_app(GandalfConfiguration('localhost:8889', PostgresAdapter(), 'localhost',
+                                            stream_responses=self.stream_responses, response_cache_size=1024 * 1024))
+        app.listen(8888)
+        return app
+
+    def wire_app(self, cache_control):
+        requests = []
+        conditional_requests = self.conditional_requests = []
+
+        class TestHandler(tornado.web.RequestHandler):
+            def get(self):
+                requests.append(self.request.headers['USER_ID'])
+                conditional_requests.append('If-None-Match' in self.request.headers)
+                self.set_header("Cache-Control", cache_control)
+                self.set_header("ETag", '"v1"')
+                self.write("hello {}".format(len(requests)))
+
+            def post(self):
+                self.write("updated")
+
+        background_app = tornado.web.Application([
+            (r".*", TestHandler),
+        ])
+        background_app.listen(8889)
+        return requests
+
+    def login(self, username):
+        response = self.fetch("/auth/users", method="POST", body="username={}&password=test".format(username))
+        self.assertEqual(response.code, 201)
+
+        response = self.fetch("/auth/login", method="POST", body="username={}&password=test".format(username))
+        self.assertEqual(response.code, 200)
+        return {"Authorization": "Bearer {}".format(json.loads(response.body.decode())["access_token"])}
+
+    def test_private_responses(self):
+        requests = self.wire_app("private, max-age=60")
+        alice = self.login("alice")
+        bob = self.login("bob")
+
+        for _ in range(0, 2):
+            response = self.fetch("/things", headers=alice)
+            self.assertEqual(response.code, 200)
+            self.assertEqual(response.body.decode(), "hello 1")
+            self.assertEqual(response.headers['Etag'], '"v1"')
+
+        response = self.fetch("/things", headers=bob)
+        self.assertEqual(response.body.decode(), "hello 2")
+        self.assertEqual(len(requests), 2)
+
+    def test_public_responses(self):
+        requests = self.wire_app("public, max-age=60")
+        self.fetch("/things", headers=self.login("alice"))
+        response = self.fetch("/things", headers=self.login("bob"))
+        self.assertEqual(response.body.decode(), "hello 1")
+        self.assertEqual(len(requests), 1)
+
+    def test_responses_are_per_host(self):
+        requests = self.wire_app("public, max-age=60")
+        alice = self.login("alice")
+
+        response = self.fetch("/things", headers=dict(alice, Host="one.example.com"))
+        self.assertEqual(response.body.decode(), "hello 1")
+        response = self.fetch("/things", headers=dict(alice, Host="two.example.com"))
+        self.assertEqual(response.body.decode(), "hello 2")
+        self.assertEqual(len(requests), 2)
+
+    def test_if_none_match(self):
+        requests = self.wire_app("private, max-age=60")
+        alice = self.login("alice")
+
+        response = self.fetch("/things", headers=dict(alice, **{"If-None-Match": '"v1"'}))
+        self.assertEqual(response.code, 304)
+        response = self.fetch("/things", headers=dict(alice, **{"If-None-Match": '"v1"'}))
+        self.assertEqual(response.code, 304)
+        self.assertEqual(len(requests), 1)
+        self.assertEqual(self.conditional_requests, [False])
+
+    def test_if_none_match_uncacheable(self):
+        requests = self.wire_app("no-store")
+        alice = self.login("alice")
+
+        for _ in range(0, 3):
+            response = self.fetch("/things", headers=dict(alice, **{"If-None-Match": '"v1"'}))
+            self.assertEqual(response.code, 304)
+        # Once a response could not be stored, the upstream answers the conditional requests itself
+        self.assertEqual(len(requests), 3)
+        self.assertEqual(self.conditional_requests, [False, True, True])
+
+    def test_uncacheable(self):
+        requests = self.wire_app("no-store")
+        alice = self.login("alice")
+        self.fetch("/things", headers=alice)
+        self.fetch("/things", headers=alice)
+        self.assertEqual(len(requests), 2)
+
+    def test_invalidated_by_writes(self):
+        requests = self.wire_app("private, max-age=60")
+        alice = self.login("alice")
+        self.fetch("/things", headers=alice)
+        self.fetch("/things", method="POST", headers=alice, body="")
+        response = self.fetch("/things", headers=alice)
+        self.assertEqual(response.body.decode(), "hello 2")
+
+
+class StreamingResponseCachingTest(ResponseCachingTest):
+    stream_responses = True
@@ -0,0 +1,60 @@
+import time
+import unittest
+
+import tornado.testing
+
+from app.bloom import BloomFilter
+from app.revocations import RevocationFilter
+from app.token_store.memory_store import MemoryTokenStore
+
+
+class BloomFilterTest(unittest.TestCase):
+    def test_membership(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        for index in range(1000):
+            bloom.add("token-{}".format(index))
+
+        self.assertTrue(all("token-{}".format(index) in bloom for index in range(1000)))
+        false_positives = sum("other-{}".format(index) in bloom for index in range(10000))
+        self.assertLess(false_positives, 300)
+        self.assertEqual(len(bloom), 1000)
+
+
+class RevocationFilterTest(tornado.testing.AsyncTestCase):
+    def claims(self, jti, user_id="1", iat=None):
+        return {"jti": jti, "userId": user_id, "iat": iat if iat is not None else int(time.time())}
+
+    @tornado.testing.gen_test
+    def test_syncs_incrementally(self):
+        store = MemoryTokenStore()
+        yield store.revoke_token_id("a", time.time() + 60)
+        revocations = RevocationFilter(store, 60, capacity=100)
+
+        yield revocations.sync()
+        self.assertTrue((yield revocations.is_revoked(self.claims("a"))))
+        self.assertFalse((yield revocations.is_revoked(self.claims("b"))))
+
+        yield store.revoke_token_id("b", time.time() + 60)
+        yield store.revoke_tokens_issued_before("2", int(time.time()))
+        self.assertFalse((yield revocations.is_revoked(self.claims("b"))))
+        yield revocations.sync()
+        self.assertTrue((yield revocations.is_revoked(self.claims("b"))))
+        self.assertTrue((yield revocations.is_revoked(self.claims("c", user_id="2", iat=int(time.time()) - 1))))
+        self.assertFalse((yield revocations.is_revoked(self.claims("c", user_id="2", iat=int(time.time()) + 1))))
+        self.assertEqual(revocations.stats()["confirmations"], 2)
+
+    @tornado.testing.gen_test
+    def test_confirms_hits_with_the_store(self):
+        revocations = RevocationFilter(MemoryTokenStore(), 60)
+        revocations.add(["a"], {})
+
+        self.assertFalse((yield revocations.is_revoked(self.claims("a"))))
+        self.assertEqual(revocations.stats()["false_positives"], 1)
+
+    @tornado.testing.gen_test
+    def test_tokens_issued_later_in_the_same_second(self):
+        revocations = RevocationFilter(MemoryTokenStore(), 60)
+        revocations.add([], {"1": 1000.5})
+
+        self.assertTrue((yield revocations.is_revoked(self.claims("a", iat=1000.2))))
+        self.assertFalse((yield revocations.is_revoked(self.claims("b", iat=1000.7))))
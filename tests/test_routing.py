@@ -0,0 +1,35 @@
+import unittest
+
+from app.routing import RouteTable
+
+
+class RouteTableTest(unittest.TestCase):
+    def setUp(self):
+        self.table = RouteTable.parse(
+            "/orders=>orders /orders/archive=>archive /=>root-api api.example.com/users=>api-users",
+            lambda target: target,
+            default="default"
+        )
+
+    def test_longest_prefix_wins(self):
+        self.assertEqual(self.table.resolve("localhost", "/orders"), "orders")
+        self.assertEqual(self.table.resolve("localhost", "/orders/1"), "orders")
+        self.assertEqual(self.table.resolve("localhost", "/orders/archive/2016"), "archive")
+
+    def test_matches_whole_segments(self):
+        self.assertEqual(self.table.resolve("localhost", "/orders-archive"), "root-api")
+
+    def test_host_routes(self):
+        self.assertEqual(self.table.resolve("api.example.com:8888", "/users/1"), "api-users")
+        self.assertEqual(self.table.resolve("API.example.com", "/users/1"), "api-users")
+        self.assertEqual(self.table.resolve("api.example.com", "/orders/1"), "orders")
+        self.assertEqual(self.table.resolve("localhost", "/users/1"), "root-api")
+
+    def test_default(self):
+        table = RouteTable.parse("/orders=>orders", lambda target: target, default="default")
+        self.assertEqual(table.resolve("localhost", "/users"), "default")
+        self.assertEqual(table.resolve(None, "/"), "default")
+
+    def test_invalid_route(self):
+        with self.assertRaises(ValueError):
+            RouteTable.parse("/orders", lambda target: target)
@@ -0,0 +1,126 @@
+import base64
+import json
+import logging
+import time
+
+import jwt
+import psycopg2
+import tornado.log as tornado_logging
+import tornado.testing
+
+from app import GandalfConfiguration
+from app.db.postgres_adapter import PostgresAdapter
+from app.token_store.memory_store import MemoryTokenStore
+from run import make_app
+
+tornado_logging.access_log.setLevel(logging.DEBUG)
+tornado_logging.app_log.setLevel(logging.DEBUG)
+tornado_logging.gen_log.setLevel(logging.DEBUG)
+
+
+class StatelessTokenTest(tornado.testing.AsyncHTTPTestCase):
+    def get_app(self):
+        conn = psycopg2.connect(host="localhost", user="postgres")
+        cursor = conn.cursor()
+        cursor.execute("DROP SCHEMA IF EXISTS gandalf CASCADE")
+        conn.commit()
+
+        self.token_store = MemoryTokenStore()
+        return make_app(GandalfConfiguration('localhost:8889', PostgresAdapter(), 'localhost',
+                                             token_store=self.token_store, stateless_tokens=True, token_lifetime=60))
+
+    def login(self):
+        response = self.fetch("/auth/login", method="POST", body="username=test&password=test")
+        self.assertEqual(response.code, 200)
+        return json.loads(response.body.decode())['access_token']
+
+    def me(self, access_token):
+        return self.fetch("/auth/users/me", headers={"Authorization": "Bearer {}".format(access_token)}).code
+
+    def test_tokens_are_verified_without_the_token_store(self):
+        response = self.fetch("/auth/users", method="POST", body="username=test&password=test")
+        self.assertEqual(response.code, 201)
+
+        access_token = self.login()
+        claims = jwt.decode(base64.b64decode(access_token), key='')
+        self.assertAlmostEqual(claims['exp'] - claims['iat'], 60)
+        self.assertIn('jti', claims)
+        self.assertIsNone(self.token_store.lookup(access_token).result())
+
+        self.assertEqual(self.me(access_token), 200)
+
+        expired = base64.b64encode(jwt.encode(dict(claims, iat=claims['iat'] - 120, exp=claims['exp'] - 120), '',
+                                              algorithm='HS256')).decode()
+        self.assertEqual(self.me(expired), 401)
+
+        unsigned = base64.b64encode(jwt.encode({"userId": claims['userId'], "username": "test"}, '',
+                                               algorithm='HS256')).decode()
+        self.assertEqual(self.me(unsigned), 401)
+        self.assertEqual(self.me("garbage"), 401)
+
+    def test_tolerates_clock_skew(self):
+        response = self.fetch("/auth/users", method="POST", body="username=test&password=test")
+        self.assertEqual(response.code, 201)
+        claims = jwt.decode(base64.b64decode(self.login()), key='')
+
+        def issued_in(seconds):
+            return base64.b64encode(jwt.encode(dict(claims, iat=time.time() + seconds), '', algorithm='HS256')).decode()
+
+        # Issued by a Gandalf whose clock is a little ahead of this one's
+        self.assertEqual(self.me(issued_in(3)), 200)
+        self.assertEqual(self.me(issued_in(30)), 401)
+
+    def test_revocations(self):
+        response = self.fetch("/auth/users", method="POST", body="username=test&password=test")
+        self.assertEqual(response.code, 201)
+        user_id = response.headers['USER_ID']
+
+        first_token = self.login()
+        second_token = self.login()
+        self.assertNotEqual(first_token, second_token)
+
+        response = self.fetch("/auth/logout", method="POST", body="",
+                              headers={"Authorization": "Bearer {}".format(first_token)})
+        self.assertEqual(response.code, 200)
+        self.assertEqual(self.me(first_token), 401)
+        self.assertEqual(self.me(second_token), 200)
+
+        response = self.fetch("/auth/users/{}/deactivate".format(user_id), method="POST", body="")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(self.me(second_token), 401)
+
+        token_ids, users, _ = self.token_store.revocations(60).result()
+        self.assertEqual(len(token_ids), 1)
+        self.assertLessEqual(users[user_id], time.time())
+
+    def test_tokens_issued_right_after_reactivation(self):
+        response = self.fetch("/auth/users", method="POST", body="username=test&password=test")
+        self.assertEqual(response.code, 201)
+        user_id = response.headers['USER_ID']
+
+        for action in ("deactivate", "reactivate"):
+            response = self.fetch("/auth/users/{}/{}".format(user_id, action), method="POST", body="")
+            self.assertEqual(response.code, 200)
+
+        # Usually issued within the same second as the reactivation
+        access_token = self.login()
+        self.assertEqual(self.me(access_token), 200)
+
+    def test_bulk_deactivate_only_revokes_deactivated_users(self):
+        response = self.fetch("/auth/users", method="POST", body="username=test&password=test")
+        self.assertEqual(response.code, 201)
+        user_id = response.headers['USER_ID']
+
+        response = self.fetch("/auth/users/deactivate", method="POST", body=json.dumps([user_id, "missing"]))
+        self.assertEqual(response.code, 200)
+        self.assertEqual(json.loads(response.body.decode())["deactivated"], [user_id])
+
+        _, users, _ = self.token_store.revocations(60).result()
+        self.assertEqual(list(users), [user_id])
+
+    def test_deactivate_unknown_user_revokes_nothing(self):
+        response = self.fetch("/auth/users/missing/deactivate", method="POST", body="")
+        self.assertEqual(response.code, 200)
+
+        _, users, _ = self.token_store.revocations(60).result()
+        self.assertEqual(users, {})
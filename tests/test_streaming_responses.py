@@ -0,0 +1,81 @@
+import json
+import logging
+
+import psycopg2
+import tornado.gen
+import tornado.log as tornado_logging
+import tornado.testing
+import tornado.web
+
+from app import GandalfConfiguration
+from app.db.postgres_adapter import PostgresAdapter
+from run import make_app
+
+tornado_logging.access_log.setLevel(logging.DEBUG)
+tornado_logging.app_log.setLevel(logging.DEBUG)
+tornado_logging.gen_log.setLevel(logging.DEBUG)
+
+
+class StreamingResponseTest(tornado.testing.AsyncHTTPTestCase):
+    def get_app(self):
+        conn = psycopg2.connect(host="localhost", user="postgres")
+        cursor = conn.cursor()
+        cursor.execute("DROP SCHEMA IF EXISTS gandalf CASCADE")
+        conn.commit()
+
+        app = make_app(GandalfConfiguration('localhost:8889', PostgresAdapter(), 'localhost', stream_responses=True))
+        app.listen(8888)
+        return app
+
+    def wire_app(self, app):
+        background_app = tornado.web.Application([
+            (r".*", app),
+        ])
+        background_app.listen(8889)
+
+    def login(self):
+        response = self.fetch("/auth/users", method="POST", body="username=test&password=test")
+        self.assertEqual(response.code, 201)
+
+        response = self.fetch("/auth/login", method="POST", body="username=test&password=test")
+        self.assertEqual(response.code, 200)
+        return json.loads(response.body.decode())["access_token"]
+
+    def test_streams_chunks(self):
+        class TestHandler(tornado.web.RequestHandler):
+            @tornado.gen.coroutine
+            def get(self):
+                self.set_header("X-Upstream", "yes")
+                for i in range(0, 5):
+                    self.write('chunk %d\n' % i)
+                    yield self.flush()
+
+        self.wire_app(TestHandler)
+        token = self.login()
+
+        chunks = []
+        response = self.fetch("/", headers={"Authorization": "Bearer {}".format(token)},
+                              streaming_callback=chunks.append)
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers['X-Upstream'], 'yes')
+        self.assertEqual(response.headers.get_list('Etag'), [])
+        self.assertEqual(b''.join(chunks).decode(), 'chunk 0\nchunk 1\nchunk 2\nchunk 3\nchunk 4\n')
+
+    def test_relays_status(self):
+        class TestHandler(tornado.web.RequestHandler):
+            def post(self):
+                self.set_status(400)
+                self.write("the request was missing some parameter")
+
+        self.wire_app(TestHandler)
+        token = self.login()
+
+        response = self.fetch("/", method="POST", headers={"Authorization": "Bearer {}".format(token)}, body="")
+        self.assertEqual(response.code, 400)
+        self.assertEqual(response.body.decode(), "the request was missing some parameter")
+
+    def test_unreachable_upstream(self):
+        token = self.login()
+
+        response = self.fetch("/", headers={"Authorization": "Bearer {}".format(token)})
+        self.assertEqual(response.code, 502)
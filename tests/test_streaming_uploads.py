@@ -0,0 +1,115 @@
+import json
+import logging
+
+import psycopg2
+import tornado.concurrent
+import tornado.gen
+import tornado.log as tornado_logging
+import tornado.tcpclient
+import tornado.testing
+import tornado.web
+
+from app import GandalfConfiguration
+from app.db.postgres_adapter import PostgresAdapter
+from run import make_app
+
+tornado_logging.access_log.setLevel(logging.DEBUG)
+tornado_logging.app_log.setLevel(logging.DEBUG)
+tornado_logging.gen_log.setLevel(logging.DEBUG)
+
+
+class StreamingUploadTest(tornado.testing.AsyncHTTPTestCase):
+    def get_app(self):
+        conn = psycopg2.connect(host="localhost", user="postgres")
+        cursor = conn.cursor()
+        cursor.execute("DROP SCHEMA IF EXISTS gandalf CASCADE")
+        conn.commit()
+
+        app = make_app(GandalfConfiguration('localhost:8889', PostgresAdapter(), 'localhost', stream_uploads=True,
+                                            upload_buffer_chunks=1))
+        app.listen(8888, chunk_size=1024)
+        return app
+
+    def login(self):
+        response = self.fetch("/auth/users", method="POST", body="username=test&password=test")
+        self.assertEqual(response.code, 201)
+
+        response = self.fetch("/auth/login", method="POST", body="username=test&password=test")
+        self.assertEqual(response.code, 200)
+        return json.loads(response.body.decode())["access_token"]
+
+    def test_streams_body_upstream(self):
+        test_self = self
+
+        class TestHandler(tornado.web.RequestHandler):
+            def post(self):
+                test_self.assertEqual(self.request.headers['USERNAME'], "test")
+                self.write("received %d bytes" % len(self.request.body))
+
+        background_app = tornado.web.Application([
+            (r".*", TestHandler),
+        ])
+        background_app.listen(8889)
+
+        token = self.login()
+        body = b"x" * 100000
+
+        response = self.fetch("/", method="POST", headers={"Authorization": "Bearer {}".format(token)}, body=body)
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.body.decode(), "received 100000 bytes")
+
+    @tornado.testing.gen_test
+    def test_aborted_upload_is_not_completed_upstream(self):
+        received = tornado.concurrent.Future()
+        completed = []
+
+        @tornado.web.stream_request_body
+        class TestHandler(tornado.web.RequestHandler):
+            def data_received(self, chunk):
+                if not received.done():
+                    received.set_result(None)
+
+            def post(self):
+                completed.append(self.request)
+
+        background_app = tornado.web.Application([
+            (r".*", TestHandler),
+        ])
+        background_app.listen(8889)
+
+        response = yield self.http_client.fetch(self.get_url("/auth/users"), method="POST",
+                                                body="username=test&password=test")
+        self.assertEqual(response.code, 201)
+        response = yield self.http_client.fetch(self.get_url("/auth/login"), method="POST",
+                                                body="username=test&password=test")
+        token = json.loads(response.body.decode())["access_token"]
+
+        stream = yield tornado.tcpclient.TCPClient().connect("localhost", self.get_http_port())
+        yield stream.write("POST / HTTP/1.1\r\nHost: localhost\r\nAuthorization: Bearer {}\r\n"
+                           "Transfer-Encoding: chunked\r\n\r\n".format(token).encode())
+        yield stream.write(b"400\r\n" + b"x" * 1024 + b"\r\n")
+        yield tornado.gen.with_timeout(self.io_loop.time() + 5, received)
+
+        stream.close()
+        yield tornado.gen.sleep(0.5)
+        self.assertEqual(completed, [])
+
+    def test_get_is_proxied(self):
+        class TestHandler(tornado.web.RequestHandler):
+            def get(self):
+                self.write("this works")
+
+        background_app = tornado.web.Application([
+            (r".*", TestHandler),
+        ])
+        background_app.listen(8889)
+
+        token = self.login()
+
+        response = self.fetch("/", headers={"Authorization": "Bearer {}".format(token)})
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.body.decode(), "this works")
+
+    def test_rejects_unauthorized_upload(self):
+        response = self.fetch("/", method="POST", body=b"x" * 100000)
+        self.assertEqual(response.code, 401)
@@ -0,0 +1,63 @@
+import unittest
+
+import tornado.concurrent
+import tornado.gen
+import tornado.testing
+import tornado.web
+
+from app.upstream import CURL, SIMPLE, make_upstream_client, upstream_client_stats
+
+try:
+    import pycurl
+except ImportError:
+    pycurl = None
+
+
+class UpstreamClientTest(tornado.testing.AsyncHTTPTestCase):
+    def get_app(self):
+        self.release = tornado.concurrent.Future()
+        release = self.release
+
+        class SlowHandler(tornado.web.RequestHandler):
+            @tornado.gen.coroutine
+            def get(self):
+                yield release
+                self.write("done")
+
+        return tornado.web.Application([(r"/", SlowHandler)])
+
+    def test_config(self):
+        client = make_upstream_client(SIMPLE, max_clients=7, connect_timeout=1.5, request_timeout=2.5)
+        self.addCleanup(client.close)
+
+        self.assertEqual(client.max_clients, 7)
+        self.assertEqual((client.defaults["connect_timeout"], client.defaults["request_timeout"]), (1.5, 2.5))
+
+    def test_unknown_client(self):
+        with self.assertRaises(ValueError):
+            make_upstream_client("wget")
+
+    @unittest.skipIf(pycurl is not None, "pycurl is installed")
+    def test_curl_requires_pycurl(self):
+        with self.assertRaises(ValueError):
+            make_upstream_client(CURL)
+
+    @tornado.testing.gen_test
+    def check_queue_depth(self, implementation):
+        client = make_upstream_client(implementation, max_clients=1)
+        self.addCleanup(client.close)
+
+        responses = [client.fetch(self.get_url("/")) for _ in range(3)]
+        yield tornado.gen.sleep(0.1)
+        self.assertEqual(upstream_client_stats(client), {"max_clients": 1, "active": 1, "queued": 2})
+
+        self.release.set_result(None)
+        yield responses
+        self.assertEqual(upstream_client_stats(client), {"max_clients": 1, "active": 0, "queued": 0})
+
+    def test_queue_depth(self):
+        self.check_queue_depth(SIMPLE)
+
+    @unittest.skipIf(pycurl is None, "pycurl is not installed")
+    def test_curl_queue_depth(self):
+        self.check_queue_depth(CURL)
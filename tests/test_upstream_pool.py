@@ -0,0 +1,52 @@
+import unittest
+
+from app.upstream import HealthChecker, LEAST_OUTSTANDING, NoUpstreamException, UpstreamPool, WEIGHTED
+
+
+class UpstreamPoolTest(unittest.TestCase):
+    def test_parse(self):
+        pool = UpstreamPool.parse("api-1:8080, api-2:8080=3")
+        self.assertEqual([upstream.address for upstream in pool.upstreams], ["api-1:8080", "api-2:8080"])
+        self.assertEqual([upstream.weight for upstream in pool.upstreams], [1, 3])
+        self.assertEqual(pool.upstreams[1].host, "api-2")
+        self.assertEqual(pool.upstreams[1].port, 8080)
+
+    def test_round_robin(self):
+        pool = UpstreamPool.parse("a:1,b:1,c:1")
+        chosen = [pool.choose().address for _ in range(6)]
+        self.assertEqual(sorted(chosen), ["a:1", "a:1", "b:1", "b:1", "c:1", "c:1"])
+
+    def test_least_outstanding(self):
+        pool = UpstreamPool.parse("a:1,b:1", LEAST_OUTSTANDING)
+        first = pool.acquire()
+        second = pool.acquire()
+        self.assertNotEqual(first.address, second.address)
+
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+
+    def test_weighted(self):
+        pool = UpstreamPool.parse("a:1=1,b:1=3", WEIGHTED)
+        chosen = [pool.choose().address for _ in range(8)]
+        self.assertEqual(chosen.count("a:1"), 2)
+        self.assertEqual(chosen.count("b:1"), 6)
+
+    def test_skips_unhealthy(self):
+        pool = UpstreamPool.parse("a:1,b:1")
+        checker = HealthChecker(pool, unhealthy_threshold=2, healthy_threshold=1)
+        checker.record(pool.upstreams[0], False)
+        checker.record(pool.upstreams[0], False)
+        self.assertFalse(pool.upstreams[0].healthy)
+        self.assertEqual({pool.choose().address for _ in range(4)}, {"b:1"})
+
+        checker.record(pool.upstreams[0], True)
+        self.assertEqual({pool.choose().address for _ in range(4)}, {"a:1", "b:1"})
+
+    def test_uses_all_when_none_healthy(self):
+        pool = UpstreamPool.parse("a:1")
+        pool.upstreams[0].healthy = False
+        self.assertEqual(pool.choose().address, "a:1")
+
+    def test_empty(self):
+        with self.assertRaises(NoUpstreamException):
+            UpstreamPool.parse(None).choose()
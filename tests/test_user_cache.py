@@ -0,0 +1,109 @@
+import redis
+import tornado.gen
+import tornado.testing
+
+from app.db import User
+from app.token_store import resolved
+from app.token_store.memory_store import MemoryTokenStore
+from app.token_store.redis_store import USER_CHANGE_CHANNEL, RedisTokenStore
+from app.user_cache import UserCache
+
+
+class FakeDB:
+    def __init__(self, *users):
+        self.users = {user.user_id: user for user in users}
+        self.queries = []
+
+    def search_for_users_by_id(self, user_ids):
+        self.queries.append(sorted(user_ids))
+        return resolved([self.users[user_id] for user_id in user_ids if user_id in self.users])
+
+    def search_for_users_by_username(self, usernames):
+        self.queries.append(sorted(usernames))
+        return resolved([user for user in self.users.values() if user.username in usernames])
+
+    def update_user_password(self, user_id, password):
+        user = self.users[user_id]
+        self.users[user_id] = User(user_id, user.username, password)
+        return resolved(None)
+
+    def deactivate_user(self, user_id):
+        del self.users[user_id]
+        return resolved(None)
+
+
+class UserCacheTest(tornado.testing.AsyncTestCase):
+    @tornado.testing.gen_test
+    def test_only_queries_uncached_users(self):
+        db = FakeDB(User("1", "alice", "a"), User("2", "bob", "b"))
+        cache = UserCache(db, 10)
+
+        users = yield cache.search_for_users_by_id(["1"])
+        self.assertEqual([user.username for user in users], ["alice"])
+
+        users = yield cache.search_for_users_by_id(["2", "1", "3"])
+        self.assertEqual([user.username for user in users], ["bob", "alice"])
+        self.assertEqual(db.queries, [["1"], ["2", "3"]])
+
+        users = yield cache.search_for_users_by_username(["bob", "alice"])
+        self.assertEqual([user.user_id for user in users], ["2", "1"])
+        self.assertEqual(len(db.queries), 2)
+
+    @tornado.testing.gen_test
+    def test_writes_invalidate(self):
+        db = FakeDB(User("1", "alice", "a"))
+        cache = UserCache(db, 10)
+        yield cache.search_for_users_by_id(["1"])
+
+        yield cache.update_user_password("1", "new")
+        users = yield cache.search_for_users_by_username(["alice"])
+        self.assertEqual(users[0].hashed_password, "new")
+
+        yield cache.deactivate_user("1")
+        users = yield cache.search_for_users_by_username(["alice"])
+        self.assertEqual(users, [])
+        users = yield cache.search_for_users_by_id(["1"])
+        self.assertEqual(users, [])
+
+    @staticmethod
+    def announcing_cache(db, token_store):
+        cache = UserCache(db, 10, announce=token_store.announce_user_changes)
+        token_store.add_user_change_listener(cache.forget)
+        return cache
+
+    @tornado.testing.gen_test
+    def test_writes_invalidate_other_caches(self):
+        db = FakeDB(User("1", "alice", "a"))
+        token_store = MemoryTokenStore()
+        caches = [self.announcing_cache(db, token_store) for _ in range(2)]
+        for cache in caches:
+            yield cache.search_for_users_by_id(["1"])
+
+        yield caches[0].update_user_password("1", "new")
+        users = yield caches[1].search_for_users_by_id(["1"])
+        self.assertEqual(users[0].hashed_password, "new")
+
+    @tornado.testing.gen_test
+    def test_writes_invalidate_caches_sharing_redis(self):
+        client = redis.StrictRedis()
+
+        def subscribers():
+            return client.execute_command('PUBSUB', 'NUMSUB', USER_CHANGE_CHANNEL)[1]
+
+        subscribed_before = subscribers()
+
+        db = FakeDB(User("1", "alice", "a"))
+        # Separate stores, each with its own subscription, as in separate processes
+        caches = [self.announcing_cache(db, RedisTokenStore()) for _ in range(2)]
+        while subscribers() < subscribed_before + 2:
+            yield tornado.gen.sleep(0.01)
+
+        yield caches[1].search_for_users_by_id(["1"])
+        yield caches[0].update_user_password("1", "new")
+        for _ in range(100):
+            if caches[1].users.get("1") is None:
+                break
+            yield tornado.gen.sleep(0.01)
+
+        users = yield caches[1].search_for_users_by_id(["1"])
+        self.assertEqual(users[0].hashed_password, "new")
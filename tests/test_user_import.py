@@ -0,0 +1,90 @@
+import json
+import logging
+import unittest
+
+import psycopg2
+import tornado.log as tornado_logging
+import tornado.testing
+
+from app import GandalfConfiguration
+from app.db.postgres_adapter import PostgresAdapter
+from app.passwords import encrypt_password
+from app.user_import import CSV, NDJSON, ImportFormatException, ImportParser
+from run import make_app
+
+tornado_logging.access_log.setLevel(logging.DEBUG)
+tornado_logging.app_log.setLevel(logging.DEBUG)
+tornado_logging.gen_log.setLevel(logging.DEBUG)
+
+
+class ImportParserTest(unittest.TestCase):
+    def test_rows_split_across_chunks(self):
+        parser = ImportParser(CSV)
+        rows = parser.feed(b"username,password\nAli")
+        rows += parser.feed(b"ce,secret\r\n\nbob")
+        rows += parser.close()
+
+        self.assertEqual([(row["line"], row["username"], row.get("password"), row.get("error")) for row in rows],
+                         [(2, "alice", "secret", None), (4, None, None, "Expected 2 values")])
+
+    def test_header_must_name_the_columns(self):
+        with self.assertRaises(ImportFormatException):
+            ImportParser(CSV).feed(b"alice,secret\n")
+        with self.assertRaises(ImportFormatException):
+            ImportParser(CSV).close()
+
+    def test_invalid_json_rows(self):
+        parser = ImportParser(NDJSON)
+        rows = parser.feed(b'[]\n{"username": "alice"}\n{"username": "bob", "hashed_password": "plain"}\n')
+
+        self.assertEqual([row["error"] for row in rows], ["Expected a JSON object",
+                                                          "Expected either a password or a hashed_password",
+                                                          "Unrecognized hashed_password"])
+
+
+class ImportUsersTest(tornado.testing.AsyncHTTPTestCase):
+    def get_app(self):
+        conn = psycopg2.connect(host="localhost", user="postgres")
+        cursor = conn.cursor()
+        cursor.execute("DROP SCHEMA IF EXISTS gandalf CASCADE")
+        conn.commit()
+
+        app = make_app(GandalfConfiguration('localhost:8889', PostgresAdapter(), 'localhost'))
+        app.listen(8888)
+        return app
+
+    def import_users(self, body, content_type):
+        response = self.fetch("/auth/users/import", method="POST", body=body, headers={"Content-Type": content_type})
+        self.assertEqual(response.code, 200)
+        return [json.loads(line) for line in response.body.decode().splitlines()]
+
+    def test_import_csv(self):
+        response = self.fetch("/auth/users", method="POST", body="username=taken&password=test")
+        self.assertEqual(response.code, 201)
+
+        results = self.import_users("username,password\nAlice,secret\ntaken,test\n,test\nalice,again\n", "text/csv")
+
+        self.assertEqual([(result["line"], result["username"], result["status"]) for result in results],
+                         [(2, "alice", "created"), (3, "taken", "exists"), (4, None, "invalid"),
+                          (5, "alice", "exists")])
+        self.assertIn("userId", results[0])
+
+        response = self.fetch("/auth/login", method="POST", body="username=alice&password=secret")
+        self.assertEqual(response.code, 200)
+
+    def test_import_hashed_passwords(self):
+        rows = [{"username": "bob", "hashed_password": encrypt_password("secret")}, {"username": "carol"}]
+        results = self.import_users("".join(json.dumps(row) + "\n" for row in rows), "application/x-ndjson")
+
+        self.assertEqual([result["status"] for result in results], ["created", "invalid"])
+
+        response = self.fetch("/auth/login", method="POST", body="username=bob&password=secret")
+        self.assertEqual(response.code, 200)
+
+    def test_rejects_unknown_formats(self):
+        response = self.fetch("/auth/users/import", method="POST", body="username=alice&password=secret")
+        self.assertEqual(response.code, 400)
+
+        response = self.fetch("/auth/users/import", method="POST", body="alice,secret\n",
+                              headers={"Content-Type": "text/csv"})
+        self.assertEqual(response.code, 400)
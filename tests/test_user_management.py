@@ -114,4 +114,43 @@ class UserManagementTest(tornado.testing.AsyncHTTPTestCase):
         self.assertIsNotNone(token)
 
         response = self.fetch("/", headers={"Authorization": "Bearer {}".format(token)})
-        self.assertEqual(response.code, 200)
\ No newline at end of file
+        self.assertEqual(response.code, 200)
+
+    def test_bulk_deactivate_reactivate_users(self):
+        user_ids = []
+        tokens = []
+        for username in ["first", "second"]:
+            response = self.fetch("/auth/users", method="POST", body="username={}&password=test".format(username))
+            self.assertEqual(response.code, 201)
+            user_ids.append(response.headers["USER_ID"])
+
+            response = self.fetch("/auth/login", method="POST", body="username={}&password=test".format(username))
+            self.assertEqual(response.code, 200)
+            tokens.append(json.loads(response.body.decode())["access_token"])
+
+        body = json.dumps(user_ids + ["unknown", user_ids[0]])
+        response = self.fetch("/auth/users/deactivate", method="POST", body=body)
+        self.assertEqual(response.code, 200)
+        self.assertEqual(json.loads(response.body.decode()), {
+            "deactivated": user_ids,
+            "errors": [{"message": "Unable to find user_id", "key": "user_id", "value": "unknown"}]
+        })
+
+        for token in tokens:
+            response = self.fetch("/auth/users/me", headers={"Authorization": "Bearer {}".format(token)})
+            self.assertEqual(response.code, 401)
+
+        response = self.fetch("/auth/login", method="POST", body="username=first&password=test")
+        self.assertEqual(response.code, 401)
+
+        response = self.fetch("/auth/users/reactivate", method="POST", body=json.dumps(user_ids[:1]))
+        self.assertEqual(response.code, 200)
+        self.assertEqual(json.loads(response.body.decode()), {"reactivated": user_ids[:1], "errors": []})
+
+        response = self.fetch("/auth/login", method="POST", body="username=first&password=test")
+        self.assertEqual(response.code, 200)
+        response = self.fetch("/auth/login", method="POST", body="username=second&password=test")
+        self.assertEqual(response.code, 401)
+
+        response = self.fetch("/auth/users/deactivate", method="POST", body="user_id=first")
+        self.assertEqual(response.code, 400)
@@ -390,4 +390,40 @@ class UserSearchTest(tornado.testing.AsyncHTTPTestCase):
                 "userId": user_id3
             }]
         }
-        self.assertEqual(json.loads(response.body.decode()), json_payload)
\ No newline at end of file
+        self.assertEqual(json.loads(response.body.decode()), json_payload)
+
+    def test_bulk_search(self):
+        response = self.fetch("/auth/users", method="POST", body="username=test&password=test")
+        self.assertEqual(response.code, 201)
+        user_id = response.headers['USER_ID']
+        missing_user_id = str(uuid.uuid1())
+
+        response = self.fetch("/auth/users/search/bulk", method="POST", body=json.dumps([missing_user_id, user_id]))
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers['Content-Type'], "application/x-ndjson")
+        self.assertEqual([json.loads(line) for line in response.body.decode().splitlines()], [{
+            "message": "Unable to find user_id",
+            "key": "user_id",
+            "value": missing_user_id
+        }, {
+            "username": "test",
+            "userId": user_id
+        }])
+
+        response = self.fetch("/auth/users/search/bulk?by=username", method="POST", body=json.dumps(["TEST"]))
+        self.assertEqual(response.code, 200)
+        self.assertEqual(json.loads(response.body.decode()), {"username": "test", "userId": user_id})
+
+    def test_bulk_search_in_chunks(self):
+        usernames = ["bulkuser{}".format(index) for index in range(2500)]
+
+        response = self.fetch("/auth/users/search/bulk?by=username", method="POST", body=json.dumps(usernames))
+        self.assertEqual(response.code, 200)
+        self.assertEqual([json.loads(line)["value"] for line in response.body.decode().splitlines()], usernames)
+
+    def test_bulk_search_rejects_bad_input(self):
+        response = self.fetch("/auth/users/search/bulk", method="POST", body="user_id=asdf")
+        self.assertEqual(response.code, 400)
+
+        response = self.fetch("/auth/users/search/bulk?by=email", method="POST", body="[]")
+        self.assertEqual(response.code, 400)